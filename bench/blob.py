@@ -0,0 +1,59 @@
+# blob store: synchronous puts with and without fsync, duplicates, a burst through the queue
+# as a sensor thread sees it, reads by read() and mmap
+import os
+import shutil
+import tempfile
+import time
+
+import orm.blob
+
+import bench.common
+
+FRAME_SIZE = 200 * 1024
+
+
+def frames(n):
+    return [os.urandom(16) + b'\0' * (FRAME_SIZE - 16) for _ in xrange(n)]
+
+
+def main():
+    for n in bench.common.sizes([200, 1000]):
+        data = frames(n)
+        for durable in (False, True):
+            root = tempfile.mkdtemp()
+            try:
+                store = orm.blob.BlobStore(root, durable=durable)
+                elapsed, digests = bench.common.timed(lambda: [store.put(frame) for frame in data])
+                bench.common.report('blob_put', n=n, durable=durable, per_second=n / elapsed)
+                elapsed, _ = bench.common.timed(lambda: [store.put(frame) for frame in data])
+                bench.common.report('blob_put_duplicate', n=n, per_second=n / elapsed)
+
+                elapsed, _ = bench.common.timed(lambda: [len(store.get(digest).read()) for digest in digests])
+                bench.common.report('blob_read', n=n, per_second=n / elapsed)
+                elapsed, _ = bench.common.timed(lambda: [len(store.get(digest).mmap()) for digest in digests])
+                bench.common.report('blob_mmap', n=n, per_second=n / elapsed)
+            finally:
+                shutil.rmtree(root)
+
+            root = tempfile.mkdtemp()
+            try:
+                queue = orm.blob.BlobQueue(orm.blob.BlobStore(root, durable=durable), queue_size=n)
+                started = time.time()
+                longest = 0.0
+                for frame in data:
+                    submitted = time.time()
+                    queue.submit(frame)
+                    longest = max(longest, time.time() - submitted)
+                burst = time.time() - started
+                queue.join()
+                bench.common.report(
+                    'blob_queue_burst', n=n, durable=durable, submit_seconds=burst,
+                    max_submit_ms=longest * 1000, written_seconds=time.time() - started,
+                )
+                queue.stop()
+            finally:
+                shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
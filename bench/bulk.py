@@ -0,0 +1,38 @@
+# validated per-row saves against one bulk_create of the same rows
+import orm.field
+import orm.model
+
+import bench.common
+
+
+def make_model():
+    class Participant(orm.model.Model):
+        bib = orm.field.IntegerField(unique=True)
+        lastname = orm.field.TextField(max_len=128)
+        locality_id = orm.field.IntegerField(default=0, index=True)
+    return Participant
+
+
+def make_rows(n):
+    return [{'id': i, 'bib': i, 'lastname': 'runner'} for i in xrange(n)]
+
+
+def save_each(model_cls, rows):
+    for row in rows:
+        model = model_cls(**row)
+        for name, value in row.iteritems():
+            setattr(model, name, value)
+        model.save()
+
+
+def main():
+    for n in bench.common.sizes([10000, 100000]):
+        rows = make_rows(n)
+        single, _ = bench.common.timed(save_each, make_model(), rows)
+        bulk, _ = bench.common.timed(make_model().objects.bulk_create, rows)
+        bench.common.report('save', n=n, total=single, per_row=single / n)
+        bench.common.report('bulk_create', n=n, total=bulk, per_row=bulk / n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# query cache: repeated filter() reads of a results screen with a write every few reads,
+# without the cache and with it
+import random
+
+import orm.field
+import orm.manager
+import orm.model
+
+import bench.common
+
+LOCALITIES = 100
+READS = 20000
+
+
+def make_model(cache_size):
+    class Runner(orm.model.Model):
+        objects = orm.manager.ModelManager(cache_size=cache_size)
+
+        locality_id = orm.field.IntegerField(index=True)
+        age = orm.field.IntegerField()
+    return Runner
+
+
+def run(runner_cls, n, writes_per_read):
+    random.seed(n)
+    runners = list(runner_cls.objects.all())
+    hot = range(10)  # the localities on screen
+
+    def reads():
+        written = 0.0
+        for _ in xrange(READS):
+            locality_id = random.choice(hot)
+            runner_cls.objects.filter(locality_id=locality_id).all()
+            runner_cls.objects.filter(locality_id=locality_id, age__gte=40).count()
+            written += writes_per_read
+            while written >= 1:
+                runner = random.choice(runners)
+                runner.age = random.randrange(18, 70)
+                runner.save()
+                written -= 1
+    return bench.common.timed(reads)[0]
+
+
+def main():
+    for n in bench.common.sizes([20000]):
+        for writes_per_read in (0.0, 0.01, 0.1):
+            for cache_size in (0, 1000):
+                runner_cls = make_model(cache_size)
+                runner_cls.objects.bulk_create(
+                    {'id': i, 'locality_id': i % LOCALITIES, 'age': 18 + i % 50} for i in xrange(n)
+                )
+                elapsed = run(runner_cls, n, writes_per_read)
+                stats = runner_cls.objects.cache.stats() if cache_size else {'hit_rate': 0.0}
+                bench.common.report(
+                    'cache_reads', n=n, cache_size=cache_size, writes_per_read=writes_per_read,
+                    read_us=elapsed / (2 * READS) * 1e6, hit_rate=stats['hit_rate'],
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# encoding and decoding a batch of events: the model codec against pickle and json of field values
+import cPickle as pickle
+import datetime
+import json
+
+import orm.codec
+import orm.field
+import orm.model
+
+import bench.common
+
+
+def make_model():
+    class Reading(orm.model.Model):
+        sensor_id = orm.field.IntegerField()
+        mark = orm.field.HexTextField(max_len=24)
+        ts = orm.field.DateField()
+        duration = orm.field.IntegerField(default=0)
+        comment = orm.field.TextField(default=u'')
+    return Reading
+
+
+def to_json(models):
+    return json.dumps([
+        dict(model.__getstate__(), ts=orm.field.datetime_to_micros(model.ts))
+        for model in models
+    ])
+
+
+def from_json(model_cls, data):
+    models = []
+    for values in json.loads(data):
+        values['ts'] = orm.field.micros_to_datetime(values['ts'])
+        models.append(model_cls._from_trusted(values))
+    return models
+
+
+def to_pickle(models):
+    return pickle.dumps([model.__getstate__() for model in models], pickle.HIGHEST_PROTOCOL)
+
+
+def from_pickle(model_cls, data):
+    return [model_cls._from_trusted(values) for values in pickle.loads(data)]
+
+
+def main():
+    model_cls = make_model()
+    codec = orm.codec.get_codec(model_cls)
+    started = datetime.datetime(2017, 5, 1, 9, 0)
+    for n in bench.common.sizes([100000]):
+        models = [
+            model_cls(
+                id=i,
+                sensor_id=i % 16,
+                mark='E2000016120F{:012X}'.format(i),
+                ts=started + datetime.timedelta(microseconds=i * 1500),
+            )
+            for i in xrange(n)
+        ]
+        for name, encode, decode in (
+            ('codec', codec.encode_many, codec.decode_many),
+            ('pickle', to_pickle, lambda data: from_pickle(model_cls, data)),
+            ('json', to_json, lambda data: from_json(model_cls, data)),
+        ):
+            encode_elapsed, data = bench.common.timed(encode, models)
+            decode_elapsed, decoded = bench.common.timed(decode, data)
+            assert decoded[-1].__getstate__() == models[-1].__getstate__()
+            bench.common.report(
+                'serialize_' + name,
+                n=n,
+                bytes_per_row=len(data) // n,
+                encode_per_second=n / encode_elapsed,
+                decode_per_second=n / decode_elapsed,
+            )
+
+
+if __name__ == '__main__':
+    main()
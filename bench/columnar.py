@@ -0,0 +1,51 @@
+# event ingest and per-sensor aggregation: columnar storage against the ram storage
+import datetime
+
+import orm.columnar
+import orm.field
+import orm.manager
+import orm.model
+import orm.storage
+
+import bench.common
+
+
+def make_model(storage_cls):
+    class Read(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=storage_cls)
+
+        ts = orm.field.DateField()
+        sensor_id = orm.field.IntegerField()
+        mark_id = orm.field.IntegerField()
+    return Read
+
+
+def make_rows(n):
+    start = datetime.datetime(2026, 5, 1, 9)
+    return [
+        {'id': i, 'ts': start + datetime.timedelta(milliseconds=i), 'sensor_id': i % 16, 'mark_id': i % 5000}
+        for i in xrange(n)
+    ]
+
+
+def count_per_sensor(model_cls):
+    if hasattr(model_cls.objects.storage, 'count_by'):
+        return model_cls.objects.storage.count_by('sensor_id')
+    counts = {}
+    for model in model_cls.objects.all():
+        counts[model.sensor_id] = counts.get(model.sensor_id, 0) + 1
+    return counts
+
+
+def main():
+    for n in bench.common.sizes([10 ** 5, 10 ** 6]):
+        rows = make_rows(n)
+        for name, storage_cls in (('ram', orm.storage.SingletonRamStorage), ('columnar', orm.columnar.ColumnarStorage)):
+            model_cls = make_model(storage_cls)
+            ingest, _ = bench.common.timed(model_cls.objects.bulk_create, rows)
+            aggregate, _ = bench.common.timed(count_per_sensor, model_cls)
+            bench.common.report(name, n=n, ingest_per_row=ingest / n, count_by_sensor=aggregate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+# helpers shared by benchmarks, run them as `python -m bench.<name>`
+import sys
+import time
+
+
+def timed(func, *args, **kwargs):
+    started = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - started, result
+
+
+def sizes(default):
+    # sizes can be overridden from the command line: python -m bench.save 1000 10000
+    if len(sys.argv) > 1:
+        return [int(arg) for arg in sys.argv[1:]]
+    return default
+
+
+def report(name, **values):
+    columns = ' '.join(
+        '{}={}'.format(key, '{:.6f}'.format(value) if isinstance(value, float) else value)
+        for key, value in sorted(values.iteritems())
+    )
+    print('{:<32} {}'.format(name, columns))
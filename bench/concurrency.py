@@ -0,0 +1,70 @@
+# writers saving concurrently: throughput per writer count and uniqueness under contention
+import threading
+import time
+
+import orm.error
+import orm.field
+import orm.manager
+import orm.model
+import orm.storage
+
+import bench.common
+
+
+def make_models():
+    class Read(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=orm.storage.ConcurrentRamStorage)
+
+        sensor_id = orm.field.IntegerField()
+
+    class Participant(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=orm.storage.ConcurrentRamStorage)
+
+        bib = orm.field.IntegerField(unique=True)
+    return Read, Participant
+
+
+def run_writers(writers, target):
+    threads = [threading.Thread(target=target, args=(writer,)) for writer in xrange(writers)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - started
+
+
+def main():
+    for n in bench.common.sizes([100000]):
+        for writers in (1, 2, 4, 8):
+            read_cls, participant_cls = make_models()
+
+            def write_reads(writer):
+                for i in xrange(writer, n, writers):
+                    read_cls(id=i, sensor_id=writer).save()
+
+            elapsed = run_writers(writers, write_reads)
+            assert read_cls.objects.all().count() == n
+            bench.common.report('sharded_writes', n=n, writers=writers, per_second=n / elapsed)
+
+            # every writer tries to take every bib, only one save per bib may win
+            wins = []
+
+            def take_bibs(writer):
+                won = 0
+                for bib in xrange(n // 10):
+                    try:
+                        participant_cls(id=writer * n + bib, bib=bib).save()
+                        won += 1
+                    except orm.error.FieldNotUniqueError:
+                        pass
+                wins.append(won)
+
+            elapsed = run_writers(writers, take_bibs)
+            assert sum(wins) == n // 10 == participant_cls.objects.all().count()
+            bench.common.report('contended_unique', n=n // 10 * writers, writers=writers,
+                                per_second=n // 10 * writers / elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# exporting users with localities: per row locality lookups against the chunked export
+import csv
+import datetime
+
+import models.base
+import models.export
+import orm.export
+
+import bench.common
+
+
+class NullStream(object):
+    def write(self, data):
+        pass
+
+
+def fill(n):
+    for i in xrange(1, 1001):
+        models.base.Locality(id=i, city=u'Курск', region=u'Курская область', country=str(i % 200 + 1)).save()
+    models.base.User.objects.bulk_create(
+        {'id': i, 'firstname': u'Иван', 'lastname': u'Иванов', 'bdate': datetime.datetime(1990, 1, 1),
+         'locality_id': i % 1000 + 1}
+        for i in xrange(n)
+    )
+
+
+def export_per_row(stream):
+    # what a loop over filter() results had to do
+    writer = csv.writer(stream)
+    for user in models.base.User.objects.all().all():
+        locality = models.base.Locality.objects.get(id=user.locality_id)
+        row = [user.id, user.firstname, user.lastname, user.bdate, locality.city, locality.region, locality.country]
+        writer.writerow(map(orm.export.text, row))
+
+
+def main():
+    for n in bench.common.sizes([100000]):
+        fill(n)
+        elapsed, _ = bench.common.timed(export_per_row, NullStream())
+        bench.common.report('export_per_row', n=n, per_second=n / elapsed)
+        columns = models.export.user_columns()
+        elapsed, _ = bench.common.timed(orm.export.write_csv, NullStream(), models.base.User.objects.all(), columns)
+        bench.common.report('export_csv', n=n, per_second=n / elapsed)
+        elapsed, _ = bench.common.timed(orm.export.write_jsonl, NullStream(), models.base.User.objects.all(), columns)
+        bench.common.report('export_jsonl', n=n, per_second=n / elapsed)
+
+
+if __name__ == '__main__':
+    main()
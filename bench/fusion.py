@@ -0,0 +1,84 @@
+# fusion of multi-sensor reads: replay of a generated log with skewed and drifting sensor clocks,
+# reads per crossing, replay speed, estimated offsets and errors of crossing times
+import datetime
+import os
+import random
+import tempfile
+
+import orm.field
+import timing.fusion
+import timing.ingest
+
+import bench.common
+
+CHECKPOINTS = 4
+SENSORS = 3  # per checkpoint
+READS = 6  # per sensor and crossing
+
+
+def make_log(n, path):
+    # returns true crossing times and sensor clocks as (offset, drift)
+    random.seed(n)
+    start = orm.field.datetime_to_micros(datetime.datetime(2020, 5, 1, 9))
+    clocks = {
+        checkpoint * 10 + k: (random.randint(-2000000, 2000000), random.uniform(-50e-6, 50e-6))
+        for checkpoint in xrange(CHECKPOINTS) for k in xrange(SENSORS)
+    }
+    crossings = {}
+    reads = []
+    for mark_id in xrange(n):
+        pace = random.uniform(600, 1200) * 1000000
+        for checkpoint in xrange(CHECKPOINTS):
+            crossed = start + int(random.uniform(0, 300) * 1000000 + checkpoint * pace)
+            crossings[checkpoint, mark_id] = crossed
+            for k in xrange(SENSORS):
+                offset, drift = clocks[checkpoint * 10 + k]
+                for _ in xrange(READS):
+                    true_ts = crossed + int(random.gauss(0, 400000))
+                    rssi = 100 - abs(true_ts - crossed) // 20000 + random.randint(-3, 3)
+                    sensor_ts = true_ts + offset + int((true_ts - start) * drift)
+                    reads.append((true_ts, checkpoint * 10 + k, mark_id, sensor_ts, rssi))
+    reads.sort()
+    with open(path, 'w') as log:
+        for _, sensor_id, mark_id, ts, rssi in reads:
+            log.write(timing.ingest.format_line(sensor_id, mark_id, orm.field.micros_to_datetime(ts), rssi))
+    return crossings, clocks
+
+
+def main():
+    sensor_checkpoints = {
+        checkpoint * 10 + k: checkpoint for checkpoint in xrange(CHECKPOINTS) for k in xrange(SENSORS)
+    }
+    for n in bench.common.sizes([1000, 5000]):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            crossings, clocks = make_log(n, path)
+            for choose in (timing.fusion.FIRST, timing.fusion.PEAK):
+                fusion = timing.fusion.Fusion(sensor_checkpoints, choose)
+                with open(path) as log:
+                    elapsed, fused = bench.common.timed(lambda: list(timing.fusion.replay(log, fusion)))
+                # times are on the clock of the reference sensor of a checkpoint
+                errors = []
+                for read in fused:
+                    checkpoint = sensor_checkpoints[read.sensor_id]
+                    reference = clocks[fusion.skews[checkpoint].reference][0]
+                    errors.append(abs(orm.field.datetime_to_micros(read.ts) - reference - crossings[checkpoint, read.mark_id]))
+                errors.sort()
+                bench.common.report(
+                    'fusion_' + choose, n=n, reads=fusion.reads, crossings=len(fused), expected=len(crossings),
+                    ratio=fusion.reads / float(len(fused)), reads_per_second=fusion.reads / elapsed,
+                    median_error_ms=errors[len(errors) // 2] / 1000.0, p99_error_ms=errors[int(len(errors) * 0.99)] / 1000.0,
+                )
+            offset_errors = []
+            for checkpoint, skew in fusion.skews.iteritems():
+                reference = clocks[skew.reference][0]
+                for sensor_id, offset in skew.offsets.iteritems():
+                    offset_errors.append(abs(offset - (clocks[sensor_id][0] - reference)))
+            bench.common.report('fusion_offsets', n=n, max_error_ms=max(offset_errors) / 1000.0)
+        finally:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# name -> id lookups and autocomplete over const.geo: scans of the dicts against the index
+import const.geo
+import const.geo_index
+
+import bench.common
+
+
+def scan_country_id(name):
+    name = const.geo_index.normalize(name)
+    for country_id, country_name in const.geo.COUNTRIES.iteritems():
+        if const.geo_index.normalize(country_name) == name:
+            return country_id
+    return None
+
+
+def scan_complete(prefix, limit=10):
+    prefix = const.geo_index.normalize(prefix)
+    names = sorted(
+        (const.geo_index.normalize(name), region_id)
+        for regions in const.geo.REGIONS.itervalues()
+        for region_id, name in regions.iteritems()
+    )
+    return [region_id for name, region_id in names if name.startswith(prefix)][:limit]
+
+
+def main():
+    names = [u'Россия', u'ЭСТОНИЯ', u'Беларусь', u'Джерси']
+    prefixes = [u'кур', u'мо', u'х', u'ро']
+    elapsed, index = bench.common.timed(const.geo_index.get_index)
+    bench.common.report('geo_build_index', seconds=elapsed)
+    for n in bench.common.sizes([10000]):
+        elapsed, _ = bench.common.timed(lambda: [scan_country_id(names[i % 4]) for i in xrange(n // 100)])
+        bench.common.report('geo_scan_country_id', per_second=n // 100 / elapsed)
+        elapsed, _ = bench.common.timed(lambda: [index.country_id(names[i % 4]) for i in xrange(n)])
+        bench.common.report('geo_country_id', per_second=n / elapsed)
+        elapsed, _ = bench.common.timed(lambda: [scan_complete(prefixes[i % 4]) for i in xrange(n // 100)])
+        bench.common.report('geo_scan_complete', per_second=n // 100 / elapsed)
+        elapsed, _ = bench.common.timed(lambda: [index.complete_region(prefixes[i % 4]) for i in xrange(n)])
+        bench.common.report('geo_complete', per_second=n / elapsed)
+        elapsed, _ = bench.common.timed(lambda: [index.locality_ids('1', u'Курская область') for i in xrange(n)])
+        bench.common.report('geo_locality_ids', per_second=n / elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# building models of stored values: validated constructor against the trusted paths
+import datetime
+
+import orm.codegen
+import orm.columnar
+import orm.field
+import orm.manager
+import orm.model
+
+import bench.common
+
+
+def make_model():
+    class Reading(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=orm.columnar.ColumnarStorage)
+
+        sensor_id = orm.field.IntegerField()
+        mark = orm.field.HexTextField(max_len=24)
+        ts = orm.field.DateField()
+        duration = orm.field.IntegerField(default=0)
+    return Reading
+
+
+def validated(model_cls, values):
+    # what loading through Field.__set__ costs
+    model = model_cls.__new__(model_cls)
+    for name, value in values.iteritems():
+        setattr(model, name, value)
+    return model
+
+
+def main():
+    model_cls = make_model()
+    ts = datetime.datetime(2017, 5, 1, 9, 0)
+    names = model_cls._cls_meta.field_names
+    for n in bench.common.sizes([100000]):
+        rows = [{'id': i, 'sensor_id': i % 16, 'mark': 'E2000016120F', 'ts': ts, 'duration': 0} for i in xrange(n)]
+        tuples = [tuple(values[name] for name in names) for values in rows]
+        for name, build, data in (
+            ('validated', lambda values: validated(model_cls, values), rows),
+            ('from_values', model_cls._from_values, rows),
+            ('from_trusted', orm.codegen.resolve(model_cls._from_trusted), rows),
+            ('from_trusted_row', orm.codegen.resolve(model_cls._from_trusted_row), tuples),
+        ):
+            elapsed, _ = bench.common.timed(map, build, data)
+            bench.common.report('hydrate_' + name, n=n, per_second=n / elapsed)
+        model_cls.objects.bulk_create(rows)
+        elapsed, _ = bench.common.timed(model_cls.objects.all().all)
+        bench.common.report('hydrate_columnar_select', n=n, per_second=n / elapsed)
+
+
+if __name__ == '__main__':
+    main()
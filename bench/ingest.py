@@ -0,0 +1,58 @@
+# load generator: sensors stream reads over tcp into the ingestion pipeline
+import datetime
+import socket
+import threading
+import time
+
+import models.events
+import timing.ingest
+
+import bench.common
+
+
+def sensor(address, sensor_id, reads, marks=5000, repeats=3):
+    # every mark passes the mat once and is read `repeats` times
+    connection = socket.create_connection(address)
+    start = datetime.datetime(2026, 5, 1, 9)
+    lines = []
+    for i in xrange(reads // repeats):
+        ts = start + datetime.timedelta(milliseconds=i * 10)
+        line = timing.ingest.format_line(sensor_id, i % marks, ts, rssi=-60)
+        lines.extend([line] * repeats)
+        if len(lines) >= 1000:
+            connection.sendall(''.join(lines))
+            lines = []
+    connection.sendall(''.join(lines))
+    connection.close()
+
+
+def run(sensors, reads):
+    pipeline = timing.ingest.Pipeline(models.events.RfidEvent)
+    source = pipeline.add_source(timing.ingest.TcpSource())
+    pipeline.start()
+    started = time.time()
+    threads = [
+        threading.Thread(target=sensor, args=(source.address, sensor_id, reads))
+        for sensor_id in xrange(sensors)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = sensors * (reads // 3) * 3
+    while pipeline.metrics.snapshot()['received'] < expected:
+        time.sleep(0.01)
+    pipeline.stop()
+    metrics = pipeline.metrics.snapshot()
+    metrics['reads_per_second'] = metrics['received'] / (time.time() - started)
+    return metrics
+
+
+def main():
+    for reads in bench.common.sizes([30000]):
+        metrics = run(sensors=8, reads=reads)
+        bench.common.report('ingest', reads_per_sensor=reads, **metrics)
+
+
+if __name__ == '__main__':
+    main()
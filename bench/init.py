@@ -0,0 +1,44 @@
+# model instantiation and validated assignment throughput
+import datetime
+
+import orm.field
+import orm.model
+
+import bench.common
+
+
+def make_model():
+    class Reading(orm.model.Model):
+        sensor_id = orm.field.IntegerField()
+        mark = orm.field.HexTextField(max_len=24)
+        ts = orm.field.DateField()
+        duration = orm.field.IntegerField(default=0)
+        kind = orm.field.ChoicesField(('start', 'split', 'finish'), default='split')
+    return Reading
+
+
+def main():
+    model_cls = make_model()
+    ts = datetime.datetime(2017, 5, 1, 9, 0)
+    mark = 'E2000016120F0123456789AB'
+    for n in bench.common.sizes([100000]):
+        def create():
+            for i in xrange(n):
+                model_cls(id=i, sensor_id=i % 16, mark=mark, ts=ts)
+
+        def assign():
+            model = model_cls(id=0, sensor_id=0, mark=mark, ts=ts)
+            for i in xrange(n):
+                model.sensor_id = i % 16
+                model.mark = mark
+                model.ts = ts
+                model.kind = 'finish'
+
+        elapsed, _ = bench.common.timed(create)
+        bench.common.report('init', n=n, per_second=n / elapsed)
+        elapsed, _ = bench.common.timed(assign)
+        bench.common.report('validated_assign', n=n, per_second=n / elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# photo finish matching: a scan of all photos per rfid event, the batch join and the stream matcher
+import datetime
+import random
+
+import models.events
+import timing.matching
+
+import bench.common
+
+CHECKPOINTS = 5
+WINDOW = 0.5
+SCAN_LIMIT = 2000
+
+
+def make_events(n):
+    random.seed(n)
+    start = datetime.datetime(2020, 5, 1, 9)
+    span = n / 10.0  # ten rfid reads a second
+
+    def ts():
+        return start + datetime.timedelta(seconds=random.uniform(0, span))
+    events = [
+        models.events.RfidEvent(id=i, ts=ts(), sensor_id=random.randrange(CHECKPOINTS), mark_id=i)
+        for i in xrange(n)
+    ]
+    photos = [
+        models.events.PhotoEvent(id=i, ts=ts(), sensor_id=random.randrange(CHECKPOINTS), photo_id='0' * 64)
+        for i in xrange(n)
+    ]
+    return events, photos
+
+
+def scan(events, photos):
+    # sensors are checkpoints here
+    window = int(WINDOW * 1000000)
+    matched = 0
+    for event in events:
+        ts = timing.matching.micros(event)
+        best = None
+        for photo in photos:
+            if photo.sensor_id == event.sensor_id:
+                distance = abs(timing.matching.micros(photo) - ts)
+                if distance <= window and (best is None or distance < best):
+                    best = distance
+        matched += best is not None
+    return matched
+
+
+def stream(events, photos, checkpoints):
+    matches = []
+    matcher = timing.matching.Matcher(
+        models.events.PhotoEvent, WINDOW, on_match=matches.append,
+        event_checkpoints=checkpoints, media_checkpoints=checkpoints,
+    )
+    arrivals = sorted([(event.ts, False, event) for event in events] + [(photo.ts, True, photo) for photo in photos])
+    for _, is_media, item in arrivals:
+        if is_media:
+            matcher.add_media(item)
+        else:
+            matcher.add_event(item)
+    matcher.flush()
+    return matches
+
+
+def main():
+    checkpoints = {i: i + 1 for i in xrange(CHECKPOINTS)}
+    for n in bench.common.sizes([2000, 20000, 200000]):
+        events, photos = make_events(n)
+        if n <= SCAN_LIMIT:
+            elapsed, _ = bench.common.timed(scan, events, photos)
+            bench.common.report('matching_scan', n=n, seconds=elapsed)
+        elapsed, _ = bench.common.timed(timing.matching.match, events, photos, checkpoints, checkpoints, WINDOW)
+        bench.common.report('matching_batch', n=n, seconds=elapsed)
+        elapsed, _ = bench.common.timed(stream, events, photos, checkpoints)
+        bench.common.report('matching_stream', n=n, seconds=elapsed, per_event_us=elapsed / (2 * n) * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# resident memory per model instance, plain dict rows and the instance meta layout models had
+# before their slots are shown for comparison
+import datetime
+import gc
+import resource
+import subprocess
+import sys
+
+import orm.field
+import orm.model
+
+import bench.common
+
+
+class Read(orm.model.Model):
+    ts = orm.field.DateField()
+    duration = orm.field.IntegerField(default=0)
+    sensor_id = orm.field.IntegerField()
+    mark_id = orm.field.IntegerField()
+
+
+class MetaRead(object):
+    # an instance meta holding a values dict, as models kept their values before slots
+    def __init__(self, **values):
+        self._meta = orm.model.InstanceMeta(values=values)
+
+
+def rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build_dicts(n):
+    ts = datetime.datetime.now()
+    return [{'id': i, 'ts': ts, 'duration': 0, 'sensor_id': i % 8, 'mark_id': i} for i in xrange(n)]
+
+
+def build_instance_metas(n):
+    ts = datetime.datetime.now()
+    return [MetaRead(id=i, ts=ts, duration=0, sensor_id=i % 8, mark_id=i) for i in xrange(n)]
+
+
+def build_models(n):
+    ts = datetime.datetime.now()
+    return [Read(id=i, ts=ts, duration=0, sensor_id=i % 8, mark_id=i) for i in xrange(n)]
+
+
+MIN_ROWS = 10 ** 5  # smaller sizes are built many times, rss grows by whole pages
+
+BUILDS = [
+    ('dict_rows', build_dicts),
+    ('instance_meta', build_instance_metas),
+    ('models', build_models),
+]
+
+
+def bytes_per_row(name, n):
+    # in a process of its own: memory freed by an earlier build would be reused by the next one
+    code = 'import bench.memory; bench.memory.measure({!r}, {})'.format(name, n)
+    return int(subprocess.check_output([sys.executable, '-c', code]))
+
+
+def measure(name, n):
+    build = dict(BUILDS)[name]
+    copies = -(-MIN_ROWS // n)
+    gc.collect()
+    before = rss()
+    rows = [build(n) for _ in xrange(copies)]
+    gc.collect()
+    print((rss() - before) // (copies * n))
+    del rows
+
+
+def main():
+    for n in bench.common.sizes([10 ** 5, 10 ** 6]):
+        for name, _ in BUILDS:
+            bench.common.report(name, n=n, bytes_per_row=bytes_per_row(name, n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# range + ordered queries on a sorted index against the same queries over a plain field
+import random
+
+import orm.field
+import orm.model
+
+import bench.common
+
+
+def make_model():
+    class Split(orm.model.Model):
+        ts = orm.field.IntegerField(index='sorted')
+        plain_ts = orm.field.IntegerField()
+    return Split
+
+
+def fill(model_cls, n):
+    values = range(n)
+    random.shuffle(values)
+    model_cls.objects.bulk_create({'id': i, 'ts': ts, 'plain_ts': ts} for i, ts in enumerate(values))
+
+
+def run_queries(model_cls, n, field_name, repeat=20):
+    # 0.1% wide ranges and the 10 latest rows
+    width = max(n // 1000, 1)
+    for _ in xrange(repeat):
+        lo = random.randint(0, n - width)
+        model_cls.objects.filter(**{field_name + '__range': (lo, lo + width)}).count()
+        model_cls.objects.order_by('-' + field_name).limit(10).all()
+
+
+def main():
+    for n in bench.common.sizes([10 ** 4, 10 ** 5, 10 ** 6]):
+        model_cls = make_model()
+        fill(model_cls, n)
+        for field_name in ('plain_ts', 'ts'):
+            elapsed, _ = bench.common.timed(run_queries, model_cls, n, field_name)
+            bench.common.report('range_' + field_name, n=n, per_query=elapsed / 40)
+
+
+if __name__ == '__main__':
+    main()
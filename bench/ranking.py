@@ -0,0 +1,80 @@
+# live ranking: latency of one event with n runners on the course, leaderboard and rank reads
+import datetime
+import random
+import time
+
+import models.base
+import models.events
+import timing.ranking
+
+import bench.common
+
+CHECKPOINTS = 6
+
+
+def make_race(n):
+    gun = datetime.datetime(2020, 5, 1, 9)
+    race = models.base.Race(id=n, name='bench', start=gun)
+    race.save()
+    kinds = ['start'] + ['plain'] * (CHECKPOINTS - 2) + ['finish']
+    pks = range(n * 100, n * 100 + CHECKPOINTS)
+    models.base.Checkpoint.objects.bulk_create({'id': pk, 'kind': kind} for pk, kind in zip(pks, kinds))
+    config = models.base.RaceConfig(id=n, race_id=race.pk, checkpoints=pks, min_gap=5)
+    config.save()
+    models.base.RfidMark.objects.bulk_create(
+        {'id': n * 100 + i, 'user_id': i, 'race_id': race.pk} for i in xrange(n)
+    )
+    sensor_checkpoints = {i: pk for i, pk in enumerate(pks)}
+    return race, config, sensor_checkpoints
+
+
+def make_events(n, gun):
+    # every runner passes every checkpoint at its own pace, some reads are repeated
+    random.seed(n)
+    events = []
+    for i in xrange(n):
+        pace = random.uniform(200, 400)
+        delay = random.uniform(0, 120)
+        for step in xrange(CHECKPOINTS):
+            ts = gun + datetime.timedelta(seconds=delay + step * pace * 2)
+            for _ in xrange(2 if random.random() < 0.2 else 1):
+                events.append(models.events.RfidEvent(
+                    id=len(events) + 1, ts=ts, sensor_id=step, mark_id=n * 100 + i,
+                ))
+    events.sort(key=lambda event: event.ts)
+    return events
+
+
+def main():
+    for n in bench.common.sizes([2000, 20000]):
+        race, config, sensor_checkpoints = make_race(n)
+        events = make_events(n, race.start)
+        ranking = timing.ranking.Ranking(race, config, sensor_checkpoints)
+        latencies = []
+        add = ranking.add
+        for event in events:
+            started = time.time()
+            add(event)
+            latencies.append(time.time() - started)
+        latencies.sort()
+        bench.common.report(
+            'ranking_event', n=n, events=len(events),
+            mean_ms=sum(latencies) / len(latencies) * 1000,
+            p99_ms=latencies[int(len(latencies) * 0.99)] * 1000,
+            max_ms=latencies[-1] * 1000,
+        )
+        elapsed, _ = bench.common.timed(lambda: [ranking.leaders(10) for _ in xrange(1000)])
+        bench.common.report('ranking_leaders_10', n=n, per_call_ms=elapsed)  # 1000 calls
+        user_ids = random.sample(xrange(n), 1000)
+        elapsed, _ = bench.common.timed(lambda: [ranking.rank(user_id) for user_id in user_ids])
+        bench.common.report('ranking_rank', n=n, per_call_ms=elapsed)
+
+        def resort():
+            # what every event would cost without the index
+            return sorted(runner.key for runner in ranking.runners.itervalues())[:10]
+        elapsed, _ = bench.common.timed(resort)
+        bench.common.report('ranking_full_sort', n=n, ms=elapsed * 1000)
+
+
+if __name__ == '__main__':
+    main()
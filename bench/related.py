@@ -0,0 +1,55 @@
+# resolving foreign keys of a result set: a get per pk, in_bulk per model, one in_bulk per field
+import orm.field
+import orm.model
+import orm.session
+
+import bench.common
+
+
+def make_models():
+    class Mark(orm.model.Model):
+        code = orm.field.IntegerField()
+
+    class Runner(orm.model.Model):
+        marks = orm.field.ForeignKeyField(Mark, multi=True)
+    return Mark, Runner
+
+
+def reset(runner_cls):
+    # runners stay in ram storage with resolved marks cached, a new value drops the cache
+    for runner in runner_cls.objects.all():
+        runner.marks = list(runner_cls.marks.value(runner))
+
+
+def main():
+    for n in bench.common.sizes([1000, 10000]):
+        mark_cls, runner_cls = make_models()
+        mark_cls.objects.bulk_create({'id': i, 'code': i} for i in xrange(n * 5))
+        runner_cls.objects.bulk_create({'id': i, 'marks': range(i * 5, i * 5 + 5)} for i in xrange(n))
+
+        def get_each():
+            return sum(
+                len([mark_cls.objects.get(id=pk) for pk in runner_cls.marks.value(runner)])
+                for runner in runner_cls.objects.all()
+            )
+
+        def read(queryset):
+            return sum(len(runner.marks) for runner in queryset)
+
+        elapsed, _ = bench.common.timed(get_each)
+        bench.common.report('related_get_each', n=n, seconds=elapsed)
+        elapsed, _ = bench.common.timed(read, runner_cls.objects.all())
+        bench.common.report('related_in_bulk', n=n, seconds=elapsed)
+        elapsed, _ = bench.common.timed(read, runner_cls.objects.all())
+        bench.common.report('related_cached', n=n, seconds=elapsed)
+        reset(runner_cls)
+        elapsed, _ = bench.common.timed(read, runner_cls.objects.all().prefetch_related('marks'))
+        bench.common.report('related_prefetched', n=n, seconds=elapsed)
+        reset(runner_cls)
+        with orm.session.Session():
+            elapsed, _ = bench.common.timed(read, runner_cls.objects.all().prefetch_related('marks'))
+        bench.common.report('related_prefetched_session', n=n, seconds=elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# round trips to a storage server: one request per call, batched writes and gets, pipelined selects;
+# counts by many client threads, served by the server alone and by read workers
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import orm.field
+import orm.manager
+import orm.model
+import orm.query
+import orm.remote
+
+import bench.common
+
+
+class Reading(orm.model.Model):
+    objects = orm.manager.ModelManager(storage_cls=orm.remote.RemoteStorage)
+
+    sensor_id = orm.field.IntegerField(index=True)
+
+
+def start_server(path, readers=0):
+    server = subprocess.Popen([sys.executable, '-m', 'orm.remote', '--readers', str(readers), path, 'bench.remote'])
+    while not os.path.exists(path + '.read' if readers else path):
+        time.sleep(0.01)
+    return server
+
+
+def stop_server(server, path):
+    orm.remote.RemoteStorage.close()
+    # lets the server's threads see the closed connections, else they fail at its exit
+    time.sleep(0.1)
+    server.terminate()
+    server.wait()
+    for name in (path, path + '.read', path + '.snap'):
+        if os.path.exists(name):
+            os.unlink(name)
+
+
+def parallel_counts(reading_cls, clients, queries):
+    # the hash index of sensor_id doesn't serve lt, so each count scans the rows where it's served
+    def run():
+        for i in xrange(queries):
+            reading_cls.objects.filter(sensor_id__lt=i % 100).count()
+
+    threads = [threading.Thread(target=run) for _ in xrange(clients)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - started
+
+
+def main():
+    # the server serves models of bench.remote, so the class is taken from there, not __main__
+    import bench.remote
+    reading_cls = bench.remote.Reading
+    path = os.path.join(tempfile.mkdtemp(), 'chrono.sock')
+    server = start_server(path)
+    try:
+        orm.remote.RemoteStorage.connect(path)
+        storage = reading_cls.objects.storage
+        for n in bench.common.sizes([10000]):
+            offset = len(reading_cls.objects.all())
+
+            def save_each():
+                for i in xrange(n):
+                    reading_cls(id=offset + i, sensor_id=i % 100).save()
+
+            elapsed, _ = bench.common.timed(save_each)
+            bench.common.report('remote_save', n=n, per_second=n / elapsed)
+
+            rows = [dict(id=offset + n + i, sensor_id=i % 100) for i in xrange(n)]
+            elapsed, _ = bench.common.timed(reading_cls.objects.bulk_create, rows)
+            bench.common.report('remote_bulk_create', n=n, per_second=n / elapsed)
+
+            pks = range(offset, offset + n)
+            elapsed, _ = bench.common.timed(lambda: [reading_cls.objects.get(id=pk) for pk in pks])
+            bench.common.report('remote_get', n=n, per_second=n / elapsed)
+            elapsed, _ = bench.common.timed(storage.get_many, pks)
+            bench.common.report('remote_get_many', n=n, per_second=n / elapsed)
+
+            queries = [[orm.query.Condition('sensor_id', 'exact', sensor_id)] for sensor_id in xrange(100)]
+            elapsed, _ = bench.common.timed(lambda: [list(storage.select(query)) for query in queries])
+            bench.common.report('remote_select', queries=len(queries), seconds=elapsed)
+            elapsed, _ = bench.common.timed(storage.select_many, queries)
+            bench.common.report('remote_select_pipelined', queries=len(queries), seconds=elapsed)
+    finally:
+        stop_server(server, path)
+
+    clients = 8
+    for readers in (0, 4):
+        server = start_server(path, readers)
+        try:
+            orm.remote.RemoteStorage.connect(path, pool_size=clients, read_path=path + '.read' if readers else None)
+            reading_cls.objects.bulk_create([dict(id=i, sensor_id=i % 100) for i in xrange(20000)])
+            # the read workers see the rows once the next snapshot is taken
+            time.sleep(2 * orm.remote.SNAPSHOT_INTERVAL)
+            queries = 50
+            elapsed = parallel_counts(reading_cls, clients, queries)
+            bench.common.report('remote_parallel_count', readers=readers, per_second=clients * queries / elapsed)
+        finally:
+            stop_server(server, path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# emergency rules over a race: latency per event with n runners and the cost of one periodic scan
+import datetime
+import random
+import time
+
+import models.base
+import models.events
+import timing.ranking
+import timing.rules
+
+import bench.common
+
+CHECKPOINTS = 24
+DROPPED = 0.02  # runners who leave the course halfway
+
+
+def make_race(n):
+    race = models.base.Race(id=n, name='bench', start=datetime.datetime(2020, 5, 1, 9))
+    race.save()
+    pks = range(n * 100, n * 100 + CHECKPOINTS)
+    models.base.Checkpoint.objects.bulk_create({'id': pk} for pk in pks)
+    config = models.base.RaceConfig(id=n, race_id=race.pk, checkpoints=pks, min_gap=5)
+    config.save()
+    models.base.RfidMark.objects.bulk_create(
+        {'id': n * 100 + i, 'user_id': i, 'race_id': race.pk} for i in xrange(n)
+    )
+    return race, config, {i: pk for i, pk in enumerate(pks)}
+
+
+def make_events(n, gun):
+    random.seed(n)
+    events = []
+    for i in xrange(n):
+        pace = random.uniform(300, 600)  # seconds per leg
+        last = CHECKPOINTS // 2 if random.random() < DROPPED else CHECKPOINTS
+        for step in xrange(last):
+            ts = gun + datetime.timedelta(seconds=random.uniform(0, 60) + step * pace)
+            events.append(models.events.RfidEvent(id=len(events) + 1, ts=ts, sensor_id=step, mark_id=n * 100 + i))
+    events.sort(key=lambda event: event.ts)
+    return events
+
+
+def main():
+    for n in bench.common.sizes([2000, 20000]):
+        race, config, sensor_checkpoints = make_race(n)
+        events = make_events(n, race.start)
+        ranking = timing.ranking.Ranking(race, config, sensor_checkpoints)
+        engine = timing.rules.RuleEngine(ranking, timing.rules.default_rules())
+        latencies = []
+        add = engine.add
+        for event in events:
+            started = time.time()
+            add(event)
+            latencies.append(time.time() - started)
+        engine.tick(events[-1].ts + datetime.timedelta(hours=2))
+        latencies.sort()
+        bench.common.report(
+            'rules_event', n=n, events=len(events), emergencies=sum(engine.counts.values()),
+            mean_ms=sum(latencies) / len(latencies) * 1000,
+            p99_ms=latencies[int(len(latencies) * 0.99)] * 1000,
+        )
+
+        def scan():
+            # what a periodic check of every runner costs
+            now = ranking.runners[0].last
+            return sum(1 for runner in ranking.runners.itervalues() if now - runner.last > 1800000000)
+        elapsed, _ = bench.common.timed(scan)
+        bench.common.report('rules_full_scan', n=n, ms=elapsed * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+# saving N models should grow linearly: per_row stays flat while n grows
+import orm.field
+import orm.model
+
+import bench.common
+
+
+def make_model():
+    class Participant(orm.model.Model):
+        bib = orm.field.IntegerField(unique=True)
+        chip = orm.field.TextField(max_len=16, unique=True)
+        lastname = orm.field.TextField(max_len=128)
+    return Participant
+
+
+def save_all(model_cls, n):
+    for i in xrange(n):
+        model_cls(id=i, bib=i, chip='chip{}'.format(i), lastname='runner').save()
+
+
+def main():
+    for n in bench.common.sizes([1000, 10000, 50000]):
+        elapsed, _ = bench.common.timed(save_all, make_model(), n)
+        bench.common.report('save', n=n, total=elapsed, per_row=elapsed / n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# cold start from a mapped snapshot: open, pk lookup and a full scan on one field
+import datetime
+import os
+import tempfile
+
+import orm.field
+import orm.manager
+import orm.model
+import orm.snapshot
+import orm.storage
+
+import bench.common
+
+
+def make_model(storage_cls):
+    class Result(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=storage_cls)
+
+        lastname = orm.field.TextField(max_len=128)
+        finish = orm.field.DateField()
+        place = orm.field.IntegerField()
+    return Result
+
+
+def write(path, n):
+    model_cls = make_model(orm.storage.SingletonRamStorage)
+    start = datetime.datetime(2026, 5, 1, 9)
+    model_cls.objects.bulk_create(
+        {'id': i, 'lastname': 'runner{}'.format(i % 1000), 'finish': start + datetime.timedelta(seconds=i), 'place': i}
+        for i in xrange(n)
+    )
+    orm.snapshot.write_snapshot(path, [model_cls])
+
+
+def main():
+    for n in bench.common.sizes([10 ** 5, 10 ** 6]):
+        path = os.path.join(tempfile.mkdtemp(), 'results.snap')
+        written, _ = bench.common.timed(write, path, n)
+        opened, _ = bench.common.timed(orm.snapshot.SnapshotStorage.open, path)
+        model_cls = make_model(orm.snapshot.SnapshotStorage)
+        lookup, _ = bench.common.timed(model_cls.objects.get, id=n // 2)
+        scan, _ = bench.common.timed(model_cls.objects.filter(place__lt=10).count)
+        orm.snapshot.SnapshotStorage.close()
+        bench.common.report('snapshot', n=n, write=written, open=opened, pk_get=lookup, scan=scan,
+                            size=os.path.getsize(path))
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
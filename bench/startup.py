@@ -0,0 +1,69 @@
+# import time of packages in fresh interpreters, like -X importtime of python 3.7
+#   python -m bench.startup                  totals of the default modules
+#   python -m bench.startup models.events    totals and the slowest imports of one module
+import os
+import subprocess
+import sys
+
+import bench.common
+
+
+MODULES = ['const.geo', 'const.geo_index', 'orm.model', 'orm.columnar', 'models.base', 'models.events', 'timing.ingest']
+REPEAT = 7
+SLOWEST = 15
+
+# runs in the child: times every first import, cumulative and without nested imports
+PROBE = r'''
+import sys, time
+import __builtin__
+original_import = __builtin__.__import__
+stack = []
+timings = []
+
+def timed_import(name, globals=None, locals=None, fromlist=None, level=-1):
+    if name in sys.modules:
+        return original_import(name, globals, locals, fromlist, level)
+    stack.append(0.0)
+    started = time.time()
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - started
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        if name in sys.modules:
+            timings.append((name, elapsed, elapsed - nested))
+
+__builtin__.__import__ = timed_import
+started = time.time()
+__import__(sys.argv[1])
+total = time.time() - started
+__builtin__.__import__ = original_import
+print(repr((total, timings)))
+'''
+
+
+def run_probe(module):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # compiled modules are cached as they are in production
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    output = subprocess.check_output([sys.executable, '-c', PROBE, module], env=env)
+    return eval(output)
+
+
+def main():
+    modules = sys.argv[1:] or MODULES
+    for module in modules:
+        run_probe(module)  # warm up, writes bytecode
+        runs = sorted((run_probe(module) for _ in xrange(REPEAT)), key=lambda run: run[0])
+        total, timings = runs[len(runs) // 2]
+        bench.common.report('import ' + module, ms=total * 1000)
+        if len(modules) == 1:
+            timings.sort(key=lambda timing: -timing[2])
+            for name, cumulative, own in timings[:SLOWEST]:
+                print('    {:<40} self_ms={:.3f} cumulative_ms={:.3f}'.format(name, own * 1000, cumulative * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# ingest through the write-ahead log against ram only, then restart-to-ready time
+import datetime
+import shutil
+import tempfile
+
+import orm.field
+import orm.manager
+import orm.model
+import orm.storage
+import orm.wal
+
+import bench.common
+
+
+def make_model(storage_cls):
+    class Read(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=storage_cls)
+
+        ts = orm.field.DateField()
+        sensor_id = orm.field.IntegerField()
+        mark_id = orm.field.IntegerField()
+    return Read
+
+
+def ingest(model_cls, n, batch=1000):
+    start = datetime.datetime(2026, 5, 1, 9)
+    for first in xrange(0, n, batch):
+        model_cls.objects.bulk_create(
+            {'id': i, 'ts': start + datetime.timedelta(milliseconds=i), 'sensor_id': i % 16, 'mark_id': i % 5000}
+            for i in xrange(first, min(first + batch, n))
+        )
+
+
+def restart(directory):
+    orm.wal.LogStorage.open(directory)
+    model_cls = make_model(orm.wal.LogStorage)
+    return model_cls.objects.all().count()
+
+
+def main():
+    for n in bench.common.sizes([10 ** 5, 10 ** 6]):
+        directory = tempfile.mkdtemp()
+        try:
+            ram, _ = bench.common.timed(ingest, make_model(orm.storage.SingletonRamStorage), n)
+            orm.wal.LogStorage.open(directory)
+            logged, _ = bench.common.timed(ingest, make_model(orm.wal.LogStorage), n)
+            orm.wal.LogStorage.close()
+            from_log, count = bench.common.timed(restart, directory)
+            assert count == n
+            orm.wal.LogStorage.snapshot()
+            orm.wal.LogStorage.close()
+            from_snapshot, count = bench.common.timed(restart, directory)
+            assert count == n
+            orm.wal.LogStorage.close()
+            bench.common.report('ingest', n=n, ram_per_row=ram / n, wal_per_row=logged / n)
+            bench.common.report('restart', n=n, from_log=from_log, from_snapshot=from_snapshot)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+# data of const.geo, import const.geo instead
+COUNTRIES = {
+    1: "Россия",
+    2: "Украина",
+    3: "Беларусь",
+    4: "Казахстан",
+    5: "Азербайджан",
+    6: "Армения",
+    7: "Грузия",
+    8: "Израиль",
+    9: "США",
+    10: "Канада",
+    11: "Кыргызстан",
+    12: "Латвия",
+    13: "Литва",
+    14: "Эстония",
+    15: "Молдова",
+    16: "Таджикистан",
+    17: "Туркменистан",
+    18: "Узбекистан",
+    19: "Австралия",
+    20: "Австрия",
+    21: "Албания",
+    22: "Алжир",
+    23: "Американское Самоа",
+    24: "Ангилья",
+    25: "Ангола",
+    26: "Андорра",
+    27: "Антигуа и Барбуда",
+    28: "Аргентина",
+    29: "Аруба",
+    30: "Афганистан",
+    31: "Багамы",
+    32: "Бангладеш",
+    33: "Барбадос",
+    34: "Бахрейн",
+    35: "Белиз",
+    36: "Бельгия",
+    37: "Бенин",
+    38: "Бермуды",
+    39: "Болгария",
+    40: "Боливия",
+    41: "Босния и Герцеговина",
+    42: "Ботсвана",
+    43: "Бразилия",
+    44: "Бруней-Даруссалам",
+    45: "Буркина-Фасо",
+    46: "Бурунди",
+    47: "Бутан",
+    48: "Вануату",
+    49: "Великобритания",
+    50: "Венгрия",
+    51: "Венесуэла",
+    52: "Виргинские острова, Британские",
+    53: "Виргинские острова, США",
+    54: "Восточный Тимор",
+    55: "Вьетнам",
+    56: "Габон",
+    57: "Гаити",
+    58: "Гайана",
+    59: "Гамбия",
+    60: "Гана",
+    61: "Гваделупа",
+    62: "Гватемала",
+    63: "Гвинея",
+    64: "Гвинея-Бисау",
+    65: "Германия",
+    66: "Гибралтар",
+    67: "Гондурас",
+    68: "Гонконг",
+    69: "Гренада",
+    70: "Гренландия",
+    71: "Греция",
+    72: "Гуам",
+    73: "Дания",
+    74: "Доминика",
+    75: "Доминиканская Республика",
+    76: "Египет",
+    77: "Замбия",
+    78: "Западная Сахара",
+    79: "Зимбабве",
+    80: "Индия",
+    81: "Индонезия",
+    82: "Иордания",
+    83: "Ирак",
+    84: "Иран",
+    85: "Ирландия",
+    86: "Исландия",
+    87: "Испания",
+    88: "Италия",
+    89: "Йемен",
+    90: "Кабо-Верде",
+    91: "Камбоджа",
+    92: "Камерун",
+    93: "Катар",
+    94: "Кения",
+    95: "Кипр",
+    96: "Кирибати",
+    97: "Китай",
+    98: "Колумбия",
+    99: "Коморы",
+    100: "Конго",
+    101: "Конго, демократическая республика",
+    102: "Коста-Рика",
+    103: "Кот д`Ивуар",
+    104: "Куба",
+    105: "Кувейт",
+    106: "Лаос",
+    107: "Лесото",
+    108: "Либерия",
+    109: "Ливан",
+    110: "Ливия",
+    111: "Лихтенштейн",
+    112: "Люксембург",
+    113: "Маврикий",
+    114: "Мавритания",
+    115: "Мадагаскар",
+    116: "Макао",
+    117: "Македония",
+    118: "Малави",
+    119: "Малайзия",
+    120: "Мали",
+    121: "Мальдивы",
+    122: "Мальта",
+    123: "Марокко",
+    124: "Мартиника",
+    125: "Маршалловы Острова",
+    126: "Мексика",
+    127: "Микронезия, федеративные штаты",
+    128: "Мозамбик",
+    129: "Монако",
+    130: "Монголия",
+    131: "Монтсеррат",
+    132: "Мьянма",
+    133: "Намибия",
+    134: "Науру",
+    135: "Непал",
+    136: "Нигер",
+    137: "Нигерия",
+    138: "Кюрасао",
+    139: "Нидерланды",
+    140: "Никарагуа",
+    141: "Ниуэ",
+    142: "Новая Зеландия",
+    143: "Новая Каледония",
+    144: "Норвегия",
+    145: "Объединенные Арабские Эмираты",
+    146: "Оман",
+    147: "Остров Мэн",
+    148: "Остров Норфолк",
+    149: "Острова Кайман",
+    150: "Острова Кука",
+    151: "Острова Теркс и Кайкос",
+    152: "Пакистан",
+    153: "Палау",
+    154: "Палестинская автономия",
+    155: "Панама",
+    156: "Папуа - Новая Гвинея",
+    157: "Парагвай",
+    158: "Перу",
+    159: "Питкерн",
+    160: "Польша",
+    161: "Португалия",
+    162: "Пуэрто-Рико",
+    163: "Реюньон",
+    164: "Руанда",
+    165: "Румыния",
+    166: "Сальвадор",
+    167: "Самоа",
+    168: "Сан-Марино",
+    169: "Сан-Томе и Принсипи",
+    170: "Саудовская Аравия",
+    171: "Свазиленд",
+    172: "Святая Елена",
+    173: "Северная Корея",
+    174: "Северные Марианские острова",
+    175: "Сейшелы",
+    176: "Сенегал",
+    177: "Сент-Винсент",
+    178: "Сент-Китс и Невис",
+    179: "Сент-Люсия",
+    180: "Сент-Пьер и Микелон",
+    181: "Сербия",
+    182: "Сингапур",
+    183: "Сирийская Арабская Республика",
+    184: "Словакия",
+    185: "Словения",
+    186: "Соломоновы Острова",
+    187: "Сомали",
+    188: "Судан",
+    189: "Суринам",
+    190: "Сьерра-Леоне",
+    191: "Таиланд",
+    192: "Тайвань",
+    193: "Танзания",
+    194: "Того",
+    195: "Токелау",
+    196: "Тонга",
+    197: "Тринидад и Тобаго",
+    198: "Тувалу",
+    199: "Тунис",
+    200: "Турция",
+    201: "Уганда",
+    202: "Уоллис и Футуна",
+    203: "Уругвай",
+    204: "Фарерские острова",
+    205: "Фиджи",
+    206: "Филиппины",
+    207: "Финляндия",
+    208: "Фолклендские острова",
+    209: "Франция",
+    210: "Французская Гвиана",
+    211: "Французская Полинезия",
+    212: "Хорватия",
+    213: "Центрально-Африканская Республика",
+    214: "Чад",
+    215: "Чехия",
+    216: "Чили",
+    217: "Швейцария",
+    218: "Швеция",
+    219: "Шпицберген и Ян Майен",
+    220: "Шри-Ланка",
+    221: "Эквадор",
+    222: "Экваториальная Гвинея",
+    223: "Эритрея",
+    224: "Эфиопия",
+    226: "Южная Корея",
+    227: "Южно-Африканская Республика",
+    228: "Ямайка",
+    229: "Япония",
+    230: "Черногория",
+    231: "Джибути",
+    232: "Южный Судан",
+    233: "Ватикан",
+    234: "Синт-Мартен",
+    235: "Бонайре, Синт-Эстатиус и Саба",
+    236: "Гернси",
+    237: "Джерси",
+}
+
+REGIONS = {
+    1: {
+        1000001: "Адыгея",
+        1121540: "Алтай",
+        1121829: "Алтайский край",
+        1123488: "Амурская область",
+        1000236: "Архангельская область",
+        1004118: "Астраханская область",
+        1004565: "Башкортостан",
+        1009404: "Белгородская область",
+        1011109: "Брянская область",
+        1124157: "Бурятия",
+        1124833: "Владимирская область",
+        1014032: "Волгоградская область",
+        1015702: "Вологодская область",
+        1023816: "Воронежская область",
+        1025654: "Дагестан",
+        1127400: "Еврейская АОбл",
+        1159987: "Забайкальский край",
+        1027297: "Ивановская область",
+        1030371: "Ингушетия",
+        1127513: "Иркутская область",
+        1030428: "Кабардино-Балкарская",
+        1030632: "Калининградская область",
+        1031793: "Калмыкия",
+        1032084: "Калужская область",
+        1128991: "Камчатский край",
+        1035359: "Карачаево-Черкесская",
+        1035522: "Карелия",
+        1129059: "Кемеровская область",
+        1130218: "Кировская область",
+        1036606: "Коми",
+        1134737: "Корякский АО",
+        1037344: "Костромская область",
+        1040652: "Краснодарский край",
+        1134771: "Красноярский край",
+        1137144: "Курганская область",
+        1042388: "Курская область",
+        1045244: "Ленинградская область",
+        1048584: "Липецкая область",
+        1138434: "Магаданская область",
+        1050307: "Марий Эл",
+        1052052: "Мордовия",
+        1053480: "Московская область",
+        1060316: "Мурманская область",
+        5471696: "мусмусмус область",
+        5331184: "Ненецкий АО",
+        1138534: "Нижегородская область",
+        1060458: "Новгородская область",
+        1143518: "Новосибирская область",
+        1145150: "Омская область",
+        1146712: "Оренбургская область",
+        1064424: "Орловская область",
+        1067455: "Пензенская область",
+        1148549: "Пермский край",
+        1152714: "Приморский край",
+        1069004: "Псковская область",
+        1500001: "Республика Крым",
+        1077676: "Ростовская область",
+        1080077: "Рязанская область",
+        1082931: "Самарская область",
+        1084332: "Саратовская область",
+        1153366: "Саха /Якутия/",
+        1153840: "Сахалинская область",
+        1154131: "Свердловская область",
+        1086244: "Северная Осетия - Алания",
+        1086468: "Смоленская область",
+        1091406: "Ставропольский край",
+        1156333: "Таймырский (Долгано-Ненецкий) АО",
+        1092174: "Тамбовская область",
+        1094197: "Татарстан",
+        1097508: "Тверская область",
+        1156388: "Томская область",
+        1105465: "Тульская область",
+        1157049: "Тыва",
+        1157218: "Тюменская область",
+        1109098: "Удмуртская",
+        1111137: "Ульяновская область",
+        1158917: "Хабаровский край",
+        1159424: "Хакасия",
+        1159710: "Ханты-Мансийский Автономный округ - Югра АО",
+        1112201: "Челябинская область",
+        1113642: "Чеченская",
+        1113937: "Чувашская",
+        1160844: "Чукотский АО",
+        1160930: "Ямало-Ненецкий АО",
+        1115658: "Ярославская область",
+    },
+    2: {
+        1500595: "Винницкая область",
+        1501549: "Волынская область",
+        1502117: "Днепропетровская область",
+        1502709: "Донецкая область",
+        1503296: "Житомирская область",
+        1504102: "Закарпатская область",
+        1504503: "Запорожская область",
+        1504975: "Ивано-Франковская область",
+        1505578: "Киевская область",
+        1506310: "Кировоградская область",
+        1506831: "Луганская область",
+        1507378: "Львовская область",
+        1508347: "Николаевская область",
+        1508808: "Одесская область",
+        1509477: "Полтавская область",
+        1510213: "Ровненская область",
+        1510799: "Сумская область",
+        1511345: "Тернопольская область",
+        1512004: "Харьковская область",
+        1512710: "Херсонская область",
+        1513133: "Хмельницкая область",
+        1513930: "Черкасская область",
+        1514896: "Черниговская область",
+        1514541: "Черновицкая область",
+    },
+    3: {
+        1600001: "Брестская область",
+        1600563: "Витебская область",
+        1601201: "Гомельская область",
+        1601806: "Гродненская область",
+        1602269: "Минская область",
+        1602923: "Могилевская область",
+    },
+}
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# lookups over const.geo: name -> id, region -> country and prefix search for autocomplete
+# names are compared case-insensitively with ё taken as е, the index is built on first use
+#   const.geo_index.get_index().country_id(u'россия')
+#   const.geo_index.get_index().complete_region(u'кур', country_id=1)
+import re
+import threading
+
+import const.geo
+
+
+SPACES = re.compile(r'\s+', re.UNICODE)
+COMPLETE_LIMIT = 10
+MEMO_SIZE = 10000
+
+
+def normalize(name):
+    if isinstance(name, str):
+        name = name.decode('utf-8')
+    return SPACES.sub(u' ', name.strip().lower().replace(u'ё', u'е'))
+
+
+class Trie(object):
+    # every node keeps entries of its subtree sorted by name, so completion doesn't walk it
+    def __init__(self):
+        self.root = ({}, [])
+
+    def add(self, key, entry):
+        node = self.root
+        node[1].append(entry)
+        for char in key:
+            node = node[0].setdefault(char, ({}, []))
+            node[1].append(entry)
+
+    def freeze(self):
+        nodes = [self.root]
+        while nodes:
+            children, entries = nodes.pop()
+            entries.sort()
+            nodes.extend(children.itervalues())
+
+    def find(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1]
+
+
+class GeoIndex(object):
+    def __init__(self, countries, regions):
+        self.countries = countries  # id -> name
+        self.country_ids = {}  # normalized name -> id
+        self.region_ids = {}  # normalized name -> [(country id, region id)]
+        self.region_names = {}  # region id -> name
+        self.region_countries = {}  # region id -> country id
+        self.country_trie = Trie()
+        self.region_trie = Trie()
+        self.memo = {}  # raw (country, region) of localities -> ids, imports repeat them a lot
+
+        for country_id, name in countries.iteritems():
+            key = normalize(name)
+            self.country_ids[key] = country_id
+            self.country_trie.add(key, (key, country_id))
+        for country_id, country_regions in regions.iteritems():
+            for region_id, name in country_regions.iteritems():
+                key = normalize(name)
+                self.region_ids.setdefault(key, []).append((country_id, region_id))
+                self.region_names[region_id] = name
+                self.region_countries[region_id] = country_id
+                self.region_trie.add(key, (key, region_id))
+        self.country_trie.freeze()
+        self.region_trie.freeze()
+
+    def country_id(self, name):
+        return self.country_ids.get(normalize(name))
+
+    def region_id(self, name, country_id=None):
+        for region_country_id, region_id in self.region_ids.get(normalize(name), ()):
+            if country_id is None or region_country_id == country_id:
+                return region_id
+        return None
+
+    def region_country(self, region_id):
+        return self.region_countries.get(region_id)
+
+    def complete_country(self, prefix, limit=COMPLETE_LIMIT):
+        # [(id, name)] of countries whose names start with prefix
+        entries = self.country_trie.find(normalize(prefix))
+        return [(country_id, self.countries[country_id]) for _, country_id in entries[:limit]]
+
+    def complete_region(self, prefix, country_id=None, limit=COMPLETE_LIMIT):
+        result = []
+        for _, region_id in self.region_trie.find(normalize(prefix)):
+            if country_id is None or self.region_countries[region_id] == country_id:
+                result.append((region_id, self.region_names[region_id]))
+                if len(result) >= limit:
+                    break
+        return result
+
+    def locality_ids(self, country, region=None):
+        # (country id, region id) of Locality strings, countries may be given by id too
+        try:
+            return self.memo[country, region]
+        except KeyError:
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            ids = self.memo[country, region] = self._locality_ids(country, region)
+            return ids
+
+    def _locality_ids(self, country, region):
+        # no country is no filter, the region may still give one
+        if country is None:
+            country_id = None
+        else:
+            try:
+                country_id = int(country)
+            except ValueError:
+                country_id = self.country_id(country)
+            else:
+                if country_id not in self.countries:
+                    country_id = None
+        region_id = None if region is None else self.region_id(region, country_id)
+        if country_id is None and region_id is not None:
+            country_id = self.region_countries[region_id]
+        return country_id, region_id
+
+
+index = None
+index_lock = threading.Lock()
+
+
+def get_index():
+    global index
+    if index is None:
+        with index_lock:
+            if index is None:
+                index = GeoIndex(const.geo.COUNTRIES, const.geo.REGIONS)
+    return index
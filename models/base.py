@@ -18,30 +18,40 @@ class Locality(orm.model.Model):
 
 
 class Race(orm.model.Model):
-    pass
-
-
-class RaceConfig(orm.model.Model):
-    pass
+    name = orm.field.TextField(max_len=128)
+    start = orm.field.DateField()  # gun time
 
 
 class Checkpoint(orm.model.Model):
-    # a group of sensors
+    # a group of sensors, see Sensor.checkpoint_id
+    kind = orm.field.ChoicesField(('start', 'finish', 'plain', 'cross'), default='plain')
+    registration = orm.field.ChoicesField(('required', 'optional', 'absent'), default='required')
 
-    # type: [start, finish, plain, cross]
-    # registration: [required, optional, absent]
-    pass
+
+class RaceConfig(orm.model.Model):
+    race_id = orm.field.IntegerField(index=True)
+    # checkpoints in the order runners pass them, repeated for laps
+    checkpoints = orm.field.ForeignKeyField(Checkpoint, multi=True)
+    # reads of one checkpoint closer than this (seconds) are one pass, the default covers
+    # several sensors of a checkpoint and lagging ones; laps are longer than that
+    min_gap = orm.field.IntegerField(default=10)
 
 
 class RfidMark(orm.model.Model):
     # it's possible to use multiple marks per user
+    # RfidEvent.mark_id is the pk of a mark
 
-    # type
-    # size
-    pass
+    user_id = orm.field.IntegerField(index=True)
+    race_id = orm.field.IntegerField(index=True)
 
 
 class Emergency(orm.model.Model):
     # object that represents context which we can't handle
-    # requires human reaction
-    pass
+    # requires human reaction, see timing.rules
+    rule = orm.field.TextField(max_len=64)
+    ts = orm.field.DateField()
+    message = orm.field.TextField(default='')
+    user_id = orm.field.IntegerField(default=0)
+    mark_id = orm.field.IntegerField(default=0)
+    sensor_id = orm.field.IntegerField(default=0)
+    checkpoint_id = orm.field.IntegerField(default=0)
@@ -1,25 +1,25 @@
-import models
+import orm.columnar
+import orm.field
+import orm.manager
+import orm.model
 
 
-class Event(models.base.Model):
-    # event on sensor
+class Event(orm.model.Model):
+    # event on sensor, written at sensor rate so kept in columns
+    objects = orm.manager.ModelManager(storage_cls=orm.columnar.ColumnarStorage)
 
-    # ts
-    # duration
-    # sensor_id
-    pass
+    ts = orm.field.DateField()
+    duration = orm.field.IntegerField(default=0)
+    sensor_id = orm.field.IntegerField()
 
 
 class RfidEvent(Event):
-    # mark_id
-    pass
+    mark_id = orm.field.IntegerField()
 
 
 class PhotoEvent(Event):
-    # photo_id
-    pass
+    photo_id = orm.field.HexTextField(max_len=64)  # digest of the photo in an orm.blob.BlobStore
 
 
 class VideoEvent(Event):
-    # video_id
-    pass
+    video_id = orm.field.HexTextField(max_len=64)  # digest of the video in an orm.blob.BlobStore
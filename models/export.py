@@ -0,0 +1,70 @@
+# export columns of users with their localities, resolved by chunk instead of per row
+#   localities = models.export.LocalityCache()
+#   orm.export.write_csv(stream, User.objects.all(), models.export.user_columns(localities))
+import const.geo
+import orm.export
+
+import models.base
+
+
+class LocalityCache(object):
+    # localities of a chunk are loaded by one in_bulk, the cache is dropped when it's full
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.localities = {}  # pk -> locality or None
+        self.countries = {}  # country value -> name
+
+    def load(self, pks):
+        missing = set(pks).difference(self.localities)
+        missing.discard(0)  # users without a locality
+        if not missing:
+            return
+        if len(self.localities) + len(missing) > self.max_size:
+            self.localities.clear()
+        loaded = models.base.Locality.objects.in_bulk(missing)
+        for pk in missing:
+            self.localities[pk] = loaded.get(pk)
+
+    def get(self, pk):
+        return self.localities.get(pk)
+
+    def country_name(self, country):
+        # localities keep a country id of const.geo or a name
+        try:
+            return self.countries[country]
+        except KeyError:
+            try:
+                name = const.geo.COUNTRIES.get(int(country), country)
+            except ValueError:
+                name = country
+            self.countries[country] = name
+            return name
+
+
+class LocalityColumn(orm.export.Column):
+    def __init__(self, name, cache, get_value):
+        super(LocalityColumn, self).__init__(name, self.value)
+        self.cache = cache
+        self.get_value = get_value
+
+    def prepare(self, users):
+        self.cache.load(user.locality_id for user in users)
+
+    def value(self, user):
+        locality = self.cache.get(user.locality_id)
+        if locality is None:
+            return None
+        return self.get_value(locality)
+
+
+def user_columns(cache=None):
+    cache = cache or LocalityCache()
+    return [
+        'id',
+        'firstname',
+        'lastname',
+        'bdate',
+        LocalityColumn('city', cache, lambda locality: locality.city),
+        LocalityColumn('region', cache, lambda locality: locality.region),
+        LocalityColumn('country', cache, lambda locality: cache.country_name(locality.country)),
+    ]
@@ -1,10 +1,10 @@
-import models
+import orm.field
+import orm.model
 
 
-class Sensor(models.base.Model):
-    # id
+class Sensor(orm.model.Model):
     # content_type
-    pass
+    checkpoint_id = orm.field.IntegerField(default=0)
 
 
 class RfidSensor(Sensor):
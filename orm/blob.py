@@ -0,0 +1,252 @@
+# content-addressed blobs on local disk, e.g. photos and videos of sensors: a blob is stored once
+# under the sha256 of its bytes and models keep only the digest in a HexTextField
+#   store = orm.blob.BlobStore('/srv/media')
+#   digest = store.put(data)
+#   with store.writer() as writer:
+#       for chunk in chunks:
+#           writer.write(chunk)
+#   store.get(writer.digest).send(sock)
+# files are <root>/<2 digits>/<2 digits>/<digest>, written into <root>/tmp and renamed into place
+import errno
+import hashlib
+import mmap
+import os
+import Queue
+import tempfile
+import threading
+
+import orm.error
+import orm.field
+
+
+DIGEST_SIZE = 64
+SHARD_LEVELS = 2
+SEND_CHUNK = 1 << 20
+
+
+def make_dirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def remove(path):
+    # a missing file is removed already
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+class Blob(object):
+    # nothing is opened until the bytes are needed
+    def __init__(self, store, digest):
+        self.digest = digest
+        self.path = store.path(digest)
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def read(self):
+        with self.open() as blob:
+            return blob.read()
+
+    def mmap(self):
+        # a read-only map, pages are shared with the page cache instead of copied
+        with self.open() as blob:
+            if not os.fstat(blob.fileno()).st_size:
+                return b''
+            return mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def send(self, sock):
+        # sendfile where os has it, slices of the map otherwise
+        with self.open() as blob:
+            size = os.fstat(blob.fileno()).st_size
+            if hasattr(os, 'sendfile'):
+                offset = 0
+                while offset < size:
+                    offset += os.sendfile(sock.fileno(), blob.fileno(), offset, size - offset)
+                return size
+            if size:
+                data = mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    for offset in xrange(0, size, SEND_CHUNK):
+                        sock.sendall(buffer(data, offset, SEND_CHUNK))
+                finally:
+                    data.close()
+            return size
+
+
+class BlobWriter(object):
+    # streams chunks into a temporary file, the digest is known after commit
+    def __init__(self, store):
+        self.store = store
+        self.hash = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_root)
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.digest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def write(self, data):
+        self.hash.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        # the temporary file is removed when it can't be stored
+        try:
+            self.file.flush()
+            if self.store.durable:
+                os.fsync(self.file.fileno())
+            self.file.close()
+            self.digest = self.hash.hexdigest().upper()
+            self.store._link(self.tmp_path, self.digest, self.size)
+        except Exception:
+            self.file.close()
+            remove(self.tmp_path)
+            raise
+        return self.digest
+
+    def abort(self):
+        self.file.close()
+        os.unlink(self.tmp_path)
+
+
+class BlobStore(object):
+    def __init__(self, root, durable=True):
+        self.root = root
+        self.tmp_root = os.path.join(root, 'tmp')
+        self.durable = durable  # fsync blobs before they get their names
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes = 0
+        make_dirs(self.tmp_root)
+
+    def path(self, digest):
+        if len(digest) != DIGEST_SIZE or not orm.field.HexTextField.pattern.match(digest):
+            raise ValueError('not a blob digest: {!r}'.format(digest))
+        shards = [digest[i * 2:i * 2 + 2] for i in xrange(SHARD_LEVELS)]
+        return os.path.join(self.root, *(shards + [digest]))
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def get(self, digest):
+        blob = Blob(self, digest)
+        if not os.path.exists(blob.path):
+            raise orm.error.DoesNotExistError(digest)
+        return blob
+
+    def writer(self):
+        return BlobWriter(self)
+
+    def put(self, data):
+        # identical bytes are hashed and found without touching the disk
+        digest = hashlib.sha256(data).hexdigest().upper()
+        if os.path.exists(self.path(digest)):
+            with self.lock:
+                self.deduplicated += 1
+            return digest
+        with self.writer() as writer:
+            writer.write(data)
+        return digest
+
+    def delete(self, digest):
+        remove(self.path(digest))
+
+    def _link(self, tmp_path, digest, size):
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            with self.lock:
+                self.deduplicated += 1
+            return
+        os.chmod(tmp_path, 0o444)
+        make_dirs(os.path.dirname(path))
+        # a writer of the same bytes may win the race, rename replaces its blob with an equal one
+        os.rename(tmp_path, path)
+        with self.lock:
+            self.stored += 1
+            self.bytes += size
+
+
+class BlobQueue(object):
+    # writes blobs on its own threads, so bursts of photos don't hold up threads of sensor events;
+    # the callback gets the digest on a writer thread, e.g. to save the PhotoEvent;
+    # failed writes and callbacks which raised are counted, the threads go on
+    def __init__(self, store, threads=2, queue_size=1000):
+        self.store = store
+        self.queue = Queue.Queue(queue_size)
+        self.failed = 0
+        self.callback_failed = 0
+        self.threads = []
+        for i in xrange(threads):
+            thread = threading.Thread(target=self._write_loop, name='blob-writer-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, data, callback=None, block=True):
+        # data is bytes or an iterable of chunks, returns False when the queue is full and block is False
+        try:
+            self.queue.put((data, callback), block)
+        except Queue.Full:
+            return False
+        return True
+
+    def join(self):
+        self.queue.join()
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                data, callback = item
+                try:
+                    digest = self._write(data)
+                except Exception:
+                    # a failing chunk iterator or a bad chunk must not stop the writer
+                    with self.store.lock:
+                        self.failed += 1
+                    continue
+                if callback is not None:
+                    try:
+                        callback(digest)
+                    except Exception:
+                        with self.store.lock:
+                            self.callback_failed += 1
+            finally:
+                self.queue.task_done()
+
+    def _write(self, data):
+        if isinstance(data, bytes):
+            return self.store.put(data)
+        with self.store.writer() as writer:
+            for chunk in data:
+                writer.write(chunk)
+        return writer.digest
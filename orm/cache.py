@@ -0,0 +1,215 @@
+# results of querysets kept per model class and normalized query, for screens which repeat
+# the same queries between writes
+#   class User(orm.model.Model):
+#       objects = orm.manager.ModelManager(cache_size=1000)
+#   User.objects.filter(locality_id=1).all()  # the second time it's a dict lookup
+#   User.objects.cache.stats()
+# saves and drops through the manager invalidate entries the model was or now is in the result of:
+# the pks of every result are indexed, new states are checked against conditions, entries with an
+# exact condition are found by its value. sliced results are dropped by any write of the class.
+# writes which bypass the manager (e.g. changing a stored model in place without save) aren't seen
+import collections
+import threading
+
+
+def freeze(lookup, arg):
+    # a hashable form of a condition argument, raises TypeError if there is none
+    if lookup == 'in':
+        return frozenset(arg)
+    if isinstance(arg, list):
+        return list, tuple(arg)
+    hash(arg)
+    return arg
+
+
+def query_key(kind, queryset):
+    conditions = tuple(sorted(
+        (condition.field_name, condition.lookup, freeze(condition.lookup, condition.arg))
+        for condition in queryset.conditions
+    ))
+    return kind, conditions, queryset.ordering, queryset.offset, queryset._limit, queryset.related
+
+
+class Entry(object):
+    __slots__ = ('key', 'result', 'size', 'conditions', 'pks', 'exact')
+
+    def __init__(self, key, result, size, conditions, pks, exact):
+        self.key = key
+        self.result = result
+        self.size = size  # models kept by the result
+        self.conditions = conditions
+        self.pks = pks  # pks of all matched models, None for sliced results
+        self.exact = exact  # (field name, frozen value) of an exact condition or None
+
+
+class QueryCache(object):
+    def __init__(self, model_cls, max_size=1000, max_models=1000000):
+        self.model_cls = model_cls
+        self.max_size = max_size
+        self.max_models = max_models
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> entry, least recently used first
+        self.models = 0
+        self.by_pk = {}  # pk -> keys of results matching it
+        self.by_exact = {}  # (field name, frozen value) -> keys
+        self.exact_fields = collections.Counter()  # field name -> entries indexed by it
+        self.scanned = set()  # keys of entries without exact conditions
+        self.sliced = set()
+        self.generation = 0  # writes seen, results read before a write aren't stored
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'models': self.models,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+            }
+
+    def results(self, queryset, compute):
+        # the list of models of a queryset
+        return self._lookup('list', queryset, compute, len)
+
+    def count(self, queryset, compute):
+        return self._lookup('count', queryset, compute, lambda count: 0)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.models = 0
+            self.by_pk.clear()
+            self.by_exact.clear()
+            self.exact_fields.clear()
+            self.scanned.clear()
+            self.sliced.clear()
+
+    def saved(self, models):
+        # models were stored with their current values
+        with self.lock:
+            self.generation += 1
+            if not self.entries:
+                return
+            keys = set(self.sliced)
+            for model in models:
+                keys.update(self.by_pk.get(model.pk, ()))
+                for field_name in self.exact_fields:
+                    try:
+                        value = freeze('exact', getattr(self.model_cls, field_name).value(model))
+                    except (TypeError, AttributeError):
+                        continue
+                    for key in self.by_exact.get((field_name, value), ()):
+                        if key not in keys and self._matches(self.entries[key], model):
+                            keys.add(key)
+                for key in self.scanned:
+                    if key not in keys and self._matches(self.entries[key], model):
+                        keys.add(key)
+            self._invalidate(keys)
+
+    def dropped(self, models):
+        with self.lock:
+            self.generation += 1
+            if not self.entries:
+                return
+            keys = set(self.sliced)
+            for model in models:
+                keys.update(self.by_pk.get(model.pk, ()))
+            self._invalidate(keys)
+
+    def _lookup(self, kind, queryset, compute, size):
+        try:
+            key = query_key(kind, queryset)
+        except TypeError:
+            return compute()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+                self.hits += 1
+                return entry.result
+            self.misses += 1
+            generation = self.generation
+        sliced = queryset.offset or queryset._limit is not None
+        pks = None
+        if sliced:
+            result = compute()
+        elif kind == 'count':
+            pks = frozenset(model.pk for model in queryset.manager.storage.select(queryset.conditions))
+            result = len(pks)
+        else:
+            result = compute()
+            pks = frozenset(model.pk for model in result)
+        exact = None
+        for condition in queryset.conditions:
+            if condition.lookup == 'exact':
+                exact = condition.field_name, freeze('exact', condition.arg)
+                break
+        entry = Entry(key, result, size(result), queryset.conditions, pks, exact)
+        with self.lock:
+            if generation == self.generation and key not in self.entries:
+                self._add(entry)
+        return result
+
+    def _matches(self, entry, model):
+        try:
+            return all(condition(model) for condition in entry.conditions)
+        except (AttributeError, TypeError):
+            return True
+
+    def _add(self, entry):
+        key = entry.key
+        self.entries[key] = entry
+        self.models += entry.size
+        if entry.pks is None:
+            self.sliced.add(key)
+        else:
+            for pk in entry.pks:
+                self.by_pk.setdefault(pk, set()).add(key)
+        if entry.exact is None:
+            self.scanned.add(key)
+        else:
+            self.by_exact.setdefault(entry.exact, set()).add(key)
+            self.exact_fields[entry.exact[0]] += 1
+        while len(self.entries) > self.max_size or (self.models > self.max_models and len(self.entries) > 1):
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _invalidate(self, keys):
+        for key in keys:
+            if key in self.entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.models -= entry.size
+        if entry.pks is None:
+            self.sliced.discard(key)
+        else:
+            for pk in entry.pks:
+                keys = self.by_pk[pk]
+                keys.discard(key)
+                if not keys:
+                    del self.by_pk[pk]
+        if entry.exact is None:
+            self.scanned.discard(key)
+        else:
+            keys = self.by_exact[entry.exact]
+            keys.discard(key)
+            if not keys:
+                del self.by_exact[entry.exact]
+            self.exact_fields[entry.exact[0]] -= 1
+            if not self.exact_fields[entry.exact[0]]:
+                del self.exact_fields[entry.exact[0]]
@@ -0,0 +1,348 @@
+# compact binary encoding of models, the layout is derived from field types of a model class
+#   codec = orm.codec.get_codec(RfidEvent)
+#   data = codec.encode_many(events)
+#   events = codec.decode_many(data)
+# records keep no field names: both sides need the same model class, batches carry
+# a fingerprint of the layout to catch mismatches
+#
+# record: presence bitmap of fields (fields with defaults may be unset), then set values
+# in _cls_meta.field_names order
+#   integers      varint, zigzag if the field allows negative values
+#   dates         zigzag varint of microseconds since epoch
+#   hex text      varint count of digits and packed nibbles
+#   text          varint (byte length << 1 | is unicode) and bytes, utf-8 for unicode
+#   other values  varint length and a pickle
+#
+# encode_value and decode_value handle plain values of any type below, for data from other
+# processes which shouldn't be unpickled: a tag byte, then
+#   None, True, False   nothing
+#   int, long           zigzag varint
+#   float               8 bytes, little endian
+#   str, unicode        as text above
+#   datetime            as dates above
+#   list, tuple, set, frozenset, dict   varint count and items, dicts as keys and values in turn
+import binascii
+import cPickle as pickle
+import datetime
+import struct
+import zlib
+
+import orm.codegen
+import orm.field
+
+
+BYTES = [chr(i) for i in xrange(256)]
+
+INT = 'int'
+SIGNED_INT = 'signed_int'
+DATE = 'date'
+HEX = 'hex'
+TEXT = 'text'
+OBJECT = 'object'
+
+
+def encode_varint(value, out):
+    while value > 0x7f:
+        out.append(BYTES[(value & 0x7f) | 0x80])
+        value >>= 7
+    out.append(BYTES[value])
+
+
+def decode_varint(data, offset):
+    # data is a bytearray
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    result = byte & 0x7f
+    shift = 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, offset + 1
+        shift += 7
+
+
+def encode_signed(value, out):
+    encode_varint(value << 1 if value >= 0 else (-value << 1) - 1, out)
+
+
+def decode_signed(data, offset):
+    value, offset = decode_varint(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+
+def encode_date(value, out):
+    encode_signed(orm.field.datetime_to_micros(value), out)
+
+
+def decode_date(data, offset):
+    micros, offset = decode_signed(data, offset)
+    return orm.field.micros_to_datetime(micros), offset
+
+
+def encode_hex(value, out):
+    encode_varint(len(value), out)
+    out.append(binascii.unhexlify(value + '0' if len(value) & 1 else value))
+
+
+def decode_hex(data, offset):
+    count, offset = decode_varint(data, offset)
+    end = offset + (count + 1) // 2
+    return binascii.hexlify(data[offset:end])[:count].upper(), end
+
+
+def encode_text(value, out):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+        encode_varint(len(value) << 1 | 1, out)
+    else:
+        encode_varint(len(value) << 1, out)
+    out.append(value)
+
+
+def decode_text(data, offset):
+    header, offset = decode_varint(data, offset)
+    end = offset + (header >> 1)
+    if header & 1:
+        return data[offset:end].decode('utf-8'), end
+    return str(data[offset:end]), end
+
+
+def encode_object(value, out):
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    encode_varint(len(data), out)
+    out.append(data)
+
+
+def decode_object(data, offset):
+    length, offset = decode_varint(data, offset)
+    end = offset + length
+    return pickle.loads(str(data[offset:end])), end
+
+
+CODERS = {
+    INT: (encode_varint, decode_varint),
+    SIGNED_INT: (encode_signed, decode_signed),
+    DATE: (encode_date, decode_date),
+    HEX: (encode_hex, decode_hex),
+    TEXT: (encode_text, decode_text),
+    OBJECT: (encode_object, decode_object),
+}
+
+
+FLOAT = struct.Struct('<d')
+
+NONE_TAG = 0
+TRUE_TAG = 1
+FALSE_TAG = 2
+INTEGER_TAG = 3
+FLOAT_TAG = 4
+TEXT_TAG = 5
+DATE_TAG = 6
+LIST_TAG = 7
+TUPLE_TAG = 8
+SET_TAG = 9
+FROZENSET_TAG = 10
+DICT_TAG = 11
+
+COLLECTION_TAGS = {list: LIST_TAG, tuple: TUPLE_TAG, set: SET_TAG, frozenset: FROZENSET_TAG}
+COLLECTION_TYPES = {tag: kind for kind, tag in COLLECTION_TAGS.iteritems()}
+
+
+def encode_value(value, out):
+    # raises TypeError for values of other types, subclasses included
+    kind = type(value)
+    if value is None:
+        out.append(BYTES[NONE_TAG])
+    elif kind is bool:
+        out.append(BYTES[TRUE_TAG if value else FALSE_TAG])
+    elif kind is int or kind is long:
+        out.append(BYTES[INTEGER_TAG])
+        encode_signed(value, out)
+    elif kind is float:
+        out.append(BYTES[FLOAT_TAG])
+        out.append(FLOAT.pack(value))
+    elif kind is str or kind is unicode:
+        out.append(BYTES[TEXT_TAG])
+        encode_text(value, out)
+    elif kind is datetime.datetime:
+        out.append(BYTES[DATE_TAG])
+        encode_date(value, out)
+    elif kind in COLLECTION_TAGS:
+        out.append(BYTES[COLLECTION_TAGS[kind]])
+        encode_varint(len(value), out)
+        for item in value:
+            encode_value(item, out)
+    elif kind is dict:
+        out.append(BYTES[DICT_TAG])
+        encode_varint(len(value), out)
+        for key, item in value.iteritems():
+            encode_value(key, out)
+            encode_value(item, out)
+    else:
+        raise TypeError('{} values can\'t be encoded'.format(kind.__name__))
+
+
+def decode_value(data, offset):
+    # data is a bytearray, raises ValueError for unknown tags and IndexError for truncated data
+    tag = data[offset]
+    offset += 1
+    if tag == NONE_TAG:
+        return None, offset
+    if tag == TRUE_TAG:
+        return True, offset
+    if tag == FALSE_TAG:
+        return False, offset
+    if tag == INTEGER_TAG:
+        return decode_signed(data, offset)
+    if tag == FLOAT_TAG:
+        if offset + FLOAT.size > len(data):
+            raise IndexError(offset)
+        return FLOAT.unpack_from(buffer(data), offset)[0], offset + FLOAT.size
+    if tag == TEXT_TAG:
+        value, offset = decode_text(data, offset)
+        if offset > len(data):
+            raise IndexError(offset)
+        return value, offset
+    if tag == DATE_TAG:
+        return decode_date(data, offset)
+    if tag == DICT_TAG:
+        count, offset = decode_varint(data, offset)
+        result = {}
+        for _ in xrange(count):
+            key, offset = decode_value(data, offset)
+            result[key], offset = decode_value(data, offset)
+        return result, offset
+    if tag in COLLECTION_TYPES:
+        count, offset = decode_varint(data, offset)
+        items = []
+        for _ in xrange(count):
+            item, offset = decode_value(data, offset)
+            items.append(item)
+        kind = COLLECTION_TYPES[tag]
+        return (items if kind is list else kind(items)), offset
+    raise ValueError('unknown tag {}'.format(tag))
+
+
+def field_kind(field):
+    if isinstance(field, orm.field.DateField):
+        return DATE
+    if isinstance(field, orm.field.IntegerField):
+        return INT if field.minimum >= 0 else SIGNED_INT
+    if isinstance(field, orm.field.HexTextField):
+        return HEX
+    if isinstance(field, orm.field.TextField):
+        return TEXT
+    return OBJECT
+
+
+class Codec(object):
+    def __init__(self, model_cls):
+        self.model_cls = model_cls
+        self.names = list(model_cls._cls_meta.field_names)
+        self.kinds = [field_kind(getattr(model_cls, name)) for name in self.names]
+        layout = repr(zip(self.names, self.kinds))
+        self.fingerprint = zlib.crc32(layout) & 0xffffffff
+        self.bitmap_size = (len(self.names) + 7) // 8
+        self.encode_into = self._compile_encoder()
+        self.decode_from = self._compile_decoder()
+
+    def encode(self, model):
+        out = []
+        self.encode_into(model, out)
+        return b''.join(out)
+
+    def decode(self, data):
+        model, _ = self.decode_from(bytearray(data), 0)
+        return model
+
+    def encode_many(self, models):
+        # fingerprint, count and records in one buffer
+        records = []
+        encode_into = self.encode_into
+        count = 0
+        for model in models:
+            encode_into(model, records)
+            count += 1
+        out = []
+        encode_varint(self.fingerprint, out)
+        encode_varint(count, out)
+        out.extend(records)
+        return b''.join(out)
+
+    def decode_many(self, data):
+        data = bytearray(data)
+        fingerprint, offset = decode_varint(data, 0)
+        if fingerprint != self.fingerprint:
+            raise ValueError('data was encoded for another layout of {}'.format(self.model_cls.__name__))
+        count, offset = decode_varint(data, offset)
+        models = []
+        decode_from = self.decode_from
+        for _ in xrange(count):
+            model, offset = decode_from(data, offset)
+            models.append(model)
+        return models
+
+    def _compile_encoder(self):
+        namespace = {'BYTES': BYTES}
+        lines = [
+            'def encode_into(model, out):',
+            '    present = 0',
+        ]
+        for i, (name, kind) in enumerate(zip(self.names, self.kinds)):
+            namespace['get_{}'.format(i)] = getattr(self.model_cls, name).slot.__get__
+            namespace['encode_{}'.format(i)] = CODERS[kind][0]
+            lines.extend([
+                '    try:',
+                '        value_{0} = get_{0}(model)'.format(i),
+                '        present |= {}'.format(1 << i),
+                '    except AttributeError:',
+                '        pass',
+            ])
+        for byte in xrange(self.bitmap_size):
+            lines.append('    out.append(BYTES[(present >> {}) & 0xff])'.format(byte * 8))
+        for i in xrange(len(self.names)):
+            lines.append('    if present & {}:'.format(1 << i))
+            lines.append('        encode_{0}(value_{0}, out)'.format(i))
+        return orm.codegen.compile_function('encode_into', lines, namespace)
+
+    def _compile_decoder(self):
+        # a record with every field set is built by _from_trusted_row, others by _from_trusted
+        count = len(self.names)
+        namespace = {
+            'from_row': orm.codegen.resolve(self.model_cls._from_trusted_row),
+            'from_values': orm.codegen.resolve(self.model_cls._from_trusted),
+        }
+        lines = [
+            'def decode_from(data, offset):',
+            '    present = {}'.format(' | '.join(
+                'data[offset + {}] << {}'.format(byte, byte * 8) for byte in xrange(self.bitmap_size)
+            )),
+            '    offset += {}'.format(self.bitmap_size),
+            '    if present == {}:'.format((1 << count) - 1),
+        ]
+        for i, kind in enumerate(self.kinds):
+            namespace['decode_{}'.format(i)] = CODERS[kind][1]
+            lines.append('        value_{0}, offset = decode_{0}(data, offset)'.format(i))
+        lines.append('        return from_row(({},)), offset'.format(
+            ', '.join('value_{}'.format(i) for i in xrange(count))
+        ))
+        lines.append('    values = {}')
+        for i, name in enumerate(self.names):
+            lines.append('    if present & {}:'.format(1 << i))
+            lines.append('        values[{!r}], offset = decode_{}(data, offset)'.format(name, i))
+        lines.append('    return from_values(values), offset')
+        return orm.codegen.compile_function('decode_from', lines, namespace)
+
+
+codecs = {}  # model class -> codec
+
+
+def get_codec(model_cls):
+    try:
+        return codecs[model_cls]
+    except KeyError:
+        codec = codecs[model_cls] = Codec(model_cls)
+        return codec
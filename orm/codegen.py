@@ -0,0 +1,123 @@
+# functions generated from source for model classes, compiled when they are first called
+import datetime
+
+import orm.error
+
+
+def defining_class(klass, name):
+    for base in klass.__mro__:
+        if name in base.__dict__:
+            return base
+    return None
+
+
+def compile_function(name, lines, namespace):
+    source = '\n'.join(lines) + '\n'
+    code = compile(source, '<{}>'.format(name), 'exec')
+    exec(code, namespace)
+    return namespace[name]
+
+
+def lazy(compile_, install):
+    # stub compiling the function on its first call, install(function) puts it in place of the stub
+    compiled = []
+
+    def resolve():
+        if not compiled:
+            function = compile_()
+            install(function)
+            compiled.append(function)
+        return compiled[0]
+
+    def stub(*args, **kwargs):
+        return resolve()(*args, **kwargs)
+    stub.resolve = resolve
+    return stub
+
+
+def resolve(function):
+    # the compiled function of a stub, for callers which keep a reference to it
+    if hasattr(function, 'resolve'):
+        return function.resolve()
+    return function
+
+
+def has_validation_source(field):
+    # False if a subclass changed validate_value but not validation_source
+    field_cls = field.__class__
+    return issubclass(defining_class(field_cls, 'validation_source'), defining_class(field_cls, 'validate_value'))
+
+
+def compile_validator(field):
+    # validate_value with the checks of the field inlined
+    lines = ['def validate_value(value):']
+    lines.extend('    ' + line for line in field.validation_source())
+    lines.append('    return')
+    return compile_function('validate_value', lines, {'field': field, 'datetime': datetime})
+
+
+def compile_init(klass):
+    # __init__ with set lookups for parameter checks and a slot assignment per field
+    # values aren't validated here, same as before
+    names = klass._cls_meta.field_names
+    required = [name for name in names if not getattr(klass, name).has_default]
+    namespace = {
+        'field_names': frozenset(names),
+        'required': frozenset(required),
+        'UnknownParameterError': orm.error.UnknownParameterError,
+        'ModelError': orm.error.ModelError,
+    }
+    lines = [
+        'def __init__(self, **kwargs):',
+        '    keys = kwargs.viewkeys()',
+        '    if not keys <= field_names:',
+        '        raise UnknownParameterError',
+        '    if not required <= keys:',
+        '        raise ModelError',
+    ]
+    for i, name in enumerate(names):
+        setter = 'set_{}'.format(i)
+        namespace[setter] = getattr(klass, name).slot.__set__
+        if name in required:
+            lines.append('    {}(self, kwargs[{!r}])'.format(setter, name))
+        else:
+            lines.append('    if {!r} in kwargs:'.format(name))
+            lines.append('        {}(self, kwargs[{!r}])'.format(setter, name))
+    init = compile_function('__init__', lines, namespace)
+    init.generated = True
+    return init
+
+
+def compile_from_trusted(klass):
+    # model from a dict of stored values: no validation, missing fields stay unset
+    names = klass._cls_meta.field_names
+    namespace = {'klass': klass, 'new': object.__new__}
+    lines = [
+        'def from_trusted(values):',
+        '    model = new(klass)',
+    ]
+    for i, name in enumerate(names):
+        setter = 'set_{}'.format(i)
+        namespace[setter] = getattr(klass, name).slot.__set__
+        lines.append('    if {!r} in values:'.format(name))
+        lines.append('        {}(model, values[{!r}])'.format(setter, name))
+    lines.append('    return model')
+    return compile_function('from_trusted', lines, namespace)
+
+
+def compile_from_trusted_row(klass):
+    # model from a sequence of stored values ordered as _cls_meta.field_names, no dict is built
+    names = klass._cls_meta.field_names
+    namespace = {'klass': klass, 'new': object.__new__}
+    variables = ['value_{}'.format(i) for i in xrange(len(names))]
+    lines = [
+        'def from_trusted_row(row):',
+        '    model = new(klass)',
+        '    {}, = row'.format(', '.join(variables)),
+    ]
+    for i, name in enumerate(names):
+        setter = 'set_{}'.format(i)
+        namespace[setter] = getattr(klass, name).slot.__set__
+        lines.append('    {}(model, {})'.format(setter, variables[i]))
+    lines.append('    return model')
+    return compile_function('from_trusted_row', lines, namespace)
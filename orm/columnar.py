@@ -0,0 +1,329 @@
+# append-only columnar storage for models written at a high rate (sensor events)
+import array
+import collections
+import operator
+
+import orm.error
+import orm.field
+import orm.lazy
+import orm.query
+import orm.storage
+
+
+numpy = orm.lazy.LazyImport('numpy')  # ingestion alone doesn't need it
+
+
+def int64_typecode():
+    # 'q' came in python 3.3, 'l' is 4 bytes on some platforms
+    for typecode in ('q', 'l'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+def from_bytes(data, dtype):
+    # numpy arrays are built over copies: a view of an array.array or a bytearray
+    # would dangle once it grows and is moved
+    if not data:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.frombuffer(data, dtype=dtype)
+
+
+class Column(object):
+    # raw values in insertion order, rows of dropped models stay in place
+    def __init__(self, field):
+        self.field = field
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode_many(self, values):
+        # raw values to extend the column with, raises before the column is touched
+        if self.encode.__func__ is Column.encode.__func__:
+            return values
+        return map(self.encode, values)
+
+    def extend(self, raw_values):
+        self.values.extend(raw_values)
+
+    def get(self, row):
+        return self.decode(self.values[row])
+
+    def encode(self, value):
+        return value
+
+    def decode(self, raw):
+        return raw
+
+    def encode_arg(self, lookup, arg):
+        if lookup == 'in':
+            return [self.encode(value) for value in arg]
+        if lookup == 'range':
+            return self.encode(arg[0]), self.encode(arg[1])
+        return self.encode(arg)
+
+    def view(self):
+        return self.values
+
+
+class IntegerColumn(Column):
+    typecode = int64_typecode()  # values are kept in a list without one
+    dtype = 'int64'
+
+    def __init__(self, field):
+        super(IntegerColumn, self).__init__(field)
+        if self.typecode is not None:
+            self.values = array.array(self.typecode)
+
+    def encode_many(self, values):
+        raw_values = super(IntegerColumn, self).encode_many(values)
+        if self.typecode is None:
+            return raw_values
+        return array.array(self.typecode, raw_values)
+
+    def view(self):
+        # a numpy copy, the array itself without numpy
+        if not numpy:
+            return self.values
+        if self.typecode is None:
+            return numpy.array(self.values, dtype=self.dtype)
+        return from_bytes(self.values.tostring(), self.dtype)
+
+
+class DateColumn(IntegerColumn):
+    # microseconds since epoch
+    def encode(self, value):
+        return orm.field.datetime_to_micros(value)
+
+    def decode(self, raw):
+        return orm.field.micros_to_datetime(raw)
+
+
+def make_column(field):
+    if isinstance(field, orm.field.DateField):
+        return DateColumn(field)
+    if isinstance(field, orm.field.IntegerField):
+        return IntegerColumn(field)
+    return Column(field)
+
+
+class Table(object):
+    def __init__(self, model_cls):
+        self.model_cls = model_cls
+        self.pk_name = model_cls._cls_meta.primary_field
+        self.columns = collections.OrderedDict(
+            (name, make_column(getattr(model_cls, name)))
+            for name in model_cls._cls_meta.field_names
+        )
+        self.column_list = self.columns.values()
+        self.alive = bytearray()
+        self.rows = {}  # pk -> row of its current version
+        self.unique = {
+            name: {}  # value -> pk
+            for name in model_cls._cls_meta.unique_fields
+            if name != self.pk_name
+        }
+
+    def __len__(self):
+        return len(self.alive)
+
+    def kill(self, row):
+        self.alive[row] = 0
+        pk = self.columns[self.pk_name].get(row)
+        for name, owners in self.unique.iteritems():
+            owners.pop(self.columns[name].get(row), None)
+        del self.rows[pk]
+
+    def values(self, row):
+        return {
+            name: column.get(row)
+            for name, column in self.columns.iteritems()
+        }
+
+    def model(self, row):
+        # columns are ordered as field_names
+        return self.model_cls._from_trusted_row([column.get(row) for column in self.column_list])
+
+
+class ColumnarStorage(orm.storage.Storage):
+    # models are decomposed into typed columns, so reads return new instances
+    # re-saving a pk appends a new version of the row, the old one is dropped
+    tables = {}
+
+    def set(self, model):
+        self.set_many([model])
+
+    def set_many(self, models):
+        # values are gathered and encoded column by column, columns are extended once all are
+        table = self._get_table()
+        models = orm.storage.dedupe(list(models), operator.attrgetter('pk'))
+        batch = {
+            name: map(column.field.value, models)
+            for name, column in table.columns.iteritems()
+        }
+        pks = batch[table.pk_name]
+        self._check_unique(table, pks, batch)
+        first_row = len(table)
+        raw_batch = [(column, column.encode_many(batch[name])) for name, column in table.columns.iteritems()]
+        for column, raw_values in raw_batch:
+            column.extend(raw_values)
+        table.alive.extend(b'\x01' * len(pks))
+        for row, pk in enumerate(pks, first_row):
+            if pk in table.rows:
+                table.kill(table.rows[pk])
+            table.rows[pk] = row
+        for name, owners in table.unique.iteritems():
+            owners.update(zip(batch[name], pks))
+
+    def get(self, **query):
+        return list(self.select(orm.query.Condition.parse(query)))
+
+    def get_many(self, pks):
+        table = self._get_table()
+        return {pk: table.model(table.rows[pk]) for pk in pks if pk in table.rows}
+
+    def select(self, conditions):
+        table = self._get_table()
+        if not numpy:
+            rows = self._iter_rows(table, conditions)
+        else:
+            rows = self.select_rows(conditions)
+        return (table.model(row) for row in rows)
+
+    def select_ordered(self, conditions, field_name, reverse=False):
+        table = self._get_table()
+        rows = self.select_rows(conditions)
+        column = table.columns[field_name]
+        if numpy and isinstance(column, IntegerColumn):
+            rows = numpy.asarray(rows, dtype='int64')
+            rows = rows[numpy.argsort(column.view()[rows], kind='mergesort')]
+            rows = rows[::-1] if reverse else rows
+        else:
+            rows = sorted(rows, key=column.values.__getitem__, reverse=reverse)
+        return (table.model(row) for row in rows)
+
+    def count(self, conditions):
+        return len(self.select_rows(conditions))
+
+    def drop(self, *models):
+        table = self._get_table()
+        for model in models:
+            table.kill(table.rows[model.pk])
+
+    def select_rows(self, conditions):
+        # row numbers of alive rows matching all conditions
+        table = self._get_table()
+        pk_rows = None
+        rest = []
+        for condition in conditions:
+            if condition.field_name == table.pk_name and condition.lookup in ('exact', 'in'):
+                pks = [condition.arg] if condition.lookup == 'exact' else condition.arg
+                rows = set(table.rows[pk] for pk in pks if pk in table.rows)
+                pk_rows = rows if pk_rows is None else pk_rows & rows
+            else:
+                rest.append(condition)
+        if pk_rows is not None:
+            rest = self._prepare(table, rest)
+            return sorted(row for row in pk_rows if self._match(rest, row))
+        if numpy:
+            return numpy.flatnonzero(self._mask(table, rest)).tolist()
+        return list(self._iter_rows(table, rest))
+
+    def column(self, name):
+        # raw values of every row ever stored (dates as microseconds), see alive()
+        return self._get_table().columns[name].view()
+
+    def alive(self):
+        table = self._get_table()
+        if not numpy:
+            return table.alive
+        return from_bytes(bytes(table.alive), 'uint8').view(bool)
+
+    def count_by(self, field_name, conditions=()):
+        table = self._get_table()
+        column = table.columns[field_name]
+        rows = self.select_rows(conditions)
+        if numpy and isinstance(column, IntegerColumn):
+            values, counts = numpy.unique(column.view()[rows], return_counts=True)
+            return {column.decode(int(value)): int(count) for value, count in zip(values, counts)}
+        result = collections.Counter(column.values[row] for row in rows)
+        return {column.decode(value): count for value, count in result.iteritems()}
+
+    def min_by(self, group_name, field_name, conditions=()):
+        # e.g. min ts per mark: storage.min_by('mark_id', 'ts')
+        table = self._get_table()
+        groups, column = table.columns[group_name], table.columns[field_name]
+        result = {}
+        for row in self.select_rows(conditions):
+            group, value = groups.values[row], column.values[row]
+            if group not in result or value < result[group]:
+                result[group] = value
+        return {
+            groups.decode(group): column.decode(value)
+            for group, value in result.iteritems()
+        }
+
+    def _check_unique(self, table, pks, batch):
+        # stored rows re-saved by the batch give their values up
+        resaved = set(pks)
+        for name, owners in table.unique.iteritems():
+            batch_owners = {}
+            for pk, value in zip(pks, batch[name]):
+                if batch_owners.setdefault(value, pk) != pk or owners.get(value, pk) not in resaved:
+                    raise orm.error.FieldNotUniqueError(name)
+
+    def _iter_rows(self, table, conditions):
+        if any(condition.field_name == table.pk_name for condition in conditions):
+            for row in self.select_rows(conditions):
+                yield row
+            return
+        conditions = self._prepare(table, conditions)
+        alive = table.alive
+        for row in xrange(len(table)):
+            if alive[row] and self._match(conditions, row):
+                yield row
+
+    @staticmethod
+    def _prepare(table, conditions):
+        # (raw values, compare, encoded arg) of every condition
+        prepared = []
+        for condition in conditions:
+            column = table.columns[condition.field_name]
+            prepared.append((column.values, condition.compare, column.encode_arg(condition.lookup, condition.arg)))
+        return prepared
+
+    @staticmethod
+    def _match(conditions, row):
+        for values, compare, arg in conditions:
+            if not compare(values[row], arg):
+                return False
+        return True
+
+    @staticmethod
+    def _mask(table, conditions):
+        mask = from_bytes(bytes(table.alive), 'uint8').astype(bool)
+        for condition in conditions:
+            column = table.columns[condition.field_name]
+            arg = column.encode_arg(condition.lookup, condition.arg)
+            values = column.view()
+            if not isinstance(column, IntegerColumn):
+                values = numpy.array(values, dtype=object)
+            if condition.lookup == 'in':
+                mask &= numpy.in1d(values, arg)
+            elif condition.lookup == 'range':
+                mask &= (values >= arg[0]) & (values <= arg[1])
+            else:
+                mask &= condition.compare(values, arg)
+        return mask
+
+    def _get_table(self):
+        model_key = self.model_cls
+        try:
+            return self.tables[model_key]
+        except KeyError:
+            self.tables[model_key] = Table(self.model_cls)
+            return self.tables[model_key]
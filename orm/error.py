@@ -20,3 +20,15 @@ class FieldNotUniqueError(ModelError):
 
 class DoesNotExistError(ModelError):
     pass
+
+
+class UnknownLookupError(ModelError):
+    pass
+
+
+class ReadOnlyStorageError(ModelError):
+    pass
+
+
+class UnknownModelError(ModelError):
+    pass
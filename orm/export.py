@@ -0,0 +1,72 @@
+# streaming export of querysets to csv and json lines, rows are built and written chunk by chunk
+#   with open('users.csv', 'wb') as stream:
+#       orm.export.write_csv(stream, User.objects.all(), ['id', 'firstname', 'lastname'])
+# columns are field names or Column instances, a column may load what it needs for a whole chunk
+import collections
+import csv
+import datetime
+import json
+import operator
+
+
+class Column(object):
+    def __init__(self, name, get=None):
+        self.name = name
+        self.get = get or operator.attrgetter(name)
+
+    def prepare(self, models):
+        # called with every chunk before its rows are built
+        pass
+
+
+def make_columns(columns):
+    return [column if isinstance(column, Column) else Column(column) for column in columns]
+
+
+def iter_chunks(queryset, columns, chunk_size=1000):
+    # lists of rows, one per chunk of models
+    for models in queryset.chunks(chunk_size):
+        for column in columns:
+            column.prepare(models)
+        getters = [column.get for column in columns]
+        yield [[get(model) for get in getters] for model in models]
+
+
+def text(value):
+    # csv of python 2 writes byte strings only
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def write_csv(stream, queryset, columns, chunk_size=1000, **writer_options):
+    columns = make_columns(columns)
+    writer = csv.writer(stream, **writer_options)
+    writer.writerow([column.name for column in columns])
+    count = 0
+    for rows in iter_chunks(queryset, columns, chunk_size):
+        writer.writerows([map(text, row) for row in rows])
+        count += len(rows)
+    return count
+
+
+def write_jsonl(stream, queryset, columns, chunk_size=1000):
+    # one json object per line, byte strings are taken as utf-8
+    columns = make_columns(columns)
+    names = [column.name for column in columns]
+    encode = json.JSONEncoder(default=json_value).encode
+    count = 0
+    for rows in iter_chunks(queryset, columns, chunk_size):
+        stream.write(''.join(encode(collections.OrderedDict(zip(names, row))) + '\n' for row in rows))
+        count += len(rows)
+    return count
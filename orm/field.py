@@ -1,10 +1,30 @@
 # fields for models
 import datetime
+import re
 import sys
 
+import orm.error
+
+
+SLOT_PREFIX = '_f_'
+CACHE_SLOT_PREFIX = '_c_'
+
+
+def slot_name(name):
+    # name of the slot which keeps values of field name in model instances
+    return SLOT_PREFIX + name
+
+
+def cache_slot_name(name):
+    # name of the slot which keeps what a field computed from its value
+    return CACHE_SLOT_PREFIX + name
+
 
 class Field(object):
     name = None  # we should set this instance value from mcs
+    slot = None  # member descriptor of the slot, set from mcs too
+    cached = False  # fields with a cache slot
+    cache_slot = None
 
     def __init__(self, **common_kwargs):
         if 'default' in common_kwargs:
@@ -19,26 +39,39 @@ class Field(object):
         unique = bool(common_kwargs.get('unique', False))
         self.unique = unique or self.primary
 
+        # True (or 'hash') for equality lookups, 'sorted' for ranges and ordering too
+        self.index = common_kwargs.get('index', False)
+        if self.index not in (False, True, 'hash', 'sorted'):
+            raise ValueError(self.index)
+
     def __get__(self, instance, klass):
         if instance is None:
             return self
         try:
-            return instance._meta.values[self.name]
-        except KeyError:
+            return self.slot.__get__(instance, klass)
+        except AttributeError:
             if self.has_default:
                 return self.default
-            raise AttributeError
+            raise AttributeError(self.name)
 
     def __set__(self, instance, value):
         self.validate_value(value)
-        instance._meta.values[self.name] = value
+        self.slot.__set__(instance, value)
+
+    def value(self, instance):
+        # the value as it's stored, which storages and queries work with
+        return Field.__get__(self, instance, None)
 
-    def __del__(self, instance):
+    def __delete__(self, instance):
         raise NotImplementedError
 
     def validate_value(self, value):
         return
 
+    def validation_source(self):
+        # lines of validate_value checking `value`, `field` is this field
+        return []
+
 
 class IntegerField(Field):
     def __init__(self, minimum=0, maximum=sys.maxint, **common_kwargs):
@@ -52,6 +85,14 @@ class IntegerField(Field):
         if not self.minimum <= value <= self.maximum:
             raise ValueError
 
+    def validation_source(self):
+        return [
+            'if not isinstance(value, int):',
+            '    raise TypeError',
+            'if not {!r} <= value <= {!r}:'.format(self.minimum, self.maximum),
+            '    raise ValueError',
+        ]
+
 
 class TextField(Field):
     def __init__(self, max_len=1024, **common_kwargs):
@@ -64,42 +105,124 @@ class TextField(Field):
         if len(value) > self.max_len:
             raise ValueError
 
+    def validation_source(self):
+        return [
+            'if not isinstance(value, basestring):',
+            '    raise TypeError',
+            'if len(value) > {!r}:'.format(self.max_len),
+            '    raise ValueError',
+        ]
+
 
 class HexTextField(TextField):
+    pattern = re.compile(r'[0-9A-F]*\Z')
+
     def validate_value(self, value):
         super(HexTextField, self).validate_value(value)
-        for ch in value:
-            if ch not in '0123456789ABCDEF':
-                raise ValueError
+        if not self.pattern.match(value):
+            raise ValueError
+
+    def validation_source(self):
+        return super(HexTextField, self).validation_source() + [
+            'if not field.pattern.match(value):',
+            '    raise ValueError',
+        ]
 
 
 class ChoicesField(Field):
     def __init__(self, choices, **common_kwargs):
-        self.choices = choices
-        super(ChoicesField, self).__init__(choices, **common_kwargs)
+        self.choices = frozenset(choices)
+        super(ChoicesField, self).__init__(**common_kwargs)
 
     def validate_value(self, value):
         if value not in self.choices:
             raise ValueError
 
+    def validation_source(self):
+        return [
+            'if value not in field.choices:',
+            '    raise ValueError',
+        ]
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def datetime_to_micros(value):
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def micros_to_datetime(micros):
+    return EPOCH + datetime.timedelta(microseconds=micros)
+
 
 class DateField(Field):
     def validate_value(self, value):
         if not isinstance(value, datetime.datetime):
             raise TypeError
 
+    def validation_source(self):
+        return [
+            'if not isinstance(value, datetime.datetime):',
+            '    raise TypeError',
+        ]
+
 
 class ForeignKeyField(Field):
+    # keeps a pk (a list of pks with multi=True), reads resolve them to models
+    # resolved models are cached in the instance until the value changes
+    cached = True
+
     def __init__(self, model_cls, multi=False, **common_kwargs):
         self.model_cls = model_cls
         self.multi = multi
         self.pk_name = model_cls._cls_meta.primary_field
-        super(ForeignKeyField, self).__init__(model_cls, multi, **common_kwargs)
+        super(ForeignKeyField, self).__init__(**common_kwargs)
 
     def __get__(self, instance, klass):
+        if instance is None:
+            return self
         value = super(ForeignKeyField, self).__get__(instance, klass)
-        result = [
-            self.model_cls.objects.get(**{self.pk_name: pk})
-            for pk in value
-        ]
-        return result
+        try:
+            pks, resolved = self.cache_slot.__get__(instance, klass)
+        except AttributeError:
+            pass
+        else:
+            if pks == value:
+                return list(resolved) if self.multi else resolved
+        resolved = self.resolve(value, self.model_cls.objects.in_bulk(self.pks(value)))
+        self.cache(instance, value, resolved)
+        return list(resolved) if self.multi else resolved
+
+    def prefetch(self, instances):
+        # resolves the field of all instances by one lookup
+        values = []
+        pks = set()
+        for instance in instances:
+            try:
+                value = super(ForeignKeyField, self).__get__(instance, instance.__class__)
+            except AttributeError:
+                continue
+            values.append((instance, value))
+            pks.update(self.pks(value))
+        models = self.model_cls.objects.in_bulk(pks)
+        for instance, value in values:
+            self.cache(instance, value, self.resolve(value, models))
+
+    def pks(self, value):
+        if value is None:
+            return []
+        return value if self.multi else [value]
+
+    def resolve(self, value, models):
+        try:
+            if self.multi:
+                return [models[pk] for pk in value]
+            return None if value is None else models[value]
+        except KeyError:
+            raise orm.error.DoesNotExistError
+
+    def cache(self, instance, value, resolved):
+        # a copy of the value, so changing a list of pks in place drops the cache too
+        self.cache_slot.__set__(instance, (list(value) if self.multi else value, resolved))
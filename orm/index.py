@@ -0,0 +1,197 @@
+# secondary indexes for storages
+import bisect
+
+EMPTY = frozenset()
+
+
+class Index(object):
+    def __init__(self, field_name):
+        self.field_name = field_name
+
+    def add(self, value, pk):
+        raise NotImplementedError
+
+    def remove(self, value, pk):
+        raise NotImplementedError
+
+    def lookup(self, value):
+        # returns a set of pks
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class HashIndex(Index):
+    def __init__(self, field_name):
+        super(HashIndex, self).__init__(field_name)
+        self.buckets = {}
+
+    def add(self, value, pk):
+        try:
+            self.buckets[value].add(pk)
+        except KeyError:
+            self.buckets[value] = {pk}
+
+    def remove(self, value, pk):
+        pks = self.buckets.get(value)
+        if pks is None:
+            return
+        pks.discard(pk)
+        if not pks:
+            del self.buckets[value]
+
+    def lookup(self, value):
+        return self.buckets.get(value, EMPTY)
+
+    def clear(self):
+        self.buckets.clear()
+
+
+class UniqueIndex(Index):
+    # value -> pk, for fields which can't share values between models
+    def __init__(self, field_name):
+        super(UniqueIndex, self).__init__(field_name)
+        self.owners = {}
+
+    def add(self, value, pk):
+        self.owners[value] = pk
+
+    def remove(self, value, pk):
+        if self.owners.get(value, pk) == pk:
+            self.owners.pop(value, None)
+
+    def lookup(self, value):
+        try:
+            return (self.owners[value],)
+        except KeyError:
+            return EMPTY
+
+    def owner(self, value, default=None):
+        return self.owners.get(value, default)
+
+    def clear(self):
+        self.owners.clear()
+
+
+class SortedIndex(Index):
+    # sorted list split into chunks, so inserts and removes move at most 2 * load items
+    load = 512
+
+    def __init__(self, field_name):
+        super(SortedIndex, self).__init__(field_name)
+        self.clear()
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, pk):
+        if not self.maxes:
+            self.keys.append([value])
+            self.pks.append([pk])
+            self.maxes.append(value)
+            self.size = 1
+            return
+        i = bisect.bisect_right(self.maxes, value)
+        if i == len(self.maxes):
+            i -= 1
+        keys, pks = self.keys[i], self.pks[i]
+        j = bisect.bisect_right(keys, value)
+        keys.insert(j, value)
+        pks.insert(j, pk)
+        self.maxes[i] = keys[-1]
+        self.size += 1
+        if len(keys) > 2 * self.load:
+            self._split(i)
+
+    def remove(self, value, pk):
+        i = bisect.bisect_left(self.maxes, value)
+        while i < len(self.maxes):
+            keys, pks = self.keys[i], self.pks[i]
+            j = bisect.bisect_left(keys, value)
+            while j < len(keys) and keys[j] == value:
+                if pks[j] == pk:
+                    self._delete(i, j)
+                    return
+                j += 1
+            if j < len(keys):
+                return
+            i += 1
+
+    def lookup(self, value):
+        return set(self.range(value, value))
+
+    def range(self, lo=None, hi=None, lo_inclusive=True, hi_inclusive=True, reverse=False):
+        # yields pks ordered by value, None bound means unbounded
+        start = self._position(lo, not lo_inclusive) if lo is not None else (0, 0)
+        stop = self._position(hi, hi_inclusive) if hi is not None else (len(self.maxes), 0)
+        if stop <= start:
+            return iter(())
+        if reverse:
+            return self._iter_backward(start, stop)
+        return self._iter_forward(start, stop)
+
+    def count(self, lo=None, hi=None, lo_inclusive=True, hi_inclusive=True):
+        start = self._position(lo, not lo_inclusive) if lo is not None else (0, 0)
+        stop = self._position(hi, hi_inclusive) if hi is not None else (len(self.maxes), 0)
+        return max(self._offset(stop) - self._offset(start), 0)
+
+    def rank(self, value):
+        # count of items less than value
+        return self._offset(self._position(value, False))
+
+    def clear(self):
+        self.keys = []  # sorted chunks of values
+        self.pks = []  # chunks of pks, parallel to keys
+        self.maxes = []  # last value of every chunk
+        self.size = 0
+
+    def _position(self, value, right):
+        # (chunk, offset) of the first item greater (right) or not less than value
+        search = bisect.bisect_right if right else bisect.bisect_left
+        i = search(self.maxes, value)
+        if i == len(self.maxes):
+            return i, 0
+        return i, search(self.keys[i], value)
+
+    def _offset(self, position):
+        i, j = position
+        return sum(len(keys) for keys in self.keys[:i]) + j
+
+    def _iter_forward(self, start, stop):
+        for i in xrange(start[0], min(stop[0] + 1, len(self.pks))):
+            pks = self.pks[i]
+            first = start[1] if i == start[0] else 0
+            last = stop[1] if i == stop[0] else len(pks)
+            for pk in pks[first:last]:
+                yield pk
+
+    def _iter_backward(self, start, stop):
+        for i in xrange(min(stop[0], len(self.pks) - 1), start[0] - 1, -1):
+            pks = self.pks[i]
+            first = start[1] if i == start[0] else 0
+            last = stop[1] if i == stop[0] else len(pks)
+            for pk in reversed(pks[first:last]):
+                yield pk
+
+    def _split(self, i):
+        keys, pks = self.keys[i], self.pks[i]
+        half = len(keys) // 2
+        self.keys.insert(i + 1, keys[half:])
+        self.pks.insert(i + 1, pks[half:])
+        del keys[half:]
+        del pks[half:]
+        self.maxes[i] = keys[-1]
+        self.maxes.insert(i + 1, self.keys[i + 1][-1])
+
+    def _delete(self, i, j):
+        keys, pks = self.keys[i], self.pks[i]
+        del keys[j]
+        del pks[j]
+        self.size -= 1
+        if keys:
+            self.maxes[i] = keys[-1]
+        else:
+            del self.keys[i]
+            del self.pks[i]
+            del self.maxes[i]
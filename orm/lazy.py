@@ -0,0 +1,32 @@
+# optional heavy dependencies imported when they are first used
+#   numpy = orm.lazy.LazyImport('numpy')
+#   if numpy: ... numpy.flatnonzero(mask)
+import importlib
+
+
+class LazyImport(object):
+    # false if the module can't be imported
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._loaded = False
+
+    def __getattr__(self, name):
+        module = self._load()
+        if module is None:
+            raise AttributeError(name)
+        return getattr(module, name)
+
+    def __nonzero__(self):
+        return self._load() is not None
+
+    __bool__ = __nonzero__
+
+    def _load(self):
+        if not self._loaded:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError:
+                self._module = None
+            self._loaded = True
+        return self._module
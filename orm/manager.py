@@ -1,5 +1,8 @@
-import orm.storage
+import orm.cache
 import orm.error
+import orm.query
+import orm.session
+import orm.storage
 
 
 class Manager(object):
@@ -12,7 +15,7 @@ class Manager(object):
     def __set__(self, instance, value):
         raise NotImplementedError
 
-    def __del__(self, instance):
+    def __delete__(self, instance):
         raise NotImplementedError
 
     def create(self, model_attrs):
@@ -27,52 +30,126 @@ class Manager(object):
     def get(self, **query):
         pass
 
+    def in_bulk(self, pks):
+        pass
+
     def save(self, model):
         pass
 
+    def bulk_create(self, rows):
+        pass
+
+    def bulk_save(self, models):
+        pass
+
     def get_last_created_pk(self):
         pass
 
 
 class ModelManager(Manager):
-    def __init__(self, storage_cls=orm.storage.SingletonRamStorage):
+    cache = None
+
+    def __init__(self, storage_cls=orm.storage.SingletonRamStorage, cache_size=0):
+        # cache_size > 0 keeps results of that many queries, see orm.cache
         self.storage_cls = storage_cls
+        self.cache_size = cache_size
+        self.managers = {}
 
     def __get__(self, instance, klass):
-        if not hasattr(self, 'klass'):
-            self.klass = klass
-            # raise ValueError(klass, self.storage_cls)
-            self.storage = self.storage_cls(klass)
-        return self
+        # one manager is shared by all subclasses of a model, so bind a copy per class
+        try:
+            return self.managers[klass]
+        except KeyError:
+            manager = self.managers[klass] = self.bind(klass)
+            return manager
+
+    def bind(self, klass):
+        manager = self.__class__(self.storage_cls, self.cache_size)
+        manager.klass = klass
+        manager.storage = self.storage_cls(klass)
+        if self.cache_size:
+            manager.cache = orm.cache.QueryCache(klass, self.cache_size)
+        return manager
 
     def create(self, model, kwargs):
         pass
 
     def drop(self, model):
         self.storage.drop(model)
+        if self.cache is not None:
+            self.cache.dropped([model])
+
+    def all(self):
+        return orm.query.QuerySet(self)
 
     def filter(self, **query):
-        return self.storage.get(**query)
+        return self.all().filter(**query)
+
+    def order_by(self, *field_names):
+        return self.all().order_by(*field_names)
 
     def get(self, **query):
-        result = self.storage.get(**query)
-        if len(result) > 1:
-            raise orm.error.MoreThanOneError
-        elif len(result) == 0:
-            raise orm.error.DoesNotExistError
-        return result[0]
+        return self.all().get(**query)
+
+    def in_bulk(self, pks):
+        # pk -> model by one storage lookup, models of the current session are reused
+        session = orm.session.current()
+        if session is None:
+            return self.storage.get_many(pks)
+        pks = set(pks)
+        result = session.find(self.klass, pks)
+        missing = pks.difference(result)
+        if missing:
+            result.update(session.merge(self.klass, self.storage.get_many(missing)))
+        return result
 
     def save(self, model):
-        for field in model._cls_meta.unique_fields:
-            filtered_models = [
-                m
-                for m in self.filter(**{field: getattr(model, field)})
-                if model.pk != m.pk
-            ]
-            if filtered_models:
-                # raise ValueError(self, model, res)
-                raise orm.error.FieldNotUniqueError
+        # storages raise FieldNotUniqueError themselves, checking and inserting at once
         self.storage.set(model)
+        if self.cache is not None:
+            self.cache.saved([model])
+
+    def bulk_create(self, rows):
+        # rows are dicts of field values, models are built without per row checks
+        klass = self.klass
+        field_names = set(klass._cls_meta.field_names)
+        required = set(
+            name
+            for name in field_names
+            if not getattr(klass, name).has_default
+        )
+        models = []
+        for values in rows:
+            keys = values.viewkeys()
+            if not keys <= field_names:
+                raise orm.error.UnknownParameterError
+            if not required <= keys:
+                raise orm.error.ModelError
+            models.append(klass._from_values(values))
+        self._validate(models)
+        self.storage.set_many(models)
+        if self.cache is not None:
+            self.cache.saved(models)
+        return models
+
+    def bulk_save(self, models):
+        models = list(models)
+        self._validate(models)
+        self.storage.set_many(models)
+        if self.cache is not None:
+            self.cache.saved(models)
+
+    def _validate(self, models):
+        # one pass per field over the whole batch, unset values have valid defaults
+        for name in self.klass._cls_meta.field_names:
+            field = getattr(self.klass, name)
+            validate, get = field.validate_value, field.slot.__get__
+            for model in models:
+                try:
+                    value = get(model)
+                except AttributeError:
+                    continue
+                validate(value)
 
     def get_last_created_pk(self):
         self.last_pk = None
@@ -1,3 +1,6 @@
+import collections
+
+import orm.codegen
 import orm.error
 import orm.field
 import orm.manager
@@ -41,6 +44,8 @@ class ClassMeta(ModelMeta):
         'field_names': list,  # list of all field names for current model
         'primary_field': str,
         'unique_fields': list,
+        'indexed_fields': list,  # unique fields and fields declared with index=True
+        'slots': dict,  # field name -> name of the slot with its value
     }
 
 
@@ -50,6 +55,39 @@ class InstanceMeta(ModelMeta):
     }
 
 
+class SlotValues(collections.MutableMapping):
+    # dict-like view over values kept in slots of a model instance
+    def __init__(self, instance):
+        self.instance = instance
+        self.slots = instance._cls_meta.slots
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self.instance, self.slots[name])
+        except AttributeError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        setattr(self.instance, self.slots[name], value)
+
+    def __delitem__(self, name):
+        try:
+            delattr(self.instance, self.slots[name])
+        except AttributeError:
+            raise KeyError(name)
+
+    def __iter__(self):
+        for name, slot in self.slots.iteritems():
+            if hasattr(self.instance, slot):
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 class ModelCreationHandler(object):
     def __init__(self, context):
         self.context = context
@@ -79,6 +117,7 @@ class FieldsHandler(ModelCreationHandler):
     def run_after(self):
         self.context['klass']._cls_meta.field_names = self.context['field_names']
         self.context['klass']._cls_meta.unique_fields = self._get_fields_with_setting('unique', True)
+        self.context['klass']._cls_meta.indexed_fields = self._get_indexed_fields()
         self._set_name_for_fields()
         return self.context
 
@@ -120,9 +159,19 @@ class FieldsHandler(ModelCreationHandler):
         return self.context['field_names']
 
     def _set_name_for_fields(self):
-        for attr, value in self.context['klass'].__dict__.iteritems():
+        for attr, value in self.context['klass'].__dict__.items():
             if isinstance(value, orm.field.Field):
                 value.name = attr
+                value.slot = self.context['klass'].__dict__[orm.field.slot_name(attr)]
+                if value.cached:
+                    value.cache_slot = self.context['klass'].__dict__[orm.field.cache_slot_name(attr)]
+
+    def _get_indexed_fields(self):
+        result = list(self.context['klass']._cls_meta.unique_fields)
+        for field_name in self.field_names:
+            if getattr(self.context['klass'], field_name).index and field_name not in result:
+                result.append(field_name)
+        return result
 
     def _get_fields_with_setting(self, setting_name, setting_value):
         result = []
@@ -134,6 +183,29 @@ class FieldsHandler(ModelCreationHandler):
         return result
 
 
+class SlotsHandler(ModelCreationHandler):
+    # values live in generated slots, so instances don't carry a dict
+    # models with fields can't be combined by multiple inheritance because of this
+    def run_before(self):
+        dict_ = self.context['dict_']
+        dict_['__slots__'] = tuple(
+            orm.field.slot_name(name)
+            for name in self.context['model_field_names']
+        ) + tuple(
+            orm.field.cache_slot_name(name)
+            for name in self.context['model_field_names']
+            if dict_[name].cached
+        )
+        return self.context
+
+    def run_after(self):
+        self.context['klass']._cls_meta.slots = {
+            name: orm.field.slot_name(name)
+            for name in self.context['field_names']
+        }
+        return self.context
+
+
 class PrimaryHandler(ModelCreationHandler):
     # we should have one and only one primary key
     def run_after(self):
@@ -151,12 +223,11 @@ class PrimaryHandler(ModelCreationHandler):
         return pk_names[0]
 
     def __get_pk_names_from_parents(self):
+        # parents' pk may be declared further up, so take it from their meta
         names = []
         for base_class in reversed(self.context['bases']):
-            for attr, value in base_class.__dict__.iteritems():
-                if isinstance(value, orm.field.Field):
-                    if value.primary:
-                        names.append(attr)
+            if hasattr(base_class, '_cls_meta'):
+                names.append(base_class._cls_meta.primary_field)
         return names
 
     def __get_pk_names_from_model_fields(self):
@@ -168,6 +239,44 @@ class PrimaryHandler(ModelCreationHandler):
         return names
 
 
+class CodegenHandler(ModelCreationHandler):
+    # validators of own fields, __init__ and trusted constructors are generated for every model class
+    # they are compiled on first use, importing models stays cheap
+    def run_after(self):
+        klass = self.context['klass']
+        for name in self.context['model_field_names']:
+            field = klass.__dict__[name]
+            if orm.codegen.has_validation_source(field):
+                field.validate_value = orm.codegen.lazy(
+                    lambda field=field: orm.codegen.compile_validator(field),
+                    lambda function, field=field: setattr(field, 'validate_value', function),
+                )
+        if not self._has_custom_init(klass) and not getattr(klass.__dict__.get('__init__'), 'generic', False):
+            klass.__init__ = orm.codegen.lazy(
+                lambda: orm.codegen.compile_init(klass),
+                lambda function: setattr(klass, '__init__', function),
+            )
+            klass.__init__.__func__.generated = True
+        for name, compile_ in (
+            ('_from_trusted', orm.codegen.compile_from_trusted),
+            ('_from_trusted_row', orm.codegen.compile_from_trusted_row),
+        ):
+            stub = orm.codegen.lazy(
+                lambda compile_=compile_: compile_(klass),
+                lambda function, name=name: setattr(klass, name, staticmethod(function)),
+            )
+            setattr(klass, name, staticmethod(stub))
+        return self.context
+
+    @staticmethod
+    def _has_custom_init(klass):
+        for base in klass.__mro__[:-1]:
+            init = base.__dict__.get('__init__')
+            if init is not None and not getattr(init, 'generated', False) and not getattr(init, 'generic', False):
+                return True
+        return False
+
+
 class FieldMcs(type):
     # we don't support field names with leading underscore
 
@@ -187,6 +296,7 @@ class FieldMcs(type):
         handlers = [
             ClsMetaHandler,
             FieldsHandler,
+            SlotsHandler,
         ]
         for handler in handlers:
             context = handler(context).run_before()
@@ -196,8 +306,10 @@ class FieldMcs(type):
     def customize_class(klass, context):
         context['klass'] = klass
         handlers = [
+            SlotsHandler,
             FieldsHandler,
             PrimaryHandler,
+            CodegenHandler,
         ]
         for handler in handlers:
             context = handler(context).run_after()
@@ -207,36 +319,61 @@ class FieldMcs(type):
 class Model(object):
     __metaclass__ = FieldMcs
 
-    _meta = None
     objects = orm.manager.ModelManager()
 
     id = orm.field.IntegerField(primary=True)
 
     def __init__(self, **kwargs):
-        self._meta = InstanceMeta()
-
+        # models with a hand-written __init__ come here through super,
+        # CodegenHandler generates one for the others
         self.__check_for_unknown_params(kwargs)
         self.__check_for_initial_values(kwargs)
-
-        self._meta.values.update(kwargs)
+        slots = self._cls_meta.slots
+        for name, value in kwargs.iteritems():
+            setattr(self, slots[name], value)
+    __init__.generic = True
 
     def __str__(self):
         mask = '<{}: {}>'
         return mask.format(self.__class__.__name__, self._meta.values)
 
+    def __getstate__(self):
+        state = {}
+        for name, slot in self._cls_meta.slots.iteritems():
+            try:
+                state[name] = getattr(self, slot)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        self._meta.values.update(state)
+
+    @property
+    def _meta(self):
+        return InstanceMeta(values=SlotValues(self))
+
+    # _from_trusted(values) and _from_trusted_row(row) are generated by CodegenHandler,
+    # storages build models of values they stored before with them
+
+    @classmethod
+    def _from_values(cls, values):
+        # values should be checked by caller
+        model = cls.__new__(cls)
+        slots = cls._cls_meta.slots
+        for name, value in values.iteritems():
+            setattr(model, slots[name], value)
+        return model
+
     def __check_for_unknown_params(self, kwargs):
-        for name, value in kwargs.iteritems():
-            if name not in self._cls_meta.field_names:
+        for name in kwargs:
+            if name not in self._cls_meta.slots:
                 raise orm.error.UnknownParameterError
 
     def __check_for_initial_values(self, kwargs):
-        fields_wo_initial_value = [
-            k
-            for k in self._cls_meta.field_names
-            if k not in kwargs
-        ]
-        if not all([getattr(self.__class__, name).has_default for name in fields_wo_initial_value]):
-            raise orm.error.ModelError
+        for name in self._cls_meta.field_names:
+            if name not in kwargs and not getattr(self.__class__, name).has_default:
+                raise orm.error.ModelError
 
     @property
     def pk(self):
@@ -0,0 +1,223 @@
+# lazy querysets with django-like lookups: Model.objects.filter(ts__gte=t1).order_by('-ts').limit(10)
+import heapq
+import itertools
+import operator
+
+import orm.error
+import orm.field
+
+
+LOOKUP_SEP = '__'
+
+LOOKUPS = {
+    'exact': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'in': lambda value, arg: value in arg,
+    'range': lambda value, arg: arg[0] <= value <= arg[1],
+}
+
+
+class Condition(object):
+    def __init__(self, field_name, lookup, arg):
+        if lookup not in LOOKUPS:
+            raise orm.error.UnknownLookupError(lookup)
+        if lookup == 'in' and iter(arg) is arg:
+            arg = tuple(arg)  # a generator is read once, a queryset may run many times
+        self.field_name = field_name
+        self.lookup = lookup
+        self.arg = arg
+        self.compare = LOOKUPS[lookup]
+        self.get_value = None
+
+    def __call__(self, model):
+        if self.get_value is None:
+            # stored values, fields which resolve them on reads are read through value()
+            field = getattr(model.__class__, self.field_name)
+            self.get_value = field.value if field.cached else operator.attrgetter(self.field_name)
+        return self.compare(self.get_value(model), self.arg)
+
+    def __repr__(self):
+        return '<Condition: {}__{}={!r}>'.format(self.field_name, self.lookup, self.arg)
+
+    @classmethod
+    def parse(cls, query):
+        conditions = []
+        for key, arg in query.iteritems():
+            field_name, sep, lookup = key.rpartition(LOOKUP_SEP)
+            if not sep:
+                field_name, lookup = key, 'exact'
+            conditions.append(cls(field_name, lookup, arg))
+        return conditions
+
+
+class QuerySet(object):
+    def __init__(self, manager, conditions=(), ordering=(), offset=0, limit=None, related=()):
+        self.manager = manager
+        self.conditions = tuple(conditions)
+        self.ordering = tuple(ordering)
+        self.offset = offset
+        self._limit = limit
+        self.related = tuple(related)  # foreign keys resolved for the whole result
+
+    def __iter__(self):
+        cache = self.manager.cache
+        if cache is not None:
+            return iter(cache.results(self, self._results))
+        return self._iter()
+
+    def _results(self):
+        return list(self._iter())
+
+    def _iter(self):
+        storage = self.manager.storage
+        models = storage.select_query(self.conditions, self.ordering, self.offset, self._limit)
+        if models is None:
+            models = self._select(storage)
+        if self.related:
+            models = list(models)
+            for name in self.related:
+                self._get_foreign_key(name).prefetch(models)
+        return iter(models)
+
+    def _select(self, storage):
+        models = None
+        if len(self.ordering) == 1:
+            name = self.ordering[0]
+            reverse = name.startswith('-')
+            models = storage.select_ordered(self.conditions, name.lstrip('-'), reverse)
+        if models is None:
+            models = storage.select(self.conditions)
+            if self.ordering:
+                models = self._order(models)
+        if self.offset or self._limit is not None:
+            stop = None if self._limit is None else self.offset + self._limit
+            models = itertools.islice(models, self.offset, stop)
+        return models
+
+    def __len__(self):
+        # filter() returned lists before, len() of its result still works
+        return self.count()
+
+    def __nonzero__(self):
+        return self.exists()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None or (key.start or 0) < 0 or (key.stop or 0) < 0:
+                raise ValueError(key)
+            start = key.start or 0
+            limit = None if key.stop is None else max(key.stop - start, 0)
+            return self._slice(start, limit)
+        if key < 0:
+            raise IndexError(key)
+        for model in self._slice(key, 1):
+            return model
+        raise IndexError(key)
+
+    def __repr__(self):
+        return '<QuerySet: {} {}>'.format(self.manager.klass.__name__, list(self.conditions))
+
+    def filter(self, **query):
+        return self._clone(conditions=self.conditions + tuple(Condition.parse(query)))
+
+    def order_by(self, *field_names):
+        return self._clone(ordering=field_names)
+
+    def prefetch_related(self, *field_names):
+        # one in_bulk per foreign key instead of one lookup per model
+        for name in field_names:
+            self._get_foreign_key(name)
+        return self._clone(related=self.related + field_names)
+
+    # models of all foreign keys are fetched in batches, single or multi alike
+    select_related = prefetch_related
+
+    def limit(self, count):
+        return self._slice(0, count)
+
+    def all(self):
+        # list() would ask __len__ for a size hint, which is a count() on its own
+        return [model for model in self]
+
+    def chunks(self, size=1000):
+        # lists of at most size models, foreign keys are resolved per chunk
+        models = iter(self._clone(related=()))
+        while True:
+            chunk = list(itertools.islice(models, size))
+            if not chunk:
+                return
+            for name in self.related:
+                self._get_foreign_key(name).prefetch(chunk)
+            yield chunk
+
+    def first(self):
+        for model in self.limit(1):
+            return model
+        return None
+
+    def exists(self):
+        return self.first() is not None
+
+    def count(self):
+        cache = self.manager.cache
+        if cache is not None:
+            return cache.count(self, self._count)
+        return self._count()
+
+    def _count(self):
+        if self.offset or self._limit is not None:
+            return sum(1 for _ in self._clone(ordering=())._iter())
+        return self.manager.storage.count(self.conditions)
+
+    def get(self, **query):
+        result = self.filter(**query).limit(2).all()
+        if len(result) > 1:
+            raise orm.error.MoreThanOneError
+        elif len(result) == 0:
+            raise orm.error.DoesNotExistError
+        return result[0]
+
+    def _slice(self, offset, limit):
+        # slicing a sliced queryset narrows it
+        if self._limit is not None:
+            limit = max(self._limit - offset, 0) if limit is None else min(limit, max(self._limit - offset, 0))
+        return self._clone(offset=self.offset + offset, limit=limit)
+
+    def _clone(self, **changes):
+        kwargs = {
+            'conditions': self.conditions,
+            'ordering': self.ordering,
+            'offset': self.offset,
+            'limit': self._limit,
+            'related': self.related,
+        }
+        kwargs.update(changes)
+        return self.__class__(self.manager, **kwargs)
+
+    def _get_foreign_key(self, name):
+        field = getattr(self.manager.klass, name, None)
+        if not isinstance(field, orm.field.ForeignKeyField):
+            raise ValueError(name)
+        return field
+
+    def _order(self, models):
+        keys = [
+            (name[1:], True) if name.startswith('-') else (name, False)
+            for name in self.ordering
+        ]
+        directions = set(reverse for name, reverse in keys)
+        if len(directions) == 1:
+            key = operator.attrgetter(*[name for name, reverse in keys])
+            reverse = directions.pop()
+            if self._limit is not None:
+                # only the top of the result is needed
+                pick = heapq.nlargest if reverse else heapq.nsmallest
+                return pick(self.offset + self._limit, models, key=key)
+            return sorted(models, key=key, reverse=reverse)
+        models = list(models)
+        for name, reverse in reversed(keys):
+            models.sort(key=operator.attrgetter(name), reverse=reverse)
+        return models
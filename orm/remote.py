@@ -0,0 +1,509 @@
+# storage server process and a client storage talking over a unix domain socket
+#   python -m orm.remote /run/chrono.sock models.base models.events
+#   orm.remote.RemoteStorage.connect('/run/chrono.sock')
+# or with reads served by 4 more processes at /run/chrono.sock.read
+#   python -m orm.remote --readers 4 /run/chrono.sock models.base models.events
+#   orm.remote.RemoteStorage.connect('/run/chrono.sock', read_path='/run/chrono.sock.read')
+# then declare models with ModelManager(storage_cls=orm.remote.RemoteStorage)
+# the server serves only models declared in the modules on its command line
+#
+# frames are a header (payload length, request id, opcode or status) and a payload of plain
+# values encoded by orm.codec.encode_value, nothing a client sends is unpickled or imported;
+# clients may send many requests before reading responses, which come back in order.
+# querysets run on the server with their ordering and slice, results come in chunks of rows
+# from a cursor kept by the connection
+#
+# requests of one server process share one core because of the GIL. read workers are processes
+# forked with one listening socket, each connection is served by one of them from an mmap
+# snapshot (orm.snapshot) which the server writes again after writes, at most once per interval;
+# reads of the workers see writes once the next snapshot is taken
+import argparse
+import contextlib
+import importlib
+import itertools
+import os
+import Queue
+import signal
+import socket
+import SocketServer
+import struct
+import sys
+import threading
+import time
+
+import orm.codec
+import orm.error
+import orm.manager
+import orm.model
+import orm.query
+import orm.snapshot
+import orm.storage
+
+
+HEADER = struct.Struct('<IIB')
+
+SET = 1
+SET_MANY = 2
+SELECT = 3
+QUERY = 4  # opens the cursor of a connection, returns its first chunk
+COUNT = 5
+GET_MANY = 6
+DROP = 7
+FETCH = 8  # the next chunk of the cursor
+
+WRITES = frozenset([SET, SET_MANY, DROP])
+
+CHUNK_SIZE = 1000
+SNAPSHOT_INTERVAL = 1.0
+
+OK = 0
+ERROR = 1
+
+
+MAX_FRAME = 1 << 28
+
+# errors of the server raised again by clients besides the ones of orm.error
+BUILTIN_ERRORS = {
+    error_cls.__name__: error_cls
+    for error_cls in (TypeError, ValueError, KeyError, IndexError, AttributeError)
+}
+
+
+def encode_frame(request_id, code, payload):
+    out = []
+    orm.codec.encode_value(payload, out)
+    data = b''.join(out)
+    return HEADER.pack(len(data), request_id, code) + data
+
+
+def read_frame(stream):
+    # raises EOFError at the end of the stream, ValueError or IndexError for a broken frame
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise EOFError
+    length, request_id, code = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError('frame of {} bytes'.format(length))
+    data = stream.read(length)
+    if len(data) < length:
+        raise EOFError
+    payload, end = orm.codec.decode_value(bytearray(data), 0)
+    if end != length:
+        raise ValueError('{} bytes after the payload'.format(length - end))
+    return request_id, code, payload
+
+
+def encode_conditions(conditions):
+    return [(condition.field_name, condition.lookup, condition.arg) for condition in conditions]
+
+
+def decode_conditions(manager, conditions):
+    field_names = manager.klass._cls_meta.field_names
+    for field_name, lookup, arg in conditions:
+        if field_name not in field_names:
+            raise orm.error.UnknownParameterError(field_name)
+    return [orm.query.Condition(*condition) for condition in conditions]
+
+
+def model_classes(modules):
+    # model classes declared in the modules
+    return [
+        value
+        for module in modules
+        for value in vars(module).itervalues()
+        if isinstance(value, orm.model.FieldMcs) and value.__module__ == module.__name__
+    ]
+
+
+def plain_args(error):
+    # arguments of an error as they can be sent, its message when it has none
+    if not error.args:
+        return [str(error)]
+    return [arg if isinstance(arg, (int, long, float, basestring)) else repr(arg) for arg in error.args]
+
+
+def decode_error(name, args):
+    error_cls = BUILTIN_ERRORS.get(name)
+    if error_cls is None:
+        error_cls = getattr(orm.error, name, None)
+    if not (isinstance(error_cls, type) and issubclass(error_cls, Exception)):
+        return RuntimeError(name, *args)
+    return error_cls(*args)
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    # requests of one connection run in order, so pipelined responses keep their order
+    def handle(self):
+        self.cursor = None  # (models, rows left or None) of the last query
+        while True:
+            try:
+                request_id, opcode, payload = read_frame(self.rfile)
+            except (EOFError, ValueError, IndexError, TypeError, RuntimeError):
+                # a broken frame leaves the stream out of sync, the connection is dropped
+                return
+            try:
+                result = self.server.dispatch(opcode, payload, self)
+                frame = encode_frame(request_id, OK, result)
+            except Exception as error:
+                frame = encode_frame(request_id, ERROR, (error.__class__.__name__, plain_args(error)))
+            self.wfile.write(frame)
+
+
+class StorageServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, model_classes, storage_cls=orm.storage.ConcurrentRamStorage):
+        SocketServer.UnixStreamServer.__init__(self, path, RequestHandler)
+        # class key -> manager bound to a storage of this process, other keys are refused
+        self.managers = {
+            orm.storage.class_key(model_cls): orm.manager.ModelManager(storage_cls).bind(model_cls)
+            for model_cls in model_classes
+        }
+        self.handlers = {
+            SET: self.set,
+            SET_MANY: self.set_many,
+            SELECT: self.select,
+            COUNT: self.count,
+            GET_MANY: self.get_many,
+            DROP: self.drop,
+        }
+        self.cursor_handlers = {
+            QUERY: self.query,
+            FETCH: self.fetch,
+        }
+        self.writes = 0  # write requests so far, snapshots are taken when it changes
+
+    def dispatch(self, opcode, payload, session):
+        # session keeps the cursor of a connection
+        if opcode in WRITES:
+            self.writes += 1
+        if opcode in self.cursor_handlers:
+            return self.cursor_handlers[opcode](session, self.get_manager(payload[0]), *payload[1:])
+        if opcode not in self.handlers:
+            raise ValueError('unknown opcode {}'.format(opcode))
+        return self.handlers[opcode](self.get_manager(payload[0]), *payload[1:])
+
+    def get_manager(self, key):
+        # model classes of the server's modules only, their own managers aren't used
+        try:
+            return self.managers[key]
+        except (KeyError, TypeError):
+            raise orm.error.UnknownModelError(key)
+
+    def set(self, manager, values):
+        model = self.model(manager, values)
+        manager._validate([model])
+        manager.save(model)
+
+    def set_many(self, manager, rows):
+        manager.bulk_save([self.model(manager, values) for values in rows])
+
+    @staticmethod
+    def model(manager, values):
+        if not values.viewkeys() <= set(manager.klass._cls_meta.field_names):
+            raise orm.error.UnknownParameterError
+        return manager.klass._from_values(values)
+
+    def select(self, manager, conditions):
+        return [model.__getstate__() for model in manager.storage.select(decode_conditions(manager, conditions))]
+
+    def query(self, session, manager, conditions, ordering, offset, limit, size):
+        field_names = manager.klass._cls_meta.field_names
+        for name in ordering:
+            if name.lstrip('-') not in field_names:
+                raise orm.error.UnknownParameterError(name)
+        queryset = orm.query.QuerySet(manager, decode_conditions(manager, conditions), ordering, offset, limit)
+        session.cursor = iter(queryset), limit
+        return self.fetch(session, manager, size)
+
+    def fetch(self, session, manager, size):
+        # (rows, whether more may follow), the cursor is closed by its last chunk
+        if session.cursor is None:
+            return [], False
+        models, left = session.cursor
+        if left is not None:
+            size = min(size, left)
+        rows = [model.__getstate__() for model in itertools.islice(models, size)]
+        left = None if left is None else left - len(rows)
+        more = len(rows) == size and left != 0
+        session.cursor = (models, left) if more else None
+        return rows, more
+
+    def count(self, manager, conditions):
+        return manager.storage.count(decode_conditions(manager, conditions))
+
+    def get_many(self, manager, pks):
+        condition = orm.query.Condition(manager.klass._cls_meta.primary_field, 'in', pks)
+        return [model.__getstate__() for model in manager.storage.select([condition])]
+
+    def drop(self, manager, pks):
+        pk_name = manager.klass._cls_meta.primary_field
+        models = manager.storage.select([orm.query.Condition(pk_name, 'in', pks)])
+        manager.storage.drop(*list(models))
+
+    def write_snapshot(self, path):
+        orm.snapshot.write_managers(path, self.managers.values())
+
+    def write_snapshots(self, path, interval=SNAPSHOT_INTERVAL):
+        # runs in a thread of its own, a snapshot is taken after writes which came during the last
+        # interval; the count is read before the snapshot, so writes during it are taken next time
+        written = self.writes
+        while True:
+            time.sleep(interval)
+            writes = self.writes
+            if writes != written:
+                self.write_snapshot(path)
+                written = writes
+
+
+class ReadServer(StorageServer):
+    # serves reads from a snapshot, writes raise ReadOnlyStorageError of SnapshotStorage
+    def __init__(self, path, model_classes, snapshot_path):
+        StorageServer.__init__(self, path, model_classes, orm.snapshot.SnapshotStorage)
+        self.snapshot_path = snapshot_path
+        self.snapshot_version = None
+        self.snapshot_lock = threading.Lock()
+
+    def dispatch(self, opcode, payload, session):
+        self.refresh()
+        return StorageServer.dispatch(self, opcode, payload, session)
+
+    def refresh(self):
+        # a snapshot renamed into place is opened by the next request, cursors keep the old one
+        stat = os.stat(self.snapshot_path)
+        version = stat.st_ino, stat.st_mtime
+        with self.snapshot_lock:
+            if version != self.snapshot_version:
+                orm.snapshot.SnapshotStorage.open(self.snapshot_path)
+                self.snapshot_version = version
+
+
+def fork_readers(server, count):
+    # the forked processes accept from the socket of the server, the kernel hands each connection
+    # to one of them; a non-blocking socket lets the ones which lost it go back to waiting
+    server.socket.setblocking(False)
+    pids = []
+    for _ in xrange(count):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    server.socket.close()
+    return pids
+
+
+def stop_readers(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except OSError:
+            continue
+
+
+class Connection(object):
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.stream = self.socket.makefile('rb')
+        self.request_ids = itertools.count(1)
+
+    def call(self, opcode, payload):
+        return self.pipeline([(opcode, payload)])[0]
+
+    def pipeline(self, requests):
+        # sends all requests at once, then reads the responses
+        request_ids = []
+        frames = []
+        for opcode, payload in requests:
+            request_id = next(self.request_ids) & 0xffffffff
+            request_ids.append(request_id)
+            frames.append(encode_frame(request_id, opcode, payload))
+        self.socket.sendall(b''.join(frames))
+        results = []
+        error = None
+        for expected in request_ids:
+            request_id, status, payload = read_frame(self.stream)
+            if request_id != expected:
+                raise IOError('response {} for request {}'.format(request_id, expected))
+            if status == ERROR and error is None:
+                error = payload
+            results.append(payload)
+        if error is not None:
+            name, args = error
+            raise decode_error(name, args)
+        return results
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+
+class ConnectionPool(object):
+    def __init__(self, path, size=4):
+        self.path = path
+        self.idle = Queue.LifoQueue(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        except (IOError, EOFError, socket.error):
+            connection.close()
+            raise
+        else:
+            self.release(connection)
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except Queue.Empty:
+            return Connection(self.path)
+
+    def release(self, connection):
+        try:
+            self.idle.put_nowait(connection)
+        except Queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Queue.Empty:
+                return
+
+
+class RemoteStorage(orm.storage.Storage):
+    # reads return new instances built from the server's rows
+    pool = None
+    read_pool = None  # the pool of read workers, or the server's one
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, model_cls):
+        super(RemoteStorage, self).__init__(model_cls)
+        self.key = orm.storage.class_key(model_cls)
+
+    @classmethod
+    def connect(cls, path, pool_size=4, read_path=None):
+        # with read_path reads go to the read workers, which see writes once a snapshot is taken
+        RemoteStorage.pool = ConnectionPool(path, pool_size)
+        RemoteStorage.read_pool = RemoteStorage.pool if read_path is None else ConnectionPool(read_path, pool_size)
+
+    @classmethod
+    def close(cls):
+        if RemoteStorage.pool is not None:
+            if RemoteStorage.read_pool is not RemoteStorage.pool:
+                RemoteStorage.read_pool.close()
+            RemoteStorage.pool.close()
+            RemoteStorage.pool = None
+            RemoteStorage.read_pool = None
+
+    def set(self, model):
+        self._call(SET, model.__getstate__())
+
+    def set_many(self, models):
+        self._call(SET_MANY, [model.__getstate__() for model in models])
+
+    def get(self, **query):
+        return list(self.select(orm.query.Condition.parse(query)))
+
+    def select(self, conditions):
+        return self._query(conditions, (), 0, None)
+
+    def select_ordered(self, conditions, field_name, reverse=False):
+        return self._query(conditions, ('-' + field_name if reverse else field_name,), 0, None)
+
+    def select_query(self, conditions, ordering, offset, limit):
+        return self._query(conditions, ordering, offset, limit)
+
+    def select_many(self, queries):
+        # one round trip for many condition lists
+        requests = [(SELECT, (self.key, encode_conditions(conditions))) for conditions in queries]
+        with self._pool(self.read_pool).connection() as connection:
+            return [list(self._models(rows)) for rows in connection.pipeline(requests)]
+
+    def count(self, conditions):
+        return self._read(COUNT, encode_conditions(conditions))
+
+    def get_many(self, pks):
+        pk_name = self.model_cls._cls_meta.primary_field
+        return {
+            values[pk_name]: self.model_cls._from_trusted(values)
+            for values in self._read(GET_MANY, list(pks))
+        }
+
+    def drop(self, *models):
+        self._call(DROP, [model.pk for model in models])
+
+    def _query(self, conditions, ordering, offset, limit):
+        # a connection is held while chunks come; it's released before the last one is read by
+        # the caller, a stream left before that drops its connection and the server's cursor
+        pool = self._pool(self.read_pool)
+        connection = pool.acquire()
+        try:
+            rows, more = connection.call(QUERY, (
+                self.key, encode_conditions(conditions), list(ordering), offset, limit, self.chunk_size,
+            ))
+            while more:
+                for model in self._models(rows):
+                    yield model
+                rows, more = connection.call(FETCH, (self.key, self.chunk_size))
+        except BaseException:
+            connection.close()
+            raise
+        pool.release(connection)
+        for model in self._models(rows):
+            yield model
+
+    def _models(self, rows):
+        return (self.model_cls._from_trusted(values) for values in rows)
+
+    def _call(self, opcode, *payload):
+        with self._pool(self.pool).connection() as connection:
+            return connection.call(opcode, (self.key,) + payload)
+
+    def _read(self, opcode, *payload):
+        with self._pool(self.read_pool).connection() as connection:
+            return connection.call(opcode, (self.key,) + payload)
+
+    @staticmethod
+    def _pool(pool):
+        if pool is None:
+            raise RuntimeError('RemoteStorage.connect() should be called first')
+        return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m orm.remote')
+    parser.add_argument('--readers', type=int, default=0, help='read worker processes, at PATH.read')
+    parser.add_argument('--snapshot-interval', type=float, default=SNAPSHOT_INTERVAL)
+    parser.add_argument('path')
+    parser.add_argument('modules', nargs='+')
+    args = parser.parse_args()
+    classes = model_classes([importlib.import_module(name) for name in args.modules])
+    # SIGTERM unwinds the server, so its read workers are stopped too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = StorageServer(args.path, classes)
+    readers = []
+    try:
+        if args.readers:
+            snapshot_path = args.path + '.snap'
+            server.write_snapshot(snapshot_path)
+            # forked before the server starts any thread
+            readers = fork_readers(ReadServer(args.path + '.read', classes, snapshot_path), args.readers)
+            thread = threading.Thread(target=server.write_snapshots, args=(snapshot_path, args.snapshot_interval))
+            thread.daemon = True
+            thread.start()
+        server.serve_forever()
+    finally:
+        stop_readers(readers)
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
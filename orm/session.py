@@ -0,0 +1,41 @@
+# identity map: within a session a stored model is loaded once per pk
+#   with orm.session.Session():
+#       for result in Result.objects.all().prefetch_related('marks'):
+#           ...
+import threading
+
+
+local = threading.local()
+
+
+def current():
+    # innermost session of this thread or None
+    stack = getattr(local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+class Session(object):
+    def __init__(self):
+        self.models = {}  # (model class, pk) -> model
+
+    def __enter__(self):
+        if not hasattr(local, 'stack'):
+            local.stack = []
+        local.stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        local.stack.remove(self)
+
+    def find(self, model_cls, pks):
+        # pk -> model of pks loaded in this session
+        models = self.models
+        return {pk: models[model_cls, pk] for pk in pks if (model_cls, pk) in models}
+
+    def merge(self, model_cls, loaded):
+        # models loaded before win, so every pk has one instance
+        setdefault = self.models.setdefault
+        return {pk: setdefault((model_cls, pk), model) for pk, model in loaded.iteritems()}
+
+    def clear(self):
+        self.models.clear()
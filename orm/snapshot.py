@@ -0,0 +1,265 @@
+# read-only snapshots opened with mmap: fixed-width records per model class plus one string table
+#   orm.snapshot.write_snapshot('/srv/results.snap', [User, Locality])
+#   orm.snapshot.SnapshotStorage.open('/srv/results.snap')
+# then declare models with ModelManager(storage_cls=orm.snapshot.SnapshotStorage)
+# a new snapshot is renamed over the old one, processes which mapped the old one keep reading it
+import cPickle as pickle
+import json
+import mmap
+import os
+import struct
+
+import orm.error
+import orm.field
+import orm.query
+import orm.storage
+import orm.wal
+
+
+MAGIC = b'CHRSNAP1'
+HEADER_SIZE = struct.Struct('<I')
+UNICODE_FLAG = 1 << 31  # set in string lengths of unicode values
+
+INT = 'int'
+DATE = 'date'
+TEXT = 'text'
+OBJECT = 'object'  # pickled into the string table
+
+FORMATS = {
+    INT: 'q',
+    DATE: 'q',
+    TEXT: 'II',
+    OBJECT: 'II',
+}
+
+
+def field_kind(field):
+    if isinstance(field, orm.field.DateField):
+        return DATE
+    if isinstance(field, orm.field.IntegerField):
+        return INT
+    if isinstance(field, orm.field.TextField):
+        return TEXT
+    return OBJECT
+
+
+class StringTable(object):
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.offsets = {}  # equal strings are stored once
+
+    def add(self, data):
+        try:
+            return self.offsets[data]
+        except KeyError:
+            offset = self.offsets[data] = self.size
+            self.chunks.append(data)
+            self.size += len(data)
+            return offset
+
+
+def write_snapshot(path, model_classes):
+    write_managers(path, [model_cls.objects for model_cls in model_classes])
+
+
+def write_managers(path, managers):
+    # managers may be bound to other storages than their classes' own, e.g. the ones of a server
+    strings = StringTable()
+    classes = []
+    records = []
+    offset = 0
+    for manager in managers:
+        model_cls = manager.klass
+        names = sorted(model_cls._cls_meta.field_names)
+        fields = [getattr(model_cls, name) for name in names]
+        kinds = [field_kind(field) for field in fields]
+        record = struct.Struct('<' + ''.join(FORMATS[kind] for kind in kinds))
+        models = sorted(manager.all(), key=lambda model: model.pk)
+        data = bytearray(record.size * len(models))
+        for row, model in enumerate(models):
+            raw = []
+            for field, kind in zip(fields, kinds):
+                raw.extend(encode_value(strings, kind, field.value(model)))
+            record.pack_into(data, row * record.size, *raw)
+        classes.append({
+            'key': orm.storage.class_key(model_cls),
+            'fields': zip(names, kinds),
+            'pk': model_cls._cls_meta.primary_field,
+            'rows': len(models),
+            'offset': offset,
+        })
+        records.append(data)
+        offset += len(data)
+    header = json.dumps({'classes': classes, 'strings': offset})
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as snapshot:
+        snapshot.write(MAGIC)
+        snapshot.write(HEADER_SIZE.pack(len(header)))
+        snapshot.write(header)
+        for data in records:
+            snapshot.write(data)
+        for data in strings.chunks:
+            snapshot.write(data)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.rename(tmp_path, path)
+    orm.wal.fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def encode_value(strings, kind, value):
+    if kind == INT:
+        return (value,)
+    if kind == DATE:
+        return (orm.field.datetime_to_micros(value),)
+    if kind == TEXT:
+        if isinstance(value, unicode):
+            data = value.encode('utf-8')
+            return strings.add(data), len(data) | UNICODE_FLAG
+        return strings.add(value), len(value)
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return strings.add(data), len(data)
+
+
+class SnapshotTable(object):
+    # decodes single values straight from the mapped file
+    def __init__(self, buffer_, base, strings, meta):
+        self.buffer = buffer_
+        self.strings = strings
+        self.rows = meta['rows']
+        self.base = base + meta['offset']
+        self.pk_name = meta['pk']
+        self.fields = {}  # name -> (struct, offset in record, kind)
+        offset = 0
+        for name, kind in meta['fields']:
+            field_struct = struct.Struct('<' + FORMATS[kind])
+            self.fields[name] = field_struct, offset, kind
+            offset += field_struct.size
+        self.record_size = offset
+
+    def value(self, row, name):
+        field_struct, offset, kind = self.fields[name]
+        raw = field_struct.unpack_from(self.buffer, self.base + row * self.record_size + offset)
+        if kind == INT:
+            return raw[0]
+        if kind == DATE:
+            return orm.field.micros_to_datetime(raw[0])
+        start, length = raw
+        start += self.strings
+        if kind == TEXT:
+            if length & UNICODE_FLAG:
+                return self.buffer[start:start + (length & ~UNICODE_FLAG)].decode('utf-8')
+            return self.buffer[start:start + length]
+        return pickle.loads(self.buffer[start:start + length])
+
+    def values(self, row):
+        return {name: self.value(row, name) for name in self.fields}
+
+    def find(self, pk):
+        # rows are sorted by pk
+        lo, hi = 0, self.rows
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.value(middle, self.pk_name) < pk:
+                lo = middle + 1
+            else:
+                hi = middle
+        if lo < self.rows and self.value(lo, self.pk_name) == pk:
+            return lo
+        return None
+
+
+class Snapshot(object):
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot:
+            self.buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(path)
+        header_size, = HEADER_SIZE.unpack_from(self.buffer, len(MAGIC))
+        base = len(MAGIC) + HEADER_SIZE.size
+        header = json.loads(self.buffer[base:base + header_size])
+        base += header_size
+        strings = base + header['strings']
+        self.tables = {
+            meta['key']: SnapshotTable(self.buffer, base, strings, meta)
+            for meta in header['classes']
+        }
+
+    def close(self):
+        self.buffer.close()
+
+
+class SnapshotStorage(orm.storage.Storage):
+    # read-only, pages of the file are shared by every process which maps it
+    snapshot = None
+
+    @classmethod
+    def open(cls, path):
+        SnapshotStorage.snapshot = Snapshot(path)
+
+    @classmethod
+    def close(cls):
+        if SnapshotStorage.snapshot is not None:
+            SnapshotStorage.snapshot.close()
+            SnapshotStorage.snapshot = None
+
+    def set(self, model):
+        raise orm.error.ReadOnlyStorageError
+
+    def set_many(self, models):
+        raise orm.error.ReadOnlyStorageError
+
+    def drop(self, *models):
+        raise orm.error.ReadOnlyStorageError
+
+    def get(self, **query):
+        return list(self.select(orm.query.Condition.parse(query)))
+
+    def select(self, conditions):
+        table = self._get_table()
+        if table is None:
+            return iter(())
+        return (self._model(table, row) for row in self._select_rows(table, conditions))
+
+    def get_many(self, pks):
+        table = self._get_table()
+        if table is None:
+            return {}
+        rows = ((pk, table.find(pk)) for pk in pks)
+        return {pk: self._model(table, row) for pk, row in rows if row is not None}
+
+    def count(self, conditions):
+        table = self._get_table()
+        if table is None:
+            return 0
+        if not conditions:
+            return table.rows
+        return sum(1 for _ in self._select_rows(table, conditions))
+
+    def _select_rows(self, table, conditions):
+        pk_rows = None
+        rest = []
+        for condition in conditions:
+            if condition.field_name == table.pk_name and condition.lookup == 'exact':
+                row = table.find(condition.arg)
+                # every pk condition has to hold, conflicting ones select nothing
+                found = set() if row is None else {row}
+                pk_rows = found if pk_rows is None else pk_rows & found
+            else:
+                rest.append(condition)
+        rows = xrange(table.rows) if pk_rows is None else sorted(pk_rows)
+        for row in rows:
+            # only fields used by conditions are decoded here
+            for condition in rest:
+                if not condition.compare(table.value(row, condition.field_name), condition.arg):
+                    break
+            else:
+                yield row
+
+    def _model(self, table, row):
+        return self.model_cls._from_trusted(table.values(row))
+
+    def _get_table(self):
+        if self.snapshot is None:
+            raise RuntimeError('SnapshotStorage.open() should be called first')
+        return self.snapshot.tables.get(orm.storage.class_key(self.model_cls))
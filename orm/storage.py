@@ -1,3 +1,27 @@
+import itertools
+import operator
+import threading
+
+import orm.error
+import orm.index
+import orm.query
+
+
+RANGE_LOOKUPS = {
+    # lookup: (inclusive, is lower bound)
+    'gt': (False, True),
+    'gte': (True, True),
+    'lt': (False, False),
+    'lte': (True, False),
+    'range': (True, None),
+}
+
+
+def class_key(model_cls):
+    # stable name of a model class for data kept outside of the process
+    return '{}.{}'.format(model_cls.__module__, model_cls.__name__)
+
+
 class Storage(object):
     def __init__(self, model_cls):
         self.model_cls = model_cls
@@ -8,32 +32,280 @@ class Storage(object):
     def get(self, **query):
         pass
 
+    def select(self, conditions):
+        # lazily yields models matching all conditions
+        for model in self.get():
+            if all(condition(model) for condition in conditions):
+                yield model
+
+    def select_ordered(self, conditions, field_name, reverse=False):
+        # storages which can yield models ordered by field_name return an iterable here
+        return None
+
+    def select_query(self, conditions, ordering, offset, limit):
+        # storages which run whole queries, ordering and slicing included, return an iterable here
+        return None
+
+    def count(self, conditions):
+        return sum(1 for _ in self.select(conditions))
+
+    def get_many(self, pks):
+        # pk -> model for every stored pk of pks
+        pk_name = self.model_cls._cls_meta.primary_field
+        models = self.select([orm.query.Condition(pk_name, 'in', set(pks))])
+        return {model.pk: model for model in models}
+
+    def set_many(self, models):
+        for model in models:
+            self.check_unique(model)
+        for model in models:
+            self.set(model)
+
+    def check_unique(self, model):
+        for field in model._cls_meta.unique_fields:
+            filtered_models = [
+                m
+                for m in self.get(**{field: getattr(self.model_cls, field).value(model)})
+                if model.pk != m.pk
+            ]
+            if filtered_models:
+                raise orm.error.FieldNotUniqueError(field)
+
     def drop(self, models):
         pass
 
 
+def dedupe(items, key):
+    # items of one key in a batch replace each other as saved one by one: the last one is kept
+    last = {key(item): i for i, item in enumerate(items)}
+    if len(last) == len(items):
+        return items
+    return [item for i, item in enumerate(items) if last[key(item)] == i]
+
+
 class SingletonRamStorage(Storage):
     items = {}
+    indexes = {}  # model_cls -> {field_name: index}
+    indexed_values = {}  # model_cls -> {pk: {field_name: value}} as they were indexed
+    stored_pks = {}  # model_cls -> {id(model): pk}
 
     def set(self, model):
         storage = self._get_model_storage()
-        storage[model.pk] = model
+        stored_pks = self._get_model_stored_pks()
+        pk = model.pk
+        old_pk = stored_pks.get(id(model))
+        self._check_unique(model, pk, old_pk)
+        if old_pk is not None and old_pk != pk:
+            self._remove(old_pk)
+        if pk in storage:
+            self._remove(pk)
+        storage[pk] = model
+        stored_pks[id(model)] = pk
+        self._index(model, pk)
+
+    def set_many(self, models):
+        # the whole batch is checked before anything is stored
+        storage = self._get_model_storage()
+        stored_pks = self._get_model_stored_pks()
+        entries = dedupe([(model, model.pk, stored_pks.get(id(model))) for model in models], operator.itemgetter(1))
+        self._check_unique_many(entries)
+        for model, pk, old_pk in entries:
+            # a model of the batch may have taken the old pk already
+            if old_pk is not None and old_pk != pk and storage.get(old_pk) is model:
+                self._remove(old_pk)
+            if pk in storage:
+                self._remove(pk)
+            storage[pk] = model
+            stored_pks[id(model)] = pk
+        indexed_values = self._get_model_indexed_values()
+        indexes = [
+            (field_name, getattr(self.model_cls, field_name).value, index)
+            for field_name, index in self._get_model_indexes().iteritems()
+        ]
+        for model, pk, old_pk in entries:
+            values = indexed_values[pk] = {}
+            for field_name, get_value, index in indexes:
+                value = values[field_name] = get_value(model)
+                index.add(value, pk)
 
     def get(self, **query):
+        return list(self.select(orm.query.Condition.parse(query)))
+
+    def get_many(self, pks):
         storage = self._get_model_storage()
-        models = storage.values()
-        for attr, value in query.iteritems():
-            models = [
-                model
-                for model in models
-                if getattr(model, attr) == value
-            ]
-        return models
+        models = ((pk, storage.get(pk)) for pk in pks)
+        return {pk: model for pk, model in models if model is not None}
+
+    def select(self, conditions):
+        storage = self._get_model_storage()
+        pks, conditions = self._lookup_indexes(conditions)
+        if pks is None:
+            pks, conditions = self._lookup_sorted_indexes(conditions)
+        if pks is None:
+            models = storage.values()
+        else:
+            models = itertools.imap(storage.get, pks)
+        return self._filter(models, conditions)
+
+    def select_ordered(self, conditions, field_name, reverse=False):
+        ordered = self._lookup_ordered(conditions, field_name, reverse)
+        if ordered is None:
+            return None
+        ordered_pks, conditions = ordered
+        storage = self._get_model_storage()
+        return self._filter(itertools.imap(storage.get, ordered_pks), conditions)
+
+    def _lookup_ordered(self, conditions, field_name, reverse):
+        # returns pks ordered by a sorted index and the rest of conditions,
+        # None if the field has no sorted index or sorting matched models is cheaper
+        index = self._get_model_indexes().get(field_name)
+        if not isinstance(index, orm.index.SortedIndex):
+            return None
+        pks, conditions = self._lookup_indexes(conditions)
+        bounds, conditions = self._get_bounds(conditions, field_name)
+        if pks is not None and len(pks) < index.count(*bounds):
+            return None
+        ordered_pks = index.range(*bounds, reverse=reverse)
+        if pks is not None:
+            ordered_pks = (pk for pk in ordered_pks if pk in pks)
+        return ordered_pks, conditions
+
+    def check_unique(self, model):
+        pk = model.pk
+        self._check_unique(model, pk, self._get_model_stored_pks().get(id(model)))
 
     def drop(self, *models):
+        storage = self._get_model_storage()
+        stored_pks = self._get_model_stored_pks()
+        for model in models:
+            pk = stored_pks.get(id(model), model.pk)
+            if pk not in storage:
+                raise KeyError(pk)
+            self._remove(pk)
+
+    def _check_unique(self, model, pk, old_pk):
+        # the primary field isn't checked: saving a model with a stored pk replaces it
+        indexes = self._get_model_indexes()
+        for field_name in self._get_model_unique_fields():
+            for owner in indexes[field_name].lookup(getattr(self.model_cls, field_name).value(model)):
+                if owner != pk and owner != old_pk:
+                    raise orm.error.FieldNotUniqueError(field_name)
+
+    def _check_unique_many(self, entries):
+        # stored rows replaced by the batch give their values up
+        touched = set()
+        for model, pk, old_pk in entries:
+            touched.add(pk)
+            touched.add(old_pk)
+        indexes = self._get_model_indexes()
+        for field_name in self._get_model_unique_fields():
+            index = indexes[field_name]
+            get_value = getattr(self.model_cls, field_name).value
+            batch_owners = {}
+            for model, pk, old_pk in entries:
+                value = get_value(model)
+                if batch_owners.setdefault(value, pk) != pk:
+                    raise orm.error.FieldNotUniqueError(field_name)
+                for owner in index.lookup(value):
+                    if owner not in touched:
+                        raise orm.error.FieldNotUniqueError(field_name)
+
+    def _lookup_indexes(self, conditions):
+        # returns pks matched by indexed conditions (None if there are no such conditions)
+        # and the rest of conditions
+        matched = []
+        rest = []
+        for condition in conditions:
+            pks = self._lookup_index(condition)
+            if pks is None:
+                rest.append(condition)
+            else:
+                matched.append(pks)
+        if not matched:
+            return None, rest
+        matched.sort(key=len)
+        pks = set(matched[0])
+        for other in matched[1:]:
+            if not pks:
+                break
+            pks.intersection_update(other)
+        return pks, rest
+
+    def _lookup_sorted_indexes(self, conditions):
+        # streams pks from the first sorted index which has range conditions
+        for field_name, index in self._get_model_indexes().iteritems():
+            if not isinstance(index, orm.index.SortedIndex):
+                continue
+            bounds, rest = self._get_bounds(conditions, field_name)
+            if len(rest) < len(conditions):
+                return index.range(*bounds), rest
+        return None, conditions
+
+    @staticmethod
+    def _get_bounds(conditions, field_name):
+        # narrowest (lo, hi, lo_inclusive, hi_inclusive) of range conditions on field_name
+        lo, hi, lo_inclusive, hi_inclusive = None, None, True, True
+        rest = []
+        for condition in conditions:
+            if condition.field_name != field_name or condition.lookup not in RANGE_LOOKUPS:
+                rest.append(condition)
+                continue
+            if condition.lookup == 'range':
+                bounds = [(condition.arg[0], True, True), (condition.arg[1], True, False)]
+            else:
+                inclusive, is_lower = RANGE_LOOKUPS[condition.lookup]
+                bounds = [(condition.arg, inclusive, is_lower)]
+            for value, inclusive, is_lower in bounds:
+                if is_lower and (lo is None or value > lo or (value == lo and not inclusive)):
+                    lo, lo_inclusive = value, inclusive
+                elif not is_lower and (hi is None or value < hi or (value == hi and not inclusive)):
+                    hi, hi_inclusive = value, inclusive
+        return (lo, hi, lo_inclusive, hi_inclusive), rest
+
+    @staticmethod
+    def _filter(models, conditions):
+        # models dropped while a query streams come as None
         for model in models:
-            storage = self._get_model_storage(model.__class__)
-            del storage[model.pk]
+            if model is None:
+                continue
+            for condition in conditions:
+                if not condition(model):
+                    break
+            else:
+                yield model
+
+    def _lookup_index(self, condition):
+        if condition.lookup == 'exact':
+            values = (condition.arg,)
+        elif condition.lookup == 'in':
+            values = list(condition.arg)  # any iterable, e.g. a set
+        else:
+            return None
+        if condition.field_name == self.model_cls._cls_meta.primary_field:
+            storage = self._get_model_storage()
+            return [value for value in values if value in storage]
+        index = self._get_model_indexes().get(condition.field_name)
+        if index is None:
+            return None
+        if len(values) == 1:
+            return index.lookup(values[0])
+        return set().union(*[index.lookup(value) for value in values])
+
+    def _index(self, model, pk):
+        values = {}
+        for field_name, index in self._get_model_indexes().iteritems():
+            value = getattr(self.model_cls, field_name).value(model)
+            index.add(value, pk)
+            values[field_name] = value
+        self._get_model_indexed_values()[pk] = values
+
+    def _remove(self, pk):
+        model = self._get_model_storage().pop(pk)
+        self._get_model_stored_pks().pop(id(model), None)
+        values = self._get_model_indexed_values().pop(pk, {})
+        indexes = self._get_model_indexes()
+        for field_name, value in values.iteritems():
+            indexes[field_name].remove(value, pk)
 
     def _get_model_storage(self):
         model_key = self.model_cls
@@ -42,3 +314,132 @@ class SingletonRamStorage(Storage):
         except KeyError:
             self.items[model_key] = {}
             return self.items[model_key]
+
+    def _get_model_indexes(self):
+        model_key = self.model_cls
+        try:
+            return self.indexes[model_key]
+        except KeyError:
+            unique_fields = self._get_model_unique_fields()
+            pk_name = self.model_cls._cls_meta.primary_field
+            indexes = {}
+            for field_name in self.model_cls._cls_meta.indexed_fields:
+                if getattr(self.model_cls, field_name).index == 'sorted':
+                    indexes[field_name] = orm.index.SortedIndex(field_name)
+                elif field_name in unique_fields:
+                    indexes[field_name] = orm.index.UniqueIndex(field_name)
+                elif field_name != pk_name:
+                    indexes[field_name] = orm.index.HashIndex(field_name)
+            self.indexes[model_key] = indexes
+            return indexes
+
+    def _get_model_unique_fields(self):
+        pk_name = self.model_cls._cls_meta.primary_field
+        return [
+            field_name
+            for field_name in self.model_cls._cls_meta.unique_fields
+            if field_name != pk_name
+        ]
+
+    def _get_model_indexed_values(self):
+        model_key = self.model_cls
+        try:
+            return self.indexed_values[model_key]
+        except KeyError:
+            self.indexed_values[model_key] = {}
+            return self.indexed_values[model_key]
+
+    def _get_model_stored_pks(self):
+        model_key = self.model_cls
+        try:
+            return self.stored_pks[model_key]
+        except KeyError:
+            self.stored_pks[model_key] = {}
+            return self.stored_pks[model_key]
+
+
+class ConcurrentRamStorage(SingletonRamStorage):
+    # safe for concurrent writers: checking unique fields and inserting happen under one lock
+    # per model class, models without secondary indexes only lock the shards of their pks.
+    # threads of one process still share a core because of the GIL, and so do the clients of
+    # an orm.remote server, which keeps its models in this storage
+    shards = 64
+    locks = {}  # model_cls -> (class lock, shard locks)
+    locks_guard = threading.Lock()
+
+    def __init__(self, model_cls):
+        super(ConcurrentRamStorage, self).__init__(model_cls)
+        # the dicts of the class are made here, so writers never make their own ones at once
+        with self.locks_guard:
+            self._get_model_storage()
+            self._get_model_indexes()
+            self._get_model_indexed_values()
+            self._get_model_stored_pks()
+        self.class_lock, self.shard_locks = self._get_model_locks()
+        self.sharded = not self._get_model_indexes()
+
+    def set(self, model):
+        with self._write_lock([model.pk, self._get_model_stored_pks().get(id(model))]):
+            super(ConcurrentRamStorage, self).set(model)
+
+    def set_many(self, models):
+        models = list(models)
+        stored_pks = self._get_model_stored_pks()
+        pks = [model.pk for model in models] + [stored_pks.get(id(model)) for model in models]
+        with self._write_lock(pks):
+            super(ConcurrentRamStorage, self).set_many(models)
+
+    def drop(self, *models):
+        stored_pks = self._get_model_stored_pks()
+        with self._write_lock([stored_pks.get(id(model), model.pk) for model in models]):
+            super(ConcurrentRamStorage, self).drop(*models)
+
+    # indexes are read under the class lock: matched pks are copied there, so a select sees one state
+    # of the indexes, models are fetched and filtered after the lock is released. writers wait for
+    # the copy, which is as long as the matched range of a sorted index; narrow ranges keep it short
+
+    def _lookup_indexes(self, conditions):
+        # the result is a new set already
+        with self.class_lock:
+            return super(ConcurrentRamStorage, self)._lookup_indexes(conditions)
+
+    def _lookup_sorted_indexes(self, conditions):
+        with self.class_lock:
+            pks, rest = super(ConcurrentRamStorage, self)._lookup_sorted_indexes(conditions)
+            return pks if pks is None else list(pks), rest
+
+    def _lookup_ordered(self, conditions, field_name, reverse):
+        with self.class_lock:
+            ordered = super(ConcurrentRamStorage, self)._lookup_ordered(conditions, field_name, reverse)
+            return ordered if ordered is None else (list(ordered[0]), ordered[1])
+
+    def _write_lock(self, pks):
+        if not self.sharded:
+            return self.class_lock
+        shards = sorted(set(hash(pk) % self.shards for pk in pks if pk is not None))
+        return ShardLocks([self.shard_locks[shard] for shard in shards])
+
+    def _get_model_locks(self):
+        with self.locks_guard:
+            try:
+                return self.locks[self.model_cls]
+            except KeyError:
+                locks = self.locks[self.model_cls] = (
+                    threading.RLock(),
+                    [threading.Lock() for _ in xrange(self.shards)],
+                )
+                return locks
+
+
+class ShardLocks(object):
+    # takes locks in the given (sorted) order, so writers can't deadlock
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.release()
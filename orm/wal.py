@@ -0,0 +1,283 @@
+# durable ram storage: writes are appended to a log, startup replays the last snapshot and the log
+import cPickle as pickle
+import operator
+import os
+import struct
+import threading
+import time
+import zlib
+
+import orm.codegen
+import orm.storage
+
+
+SET = 1
+DROP = 2
+GROUP = 3  # log record: all (operation, class key, pk, field names, values) of one group commit
+BATCH = 4  # snapshot record: class key, field names and many (values, pk) of one model class
+
+HEADER = struct.Struct('<IIB')  # payload length, crc32 of operation and payload, operation
+OPERATIONS = frozenset([SET, DROP, GROUP, BATCH])
+SNAPSHOT_CHUNK = 10000
+
+
+def checksum(operation, data):
+    return zlib.crc32(data, zlib.crc32(chr(operation))) & 0xffffffff
+
+
+def read_records(path):
+    # yields (operation, payload, end offset); the log ends at the first record which is torn,
+    # fails its checksum or can't be unpickled, e.g. a tail of zeros after a crash
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as log:
+        data = log.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, crc, operation = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if operation not in OPERATIONS or end > len(data):
+            return
+        payload = data[offset + HEADER.size:end]
+        if checksum(operation, payload) != crc:
+            return
+        try:
+            payload = pickle.loads(payload)
+        except Exception:
+            return
+        yield operation, payload, end
+        offset = end
+
+
+def encode_record(operation, payload):
+    data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(data), checksum(operation, data), operation) + data
+
+
+def fsync_directory(directory):
+    # renamed and created files keep their names after a crash once their directory is synced
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal(object):
+    # group commit: records are buffered and written by one write() per group,
+    # fsync runs once per fsync_every records or fsync_interval seconds
+    def __init__(self, directory, group_size=256, fsync_every=4096, fsync_interval=0.1, snapshot_every=None):
+        self.directory = directory
+        self.log_path = os.path.join(directory, 'journal.log')
+        self.snapshot_path = os.path.join(directory, 'snapshot.bin')
+        self.group_size = group_size
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.unsynced = 0
+        self.logged = 0  # records in the log since the last snapshot
+        self.last_sync = time.time()
+        self.log = None
+        self.closed = False
+        self.stopped = threading.Event()
+        self.flusher = None
+
+    def load(self):
+        # class key -> {pk: values} as they are after the snapshot and the log
+        rows = {}
+        for operation, payload, end in read_records(self.snapshot_path):
+            key, names, batch = payload
+            table = rows.setdefault(key, {})
+            for values, pk in batch:
+                table[pk] = dict(zip(names, values))
+        valid_end = 0
+        for _, group, end in read_records(self.log_path):
+            for operation, key, pk, names, values in group:
+                table = rows.setdefault(key, {})
+                if operation == SET:
+                    table[pk] = dict(zip(names, values))
+                else:
+                    table.pop(pk, None)
+            self.logged += len(group)
+            valid_end = end
+        self._open_log(valid_end)
+        self._start_flusher()
+        return rows
+
+    def append(self, operation, key, pk, names=None, values=None):
+        self.extend([(operation, key, pk, names, values)])
+
+    def extend(self, records):
+        with self.lock:
+            self.pending.extend(records)
+            if len(self.pending) >= self.group_size or time.time() - self.last_sync >= self.fsync_interval:
+                self._commit()
+
+    def commit(self, sync=False):
+        with self.lock:
+            self._commit(sync)
+
+    def _commit(self, sync=False):
+        if self.pending:
+            self.log.write(encode_record(GROUP, self.pending))
+            self.log.flush()
+            self.unsynced += len(self.pending)
+            self.logged += len(self.pending)
+            self.pending = []
+        if self.unsynced and (sync or self.unsynced >= self.fsync_every or
+                              time.time() - self.last_sync >= self.fsync_interval):
+            os.fsync(self.log.fileno())
+            self.unsynced = 0
+        self.last_sync = time.time()
+
+    def write_snapshot(self, tables):
+        # tables: class key -> (field names, iterable of (values, pk)); the log is truncated afterwards
+        with self.lock:
+            self._commit(sync=True)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as snapshot:
+                for key, (names, rows) in tables.iteritems():
+                    chunk = []
+                    for row in rows:
+                        chunk.append(row)
+                        if len(chunk) >= SNAPSHOT_CHUNK:
+                            snapshot.write(encode_record(BATCH, (key, names, chunk)))
+                            chunk = []
+                    if chunk:
+                        snapshot.write(encode_record(BATCH, (key, names, chunk)))
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.rename(tmp_path, self.snapshot_path)
+            fsync_directory(self.directory)
+            self.log.seek(0)
+            self.log.truncate()
+            os.fsync(self.log.fileno())
+            self.logged = 0
+
+    def needs_snapshot(self):
+        return self.snapshot_every is not None and self.logged >= self.snapshot_every
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self._commit(sync=True)
+            self.log.close()
+            self.closed = True
+        self.stopped.set()
+        if self.flusher is not None and self.flusher is not threading.current_thread():
+            self.flusher.join()
+
+    def _start_flusher(self):
+        # commits the tail of a group when writes pause
+        def flush_loop():
+            while not self.stopped.wait(self.fsync_interval):
+                with self.lock:
+                    if not self.closed and (self.pending or self.unsynced):
+                        self._commit(sync=True)
+        self.flusher = threading.Thread(target=flush_loop, name='journal-flusher')
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def _open_log(self, valid_end):
+        exists = os.path.exists(self.log_path)
+        self.log = open(self.log_path, 'r+b' if exists else 'w+b')
+        self.log.truncate(valid_end)  # drop a torn or corrupt tail left by a crash
+        self.log.seek(valid_end)
+        if not exists:
+            fsync_directory(self.directory)
+
+
+class LogStorage(orm.storage.SingletonRamStorage):
+    # set up once per process before models are used:
+    #   orm.wal.LogStorage.open('/var/lib/chrono', fsync_every=1024)
+    # then declare models with ModelManager(storage_cls=orm.wal.LogStorage)
+    journal = None
+    replayed = {}  # class key -> {pk: values} not loaded into models yet
+    storages = {}  # class key -> storage of a model class loaded in this process
+
+    def __init__(self, model_cls):
+        super(LogStorage, self).__init__(model_cls)
+        if self.journal is None:
+            raise RuntimeError('LogStorage.open() should be called first')
+        key = orm.storage.class_key(model_cls)
+        self.key = key
+        self.names = tuple(model_cls._cls_meta.field_names)
+        fields = [getattr(model_cls, name) for name in self.names]
+        if any(field.cached for field in fields):
+            # such fields resolve their values on reads, stored values are logged
+            self.getter = lambda model: tuple(field.value(model) for field in fields)
+        else:
+            self.getter = operator.attrgetter(*self.names)
+            if len(self.names) == 1:
+                self.getter = lambda model, getter=self.getter: (getter(model),)
+        if key not in self.storages:
+            self.storages[key] = self
+            self._load(self.replayed.pop(key, {}))
+
+    @classmethod
+    def open(cls, directory, **journal_options):
+        LogStorage.journal = Journal(directory, **journal_options)
+        LogStorage.replayed = LogStorage.journal.load()
+        LogStorage.storages = {}
+
+    @classmethod
+    def close(cls):
+        if LogStorage.journal is not None:
+            LogStorage.journal.close()
+            LogStorage.journal = None
+
+    @classmethod
+    def snapshot(cls):
+        tables = {}
+        for key, rows in cls.replayed.iteritems():
+            names = tuple(set().union(*rows.itervalues()))
+            tables[key] = names, [(tuple(values.get(name) for name in names), pk) for pk, values in rows.iteritems()]
+        for key, storage in cls.storages.iteritems():
+            rows = cls.items.get(storage.model_cls, {})
+            tables[key] = storage.names, ((storage.getter(model), pk) for pk, model in rows.iteritems())
+        cls.journal.write_snapshot(tables)
+
+    def set(self, model):
+        old_pk = self._get_model_stored_pks().get(id(model))
+        super(LogStorage, self).set(model)
+        if old_pk is not None and old_pk != model.pk:
+            self.journal.append(DROP, self.key, old_pk)
+        self.journal.append(SET, self.key, model.pk, self.names, self.getter(model))
+        self._snapshot_if_needed()
+
+    def set_many(self, models):
+        models = list(models)
+        stored_pks = self._get_model_stored_pks()
+        old_pks = [stored_pks.get(id(model)) for model in models]
+        super(LogStorage, self).set_many(models)
+        records = []
+        for model, old_pk in zip(models, old_pks):
+            pk = model.pk
+            if old_pk is not None and old_pk != pk:
+                records.append((DROP, self.key, old_pk, None, None))
+            records.append((SET, self.key, pk, self.names, self.getter(model)))
+        self.journal.extend(records)
+        self._snapshot_if_needed()
+
+    def drop(self, *models):
+        stored_pks = self._get_model_stored_pks()
+        pks = [stored_pks.get(id(model), model.pk) for model in models]
+        super(LogStorage, self).drop(*models)
+        self.journal.extend([(DROP, self.key, pk, None, None) for pk in pks])
+
+    def _load(self, rows):
+        # replayed rows were validated when they were written
+        from_trusted = orm.codegen.resolve(self.model_cls._from_trusted)
+        models = [from_trusted(values) for values in rows.itervalues()]
+        if models:
+            super(LogStorage, self).set_many(models)
+
+    def _snapshot_if_needed(self):
+        if self.journal.needs_snapshot():
+            self.snapshot()
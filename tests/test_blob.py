@@ -0,0 +1,34 @@
+import shutil
+import tempfile
+import unittest
+
+import orm.blob
+
+
+def failing_chunks():
+    yield b'head'
+    raise ValueError('source failed')
+
+
+class BlobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = orm.blob.BlobStore(self.root, durable=False)
+        self.queue = orm.blob.BlobQueue(self.store, threads=1)
+
+    def tearDown(self):
+        self.queue.stop()
+        shutil.rmtree(self.root)
+
+    def test_failed_writes_keep_writer_alive(self):
+        digests = []
+        self.queue.submit(failing_chunks())
+        self.queue.submit([u'text \u2603'])
+        self.queue.submit(b'body', digests.append)
+        self.queue.join()
+        self.assertEqual(self.queue.failed, 2)
+        self.assertEqual(self.store.get(digests[0]).read(), b'body')
+
+
+if __name__ == '__main__':
+    unittest.main()
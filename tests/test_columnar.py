@@ -0,0 +1,45 @@
+import datetime
+import unittest
+
+import orm.columnar
+import orm.error
+import orm.field
+import orm.manager
+import orm.model
+
+
+def make_model():
+    class Event(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=orm.columnar.ColumnarStorage)
+
+        ts = orm.field.DateField()
+        duration = orm.field.IntegerField(default=0)
+        mark_id = orm.field.IntegerField(unique=True)
+    return Event
+
+
+class ColumnarStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.Event = make_model()
+        self.ts = datetime.datetime(2020, 1, 1)
+
+    def test_failed_row_leaves_columns_aligned(self):
+        self.Event(id=1, ts=self.ts, mark_id=1).save()
+        with self.assertRaises(TypeError):
+            self.Event(id=2, ts=self.ts, duration=99, mark_id='7').save()
+        self.Event(id=3, ts=self.ts, mark_id=3).save()
+        event = self.Event.objects.get(id=3)
+        self.assertEqual((event.duration, event.mark_id), (0, 3))
+        self.assertEqual(self.Event.objects.filter().count(), 2)
+
+    def test_batch_swaps_unique_values(self):
+        self.Event.objects.bulk_save([self.Event(id=1, ts=self.ts, mark_id=1), self.Event(id=2, ts=self.ts, mark_id=2)])
+        self.Event.objects.bulk_save([self.Event(id=1, ts=self.ts, mark_id=2), self.Event(id=2, ts=self.ts, mark_id=1)])
+        self.assertEqual(self.Event.objects.get(mark_id=1).id, 2)
+        self.assertEqual(self.Event.objects.get(mark_id=2).id, 1)
+        with self.assertRaises(orm.error.FieldNotUniqueError):
+            self.Event(id=3, ts=self.ts, mark_id=1).save()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import orm.error
+import orm.field
+import orm.manager
+import orm.model
+import orm.remote
+import orm.snapshot
+
+
+def make_model(storage_cls):
+    class Runner(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=storage_cls)
+
+        bib = orm.field.IntegerField(unique=True)
+    return Runner
+
+
+class RemoteErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'chrono.sock')
+        # both classes have the same key, the server one keeps the rows
+        self.server = orm.remote.StorageServer(path, [make_model(orm.remote.RemoteStorage)])
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        orm.remote.RemoteStorage.connect(path)
+        self.Runner = make_model(orm.remote.RemoteStorage)
+
+    def tearDown(self):
+        orm.remote.RemoteStorage.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_model_errors_keep_their_class(self):
+        self.Runner(id=1, bib=10).save()
+        with self.assertRaises(orm.error.FieldNotUniqueError):
+            self.Runner(id=2, bib=10).save()
+
+    def test_builtin_errors_keep_their_class_and_message(self):
+        with self.assertRaises(ValueError) as context:
+            self.Runner.objects.storage._call(0)
+        self.assertEqual(str(context.exception), 'unknown opcode 0')
+
+
+class ReadServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'chrono.sock')
+        self.snapshot_path = path + '.snap'
+        server_classes = [make_model(orm.remote.RemoteStorage)]
+        self.server = orm.remote.StorageServer(path, server_classes)
+        self.server.write_snapshot(self.snapshot_path)
+        self.reader = orm.remote.ReadServer(path + '.read', server_classes, self.snapshot_path)
+        for server in (self.server, self.reader):
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+        orm.remote.RemoteStorage.connect(path, read_path=path + '.read')
+        self.Runner = make_model(orm.remote.RemoteStorage)
+
+    def tearDown(self):
+        orm.remote.RemoteStorage.close()
+        orm.snapshot.SnapshotStorage.close()
+        for server in (self.server, self.reader):
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.directory)
+
+    def bibs(self):
+        return [model.bib for model in self.Runner.objects.order_by('-bib')]
+
+    def test_reads_see_writes_of_the_last_snapshot(self):
+        self.Runner.objects.bulk_create([{'id': i, 'bib': 10 + i} for i in xrange(3)])
+        self.assertEqual(self.bibs(), [])
+        self.server.write_snapshot(self.snapshot_path)
+        self.assertEqual(self.bibs(), [12, 11, 10])
+        self.assertEqual(self.Runner.objects.filter(bib__gte=11).count(), 2)
+        self.assertEqual(sorted(self.Runner.objects.in_bulk([0, 2, 5])), [0, 2])
+
+    def test_read_server_refuses_writes(self):
+        with self.assertRaises(orm.error.ReadOnlyStorageError):
+            self.Runner.objects.storage._read(orm.remote.SET, {'id': 1, 'bib': 10})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import orm.field
+import orm.manager
+import orm.model
+import orm.snapshot
+import orm.storage
+
+
+def make_models():
+    class Source(orm.model.Model):
+        name = orm.field.TextField()
+
+    class Runner(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=orm.snapshot.SnapshotStorage)
+
+        name = orm.field.TextField()
+    return Source, Runner
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'results.snap')
+        self.Source, self.Runner = make_models()
+        # the snapshot is keyed by class name, the source class stands for the writer's model
+        self.Source.__name__ = self.Runner.__name__
+        self.Source.objects.bulk_create([{'id': i, 'name': 'n{}'.format(i)} for i in xrange(3)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rewrite_keeps_open_snapshot_readable(self):
+        orm.snapshot.write_snapshot(self.path, [self.Source])
+        orm.snapshot.SnapshotStorage.open(self.path)
+        self.Source.objects.bulk_create([{'id': 1, 'name': 'changed'}])
+        orm.snapshot.write_snapshot(self.path, [self.Source])
+        self.assertEqual(self.Runner.objects.get(id=1).name, 'n1')
+        self.assertEqual(os.listdir(self.directory), ['results.snap'])
+
+    def test_pk_conditions_intersect(self):
+        orm.snapshot.write_snapshot(self.path, [self.Source])
+        orm.snapshot.SnapshotStorage.open(self.path)
+        self.assertEqual(self.Runner.objects.filter(id=1).filter(id=2).count(), 0)
+        self.assertEqual([model.id for model in self.Runner.objects.filter(id=1).filter(id=1)], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+
+import orm.error
+import orm.field
+import orm.manager
+import orm.model
+import orm.storage
+
+
+def make_model(storage_cls=orm.storage.SingletonRamStorage):
+    # a new class per test, storages keep rows per model class
+    class Runner(orm.model.Model):
+        objects = orm.manager.ModelManager(storage_cls=storage_cls)
+
+        bib = orm.field.IntegerField(unique=True)
+        team = orm.field.IntegerField(index=True, default=0)
+    return Runner
+
+
+class IndexTest(unittest.TestCase):
+    storage_cls = orm.storage.SingletonRamStorage
+
+    def setUp(self):
+        self.Runner = make_model(self.storage_cls)
+
+    def pks(self, **query):
+        return sorted(model.pk for model in self.Runner.objects.filter(**query))
+
+    def test_resave_moves_index_entries(self):
+        runner = self.Runner(id=1, bib=10, team=1)
+        runner.save()
+        runner.bib = 11
+        runner.team = 2
+        runner.save()
+        self.assertEqual(self.pks(bib=10), [])
+        self.assertEqual(self.pks(team=1), [])
+        self.assertEqual(self.pks(bib=11), [1])
+        self.assertEqual(self.pks(team=2), [1])
+
+    def test_drop_removes_index_entries(self):
+        runner = self.Runner(id=1, bib=10, team=1)
+        runner.save()
+        self.Runner(id=2, bib=11, team=1).save()
+        self.Runner.objects.drop(runner)
+        self.assertEqual(self.pks(bib=10), [])
+        self.assertEqual(self.pks(team=1), [2])
+        self.Runner(id=3, bib=10).save()
+        self.assertEqual(self.pks(bib=10), [3])
+
+
+class ConcurrentIndexTest(IndexTest):
+    storage_cls = orm.storage.ConcurrentRamStorage
+
+
+class UniqueTest(unittest.TestCase):
+    storage_cls = orm.storage.SingletonRamStorage
+
+    def setUp(self):
+        self.Runner = make_model(self.storage_cls)
+
+    def pks(self, **query):
+        return sorted(model.pk for model in self.Runner.objects.filter(**query))
+
+    def test_value_of_stored_row_is_refused(self):
+        self.Runner(id=1, bib=10).save()
+        with self.assertRaises(orm.error.FieldNotUniqueError):
+            self.Runner(id=2, bib=10).save()
+        self.assertEqual(self.pks(), [1])
+        self.assertEqual(self.pks(bib=10), [1])
+
+    def test_resave_keeps_own_value(self):
+        runner = self.Runner(id=1, bib=10, team=1)
+        runner.save()
+        runner.team = 2
+        runner.save()
+        self.assertEqual(self.pks(bib=10), [1])
+
+    def test_renamed_pk_keeps_value_reserved(self):
+        runner = self.Runner(id=1, bib=10)
+        runner.save()
+        runner.id = 2
+        runner.save()
+        self.assertEqual(self.pks(), [2])
+        self.assertEqual(self.pks(bib=10), [2])
+        with self.assertRaises(orm.error.FieldNotUniqueError):
+            self.Runner(id=1, bib=10).save()
+        self.Runner(id=1, bib=11).save()
+        self.assertEqual(self.pks(), [1, 2])
+
+
+class ConcurrentUniqueTest(UniqueTest):
+    storage_cls = orm.storage.ConcurrentRamStorage
+
+
+class BatchSaveTest(unittest.TestCase):
+    storage_cls = orm.storage.SingletonRamStorage
+
+    def setUp(self):
+        self.Runner = make_model(self.storage_cls)
+
+    def pks(self, **query):
+        return sorted(model.pk for model in self.Runner.objects.filter(**query))
+
+    def test_pk_taken_by_batch_is_kept(self):
+        moved = self.Runner(id=1, bib=10)
+        moved.save()
+        moved.id = 2
+        self.Runner.objects.bulk_save([self.Runner(id=1, bib=11), moved])
+        self.assertEqual(self.pks(), [1, 2])
+        self.assertEqual(self.pks(bib=10), [2])
+        self.assertEqual(self.pks(bib=11), [1])
+
+    def test_repeated_pk_keeps_last_row(self):
+        self.Runner.objects.bulk_save([self.Runner(id=1, bib=10, team=1), self.Runner(id=1, bib=11, team=2)])
+        self.assertEqual(self.pks(bib=10), [])
+        self.assertEqual(self.pks(team=2), [1])
+        self.Runner(id=2, bib=10).save()
+        self.assertEqual(self.pks(bib=10), [2])
+
+    def test_batch_swaps_unique_values(self):
+        self.Runner.objects.bulk_save([self.Runner(id=1, bib=10), self.Runner(id=2, bib=11)])
+        self.Runner.objects.bulk_save([self.Runner(id=1, bib=11), self.Runner(id=2, bib=10)])
+        self.assertEqual(self.pks(bib=10), [2])
+        self.assertEqual(self.pks(bib=11), [1])
+
+
+    def test_duplicate_value_within_batch_is_refused(self):
+        with self.assertRaises(orm.error.FieldNotUniqueError):
+            self.Runner.objects.bulk_create([{'id': 1, 'bib': 10}, {'id': 2, 'bib': 10}])
+        self.assertEqual(self.pks(), [])
+
+    def test_value_of_stored_row_is_refused(self):
+        self.Runner(id=1, bib=10).save()
+        with self.assertRaises(orm.error.FieldNotUniqueError):
+            self.Runner.objects.bulk_save([self.Runner(id=2, bib=11), self.Runner(id=3, bib=10)])
+        self.assertEqual(self.pks(), [1])
+        self.assertEqual(self.pks(bib=10), [1])
+
+    def test_renamed_pk_gives_old_pk_up(self):
+        moved = self.Runner(id=1, bib=10, team=1)
+        moved.save()
+        moved.id = 2
+        self.Runner.objects.bulk_save([moved, self.Runner(id=3, bib=11)])
+        self.assertEqual(self.pks(), [2, 3])
+        self.assertEqual(self.pks(bib=10), [2])
+        self.assertEqual(self.pks(team=1), [2])
+
+
+class ConcurrentBatchSaveTest(BatchSaveTest):
+    storage_cls = orm.storage.ConcurrentRamStorage
+
+    def test_class_dicts_are_made_with_the_storage(self):
+        # writers only read them, so two threads can't each make their own
+        storage = self.Runner.objects.storage
+        for dicts in (storage.items, storage.indexes, storage.indexed_values, storage.stored_pks):
+            self.assertIn(self.Runner, dicts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+# fusion of raw reads before storage: all reads of a mark by the sensors of one checkpoint
+# become one crossing, timestamps corrected by clock offsets of the sensors
+#   fusion = timing.fusion.Fusion(choose=timing.fusion.PEAK)
+#   crossings = fusion.add(read) + fusion.advance(time.time()) + ... + fusion.flush()
+# or as the stage of timing.ingest.Pipeline(fusion=...). replay a recorded log with
+#   python -m timing.fusion reads.log [first|peak] [<sensor id>:<checkpoint id> ...]
+# offsets are relative to a reference sensor of every checkpoint, the one seen first: a sensor's
+# offset follows the difference of its mean read time to the reference's in closed crossings
+import sys
+
+import models.events
+import orm.field
+import timing.ingest
+import timing.matching
+import timing.rules
+
+
+FIRST = 'first'  # the earliest read of a crossing
+PEAK = 'peak'  # the read with the strongest signal, the earliest of equal ones
+
+
+def seconds(value):
+    return int(value * 1000000)
+
+
+class ClockSkew(object):
+    # offsets of the sensors of one checkpoint to its reference sensor: the first read of a mark
+    # by a sensor within max_skew of a reference read gives a rough offset, so reads of both fall
+    # into one crossing, crossings then give an exponential average
+    def __init__(self, alpha=0.05, max_skew=30.0):
+        self.alpha = alpha
+        self.max_skew = seconds(max_skew)
+        self.reference = None
+        self.offsets = {}  # sensor id -> microseconds its clock is ahead
+        self.reference_reads = {}  # mark id -> ts of the last read by the reference
+
+    def observe(self, sensor_id, mark_id, ts):
+        if self.reference is None:
+            self.reference = sensor_id
+            self.offsets[sensor_id] = 0
+        if sensor_id == self.reference:
+            self.reference_reads[mark_id] = ts
+            return
+        if sensor_id in self.offsets:
+            return
+        reference_ts = self.reference_reads.get(mark_id)
+        if reference_ts is not None and abs(ts - reference_ts) <= self.max_skew:
+            self.offsets[sensor_id] = ts - reference_ts
+
+    def update(self, means):
+        # means are sensor id -> mean ts of its reads in one crossing
+        reference_ts = means.get(self.reference)
+        if reference_ts is None:
+            return
+        for sensor_id, ts in means.iteritems():
+            offset = self.offsets.get(sensor_id)
+            if offset is not None and sensor_id != self.reference:
+                self.offsets[sensor_id] = offset + int(self.alpha * (ts - reference_ts - offset))
+
+    def correct(self, sensor_id, ts):
+        return ts - self.offsets.get(sensor_id, 0)
+
+
+class Crossing(object):
+    __slots__ = ('mark_id', 'reads', 'last')
+
+    def __init__(self, mark_id):
+        self.mark_id = mark_id
+        self.reads = []  # (corrected ts, ts, read)
+        self.last = None  # the latest corrected ts
+
+
+class Fusion(object):
+    # a crossing takes reads of a mark at a checkpoint until none came for gap seconds of read time,
+    # it's closed when the receive clock passes its last read by gap + lateness seconds
+    def __init__(self, sensor_checkpoints=None, choose=FIRST, gap=2.0, lateness=1.0, alpha=0.05, max_skew=30.0):
+        if sensor_checkpoints is None:
+            sensor_checkpoints = timing.matching.sensor_checkpoints(models.events.RfidEvent)
+        self.sensor_checkpoints = sensor_checkpoints
+        self.choose = choose
+        self.gap = seconds(gap)
+        self.hold = seconds(gap + lateness)
+        self.alpha = alpha
+        self.max_skew = max_skew
+        self.skews = {}  # checkpoint -> ClockSkew
+        self.crossings = {}  # (checkpoint, mark id) -> open crossing
+        self.wheel = timing.rules.TimerWheel(seconds(0.1))
+        self.reads = 0
+        self.fused = 0  # reads merged into other reads of closed crossings
+
+    def offsets(self):
+        # sensor id -> its estimated clock offset in seconds
+        return {
+            sensor_id: offset / 1e6
+            for skew in self.skews.itervalues()
+            for sensor_id, offset in skew.offsets.iteritems()
+        }
+
+    def checkpoint(self, sensor_id):
+        # sensors out of checkpoints are checkpoints of their own
+        return self.sensor_checkpoints.get(sensor_id, ('sensor', sensor_id))
+
+    def correct(self, read):
+        # ts of a read in microseconds by the clock of the reference sensor, as known by now
+        skew = self.skews.get(self.checkpoint(read.sensor_id))
+        ts = orm.field.datetime_to_micros(read.ts)
+        return ts if skew is None else skew.correct(read.sensor_id, ts)
+
+    def add(self, read):
+        # returns crossings closed meanwhile, as reads
+        self.reads += 1
+        checkpoint = self.checkpoint(read.sensor_id)
+        skew = self.skews.get(checkpoint)
+        if skew is None:
+            skew = self.skews[checkpoint] = ClockSkew(self.alpha, self.max_skew)
+        raw_ts = orm.field.datetime_to_micros(read.ts)
+        skew.observe(read.sensor_id, read.mark_id, raw_ts)
+        ts = skew.correct(read.sensor_id, raw_ts)
+        closed = []
+        key = checkpoint, read.mark_id
+        crossing = self.crossings.get(key)
+        if crossing is not None and abs(ts - crossing.last) > self.gap:
+            closed.append(self._close(key))
+            crossing = None
+        if crossing is None:
+            crossing = self.crossings[key] = Crossing(read.mark_id)
+        crossing.reads.append((ts, raw_ts, read))
+        if crossing.last is None or ts > crossing.last:
+            crossing.last = ts
+        self.wheel.schedule(key, seconds(read.received) + self.hold)
+        closed.extend(self.advance(read.received))
+        return closed
+
+    def advance(self, now):
+        # closes crossings held long enough by the receive clock, now is in seconds like time.time()
+        closed = []
+        for key, _ in self.wheel.advance(seconds(now)):
+            closed.append(self._close(key))
+        return closed
+
+    def flush(self):
+        return [self._close(key) for key in self.crossings.keys()]
+
+    def _close(self, key):
+        crossing = self.crossings.pop(key)
+        self.wheel.cancel(key)
+        self.fused += len(crossing.reads) - 1
+        sums = {}
+        for _, raw_ts, read in crossing.reads:
+            total, count = sums.get(read.sensor_id, (0, 0))
+            sums[read.sensor_id] = total + raw_ts, count + 1
+        if len(sums) > 1:
+            self.skews[key[0]].update({sensor_id: total // count for sensor_id, (total, count) in sums.iteritems()})
+        if self.choose == PEAK:
+            ts, _, read = max(crossing.reads, key=lambda item: (item[2].rssi, -item[0]))
+        else:
+            ts, _, read = min(crossing.reads, key=lambda item: item[0])
+        received = min(read.received for _, _, read in crossing.reads)
+        return timing.ingest.RawRead(read.sensor_id, read.mark_id, orm.field.micros_to_datetime(ts), read.rssi, received)
+
+
+def replay(lines, fusion):
+    # fused reads of a recorded log, in the format of timing.ingest.format_line;
+    # the receive clock is taken from corrected read times, as if reads came without delays
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        read = timing.ingest.parse_line(line, received=0)
+        read = read._replace(received=fusion.correct(read) / 1e6)
+        for crossing in fusion.add(read):
+            yield crossing
+    for crossing in fusion.flush():
+        yield crossing
+
+
+def main():
+    path = sys.argv[1]
+    choose = sys.argv[2] if len(sys.argv) > 2 else FIRST
+    sensor_checkpoints = dict(map(int, arg.split(':')) for arg in sys.argv[3:]) or None
+    fusion = Fusion(sensor_checkpoints, choose)
+    with open(path) as log:
+        crossings = sum(1 for _ in replay(log, fusion))
+    print('reads={} crossings={} ratio={:.1f}'.format(fusion.reads, crossings, fusion.reads / max(crossings, 1.0)))
+    for sensor_id, offset in sorted(fusion.offsets().iteritems()):
+        print('sensor {} offset {:+.6f}s'.format(sensor_id, offset))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+# ingestion from sensors to storage: sources -> bounded queue -> debounce -> micro-batches
+# (or fusion of reads into crossings, see timing.fusion, instead of debounce)
+# lines look like "<sensor_id> <mark_id> <ts in epoch microseconds> [rssi]"
+import collections
+import Queue
+import socket
+import SocketServer
+import threading
+import time
+
+import models.events
+import orm.error
+import orm.field
+
+
+RawRead = collections.namedtuple('RawRead', 'sensor_id mark_id ts rssi received')
+
+
+def parse_line(line, received=None):
+    # raises ValueError or IndexError for malformed lines, ids and ts can't be negative
+    parts = line.split()
+    sensor_id, mark_id, ts = int(parts[0]), int(parts[1]), int(parts[2])
+    if sensor_id < 0 or mark_id < 0 or ts < 0:
+        raise ValueError(line)
+    rssi = int(parts[3]) if len(parts) > 3 else 0
+    return RawRead(
+        sensor_id,
+        mark_id,
+        orm.field.micros_to_datetime(ts),
+        rssi,
+        time.time() if received is None else received,
+    )
+
+
+def format_line(sensor_id, mark_id, ts, rssi=0):
+    return '{} {} {} {}\n'.format(sensor_id, mark_id, orm.field.datetime_to_micros(ts), rssi)
+
+
+class Metrics(object):
+    def __init__(self, samples=10000):
+        self.lock = threading.Lock()
+        self.received = 0
+        self.malformed = 0
+        self.debounced = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_queue = 0
+        self.started = time.time()
+        self.latencies = collections.deque(maxlen=samples)  # seconds from receive to write
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.time() - self.started
+            result = {
+                'received': self.received,
+                'malformed': self.malformed,
+                'debounced': self.debounced,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches,
+                'max_queue': self.max_queue,
+                'throughput': self.written / elapsed if elapsed else 0.0,
+            }
+        for name, quantile in (('p50', 0.5), ('p99', 0.99), ('max', 1.0)):
+            index = min(int(len(latencies) * quantile), len(latencies) - 1)
+            result['latency_' + name] = latencies[index] if latencies else 0.0
+        return result
+
+
+class Debouncer(object):
+    # drops reads of the same mark by the same sensor within window seconds of the last kept one
+    def __init__(self, window=1.0):
+        self.window = window
+        self.last_seen = {}  # (sensor_id, mark_id) -> (ts, received) of the kept read
+        self.newest = None
+
+    def accept(self, read):
+        key = read.sensor_id, read.mark_id
+        last = self.last_seen.get(key)
+        if last is not None and abs(self.seconds(read.ts - last[0])) < self.window:
+            return False
+        self.last_seen[key] = read.ts, read.received
+        if self.newest is None or read.ts > self.newest:
+            self.newest = read.ts
+        return True
+
+    def prune(self, now=None):
+        # forget marks which are out of the window both by read time and by arrival time,
+        # sensors which lag behind others still can't send duplicates through
+        if self.newest is None:
+            return
+        now = time.time() if now is None else now
+        self.last_seen = {
+            key: (ts, received)
+            for key, (ts, received) in self.last_seen.iteritems()
+            if self.seconds(self.newest - ts) < self.window or now - received < self.window
+        }
+
+    @staticmethod
+    def seconds(delta):
+        return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+
+
+class Pipeline(object):
+    # sources put reads into a bounded queue and block when it is full (backpressure),
+    # one writer thread debounces reads and saves them with bulk_create
+    def __init__(self, model_cls=models.events.RfidEvent, queue_size=10000, batch_size=500,
+                 batch_timeout=0.05, debounce_window=1.0, id_start=None, fusion=None):
+        self.model_cls = model_cls
+        self.queue = Queue.Queue(queue_size)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.debouncer = Debouncer(debounce_window)
+        self.fusion = fusion
+        self.metrics = Metrics()
+        self.sources = []
+        self.writer = None
+        self.running = False
+        if id_start is None:
+            last = model_cls.objects.order_by('-id').first()
+            id_start = 1 if last is None else last.pk + 1
+        self.next_id = id_start
+
+    def add_source(self, source):
+        source.pipeline = self
+        self.sources.append(source)
+        if self.running:
+            source.start()
+        return source
+
+    def put(self, read):
+        self.queue.put(read)
+        with self.metrics.lock:
+            self.metrics.received += 1
+            self.metrics.max_queue = max(self.metrics.max_queue, self.queue.qsize())
+
+    def put_line(self, line):
+        try:
+            read = parse_line(line)
+        except (ValueError, IndexError):
+            with self.metrics.lock:
+                self.metrics.malformed += 1
+            return
+        self.put(read)
+
+    def start(self):
+        self.running = True
+        self.writer = threading.Thread(target=self._write_loop, name='ingest-writer')
+        self.writer.daemon = True
+        self.writer.start()
+        for source in self.sources:
+            source.start()
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+        self.running = False
+        self.writer.join()
+
+    def _write_loop(self):
+        batch = []
+        deadline = None
+        pruned = time.time()
+        while self.running or not self.queue.empty() or batch or (self.fusion is not None and self.fusion.crossings):
+            timeout = self.batch_timeout if deadline is None else max(deadline - time.time(), 0)
+            try:
+                read = self.queue.get(timeout=timeout)
+            except Queue.Empty:
+                read = None
+            if self.fusion is not None:
+                fused = self.fusion.fused
+                accepted = self.fusion.add(read) if read is not None else self.fusion.advance(time.time())
+                if not self.running and self.queue.empty():
+                    accepted.extend(self.fusion.flush())
+                with self.metrics.lock:
+                    # reads merged into crossings closed meanwhile, as counted by the fusion
+                    self.metrics.debounced += self.fusion.fused - fused
+            elif read is None:
+                accepted = []
+            elif self.debouncer.accept(read):
+                accepted = [read]
+            else:
+                accepted = []
+                with self.metrics.lock:
+                    self.metrics.debounced += 1
+            if accepted:
+                batch.extend(accepted)
+                if deadline is None:
+                    deadline = time.time() + self.batch_timeout
+            if batch and (len(batch) >= self.batch_size or time.time() >= deadline or not self.running):
+                self._flush(batch)
+                batch = []
+                deadline = None
+            if time.time() - pruned > self.debouncer.window:
+                self.debouncer.prune()
+                pruned = time.time()
+
+    def _flush(self, batch):
+        # ids are taken only by written reads; a batch which fails is written read by read,
+        # so only bad reads are lost
+        try:
+            self._create(batch)
+            written = batch
+        except (orm.error.ModelError, TypeError, ValueError):
+            written = []
+            for read in batch:
+                try:
+                    self._create([read])
+                except (orm.error.ModelError, TypeError, ValueError):
+                    continue
+                written.append(read)
+        now = time.time()
+        with self.metrics.lock:
+            self.metrics.failed += len(batch) - len(written)
+            if written:
+                self.metrics.written += len(written)
+                self.metrics.batches += 1
+                self.metrics.latencies.extend(now - read.received for read in written)
+
+    def _create(self, reads):
+        self.model_cls.objects.bulk_create([
+            {
+                'id': self.next_id + i,
+                'ts': read.ts,
+                'sensor_id': read.sensor_id,
+                'mark_id': read.mark_id,
+            }
+            for i, read in enumerate(reads)
+        ])
+        self.next_id += len(reads)
+
+
+class Source(object):
+    pipeline = None
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class ThreadSource(Source):
+    def __init__(self):
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.__class__.__name__)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        raise NotImplementedError
+
+
+class UdpSource(ThreadSource):
+    # one or more lines per datagram
+    def __init__(self, host='127.0.0.1', port=0):
+        super(UdpSource, self).__init__()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.1)
+        self.address = self.socket.getsockname()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                data = self.socket.recv(65536)
+            except socket.timeout:
+                continue
+            for line in data.splitlines():
+                self.pipeline.put_line(line)
+        self.socket.close()
+
+
+class LineHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            self.server.pipeline.put_line(line)
+
+
+class TcpSource(Source):
+    # a thread per connection, a full queue stops reading and tcp pushes back on the sensor
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = SocketServer.ThreadingTCPServer((host, port), LineHandler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.address = self.server.server_address
+        self.thread = None
+
+    def start(self):
+        self.server.pipeline = self.pipeline
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.1})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class FileTailSource(ThreadSource):
+    # follows a growing file like tail -f, from its beginning
+    def __init__(self, path, poll_interval=0.05):
+        super(FileTailSource, self).__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+
+    def run(self):
+        with open(self.path) as tail:
+            buffered = ''
+            while True:
+                data = tail.read(65536)
+                if not data:
+                    if self.stopped.wait(self.poll_interval):
+                        break
+                    continue
+                lines = (buffered + data).split('\n')
+                buffered = lines.pop()
+                for line in lines:
+                    if line:
+                        self.pipeline.put_line(line)
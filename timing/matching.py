@@ -0,0 +1,186 @@
+# photo finish: the photo or video event nearest in time to each rfid event at the same checkpoint
+#   batch over stored events:
+#       timing.matching.match_stored(models.events.PhotoEvent, window=1.0)
+#   as events arrive:
+#       matcher = timing.matching.Matcher(models.events.PhotoEvent, window=1.0, on_match=callback)
+#       matcher.add_event(rfid_event); matcher.add_media(photo_event); ...; matcher.flush()
+# media of a checkpoint are kept sorted by ts, every rfid event is a bisect there instead of a scan
+import bisect
+import collections
+import heapq
+import itertools
+import operator
+
+import models.events
+import models.sensors
+import orm.field
+
+
+Match = collections.namedtuple('Match', 'event media distance')  # distance in microseconds, None without media
+
+SENSOR_CLASSES = {
+    models.events.RfidEvent: models.sensors.RfidSensor,
+    models.events.PhotoEvent: models.sensors.PhotoSensor,
+    models.events.VideoEvent: models.sensors.VideoSensor,
+}
+
+
+def sensor_checkpoints(event_cls):
+    # sensor id -> checkpoint id for sensors of events of a class, sensors out of checkpoints are left out
+    return {
+        sensor.pk: sensor.checkpoint_id
+        for sensor in SENSOR_CLASSES[event_cls].objects.all()
+        if sensor.checkpoint_id
+    }
+
+
+def micros(event):
+    return orm.field.datetime_to_micros(event.ts)
+
+
+class Timeline(object):
+    # media events of one checkpoint ordered by ts
+    def __init__(self):
+        self.times = []
+        self.media = []
+
+    def add(self, ts, media):
+        i = bisect.bisect_right(self.times, ts)
+        self.times.insert(i, ts)
+        self.media.insert(i, media)
+
+    def nearest(self, ts, window):
+        # (media, distance) of the nearest event within window, the earlier one of two equally near
+        i = bisect.bisect_left(self.times, ts)
+        best = None, None
+        if i > 0 and ts - self.times[i - 1] <= window:
+            best = self.media[i - 1], ts - self.times[i - 1]
+        if i < len(self.times) and self.times[i] - ts <= window:
+            if best[0] is None or self.times[i] - ts < best[1]:
+                best = self.media[i], self.times[i] - ts
+        return best
+
+    def prune(self, ts):
+        # drops media older than ts
+        i = bisect.bisect_left(self.times, ts)
+        del self.times[:i]
+        del self.media[:i]
+
+
+def build_timelines(media, checkpoints):
+    rows = collections.defaultdict(list)
+    for item in media:
+        checkpoint_id = checkpoints.get(item.sensor_id)
+        if checkpoint_id is not None:
+            rows[checkpoint_id].append((micros(item), item))
+    timelines = {}
+    for checkpoint_id, items in rows.iteritems():
+        items.sort(key=operator.itemgetter(0))
+        timeline = timelines[checkpoint_id] = Timeline()
+        timeline.times = [ts for ts, _ in items]
+        timeline.media = [item for _, item in items]
+    return timelines
+
+
+def match(events, media, event_checkpoints, media_checkpoints, window=1.0):
+    # a Match for every rfid event, media are sorted once per checkpoint
+    window = int(window * 1000000)
+    timelines = build_timelines(media, media_checkpoints)
+    matches = []
+    for event in events:
+        timeline = timelines.get(event_checkpoints.get(event.sensor_id))
+        if timeline is None:
+            matches.append(Match(event, None, None))
+            continue
+        found, distance = timeline.nearest(micros(event), window)
+        matches.append(Match(event, found, distance))
+    return matches
+
+
+def match_stored(media_cls, window=1.0, events=None):
+    # events default to all stored rfid events
+    if events is None:
+        events = models.events.RfidEvent.objects.all()
+    return match(
+        events, media_cls.objects.all(),
+        sensor_checkpoints(models.events.RfidEvent), sensor_checkpoints(media_cls), window,
+    )
+
+
+class Matcher(object):
+    # an rfid event waits for media until events newer than its ts + window + lateness were seen,
+    # then on_match gets its Match; media may arrive up to lateness seconds after newer events
+    def __init__(self, media_cls, window=1.0, lateness=2.0, on_match=None,
+                 event_checkpoints=None, media_checkpoints=None):
+        self.window = int(window * 1000000)
+        self.lateness = int(lateness * 1000000)
+        self.on_match = on_match
+        if event_checkpoints is None:
+            event_checkpoints = sensor_checkpoints(models.events.RfidEvent)
+        if media_checkpoints is None:
+            media_checkpoints = sensor_checkpoints(media_cls)
+        self.event_checkpoints = event_checkpoints
+        self.media_checkpoints = media_checkpoints
+        self.timelines = collections.defaultdict(Timeline)
+        self.waiting = collections.defaultdict(Timeline)  # checkpoint id -> pending of rfid events
+        self.deadlines = []  # heap of (ts + window + lateness, seq, checkpoint id, pending)
+        self.seq = itertools.count()
+        self.watermark = None  # newest ts seen
+
+    def add_event(self, event):
+        checkpoint_id = self.event_checkpoints.get(event.sensor_id)
+        ts = micros(event)
+        if checkpoint_id is None:
+            self._emit(Match(event, None, None))
+        else:
+            media, distance = self.timelines[checkpoint_id].nearest(ts, self.window)
+            pending = [event, ts, media, distance]
+            self.waiting[checkpoint_id].add(ts, pending)
+            heapq.heappush(self.deadlines, (ts + self.window + self.lateness, next(self.seq), checkpoint_id, pending))
+        self._advance(ts)
+
+    def add_media(self, media):
+        checkpoint_id = self.media_checkpoints.get(media.sensor_id)
+        ts = micros(media)
+        if checkpoint_id is not None:
+            self.timelines[checkpoint_id].add(ts, media)
+            # pending events within window may get nearer media
+            waiting = self.waiting.get(checkpoint_id)
+            if waiting is not None:
+                start = bisect.bisect_left(waiting.times, ts - self.window)
+                stop = bisect.bisect_right(waiting.times, ts + self.window)
+                for pending in waiting.media[start:stop]:
+                    distance = abs(pending[1] - ts)
+                    if pending[3] is None or distance < pending[3] or (distance == pending[3] and ts < pending[1]):
+                        pending[2], pending[3] = media, distance
+        self._advance(ts)
+
+    def flush(self):
+        # emits every pending event, e.g. at the end of a race
+        while self.deadlines:
+            self._pop()
+
+    def _advance(self, ts):
+        if self.watermark is None or ts > self.watermark:
+            self.watermark = ts
+        while self.deadlines and self.deadlines[0][0] <= self.watermark:
+            self._pop()
+        # media older than any event still to come can't be matched
+        horizon = self.watermark - self.lateness - self.window
+        for timeline in self.timelines.itervalues():
+            if timeline.times and timeline.times[0] < horizon:
+                timeline.prune(horizon)
+
+    def _pop(self):
+        _, _, checkpoint_id, pending = heapq.heappop(self.deadlines)
+        waiting = self.waiting[checkpoint_id]
+        i = bisect.bisect_left(waiting.times, pending[1])
+        while waiting.media[i] is not pending:
+            i += 1
+        del waiting.times[i]
+        del waiting.media[i]
+        self._emit(Match(pending[0], pending[2], pending[3]))
+
+    def _emit(self, found):
+        if self.on_match is not None:
+            self.on_match(found)
@@ -0,0 +1,170 @@
+# live results of a race from rfid events: splits, gun and net times and rankings
+#   ranking = timing.ranking.Ranking(race, config)
+#   ranking.add_many(models.events.RfidEvent.objects.order_by('ts'))
+#   ranking.leaders(10), ranking.rank(user_id), ranking.splits(user_id)
+# runners are ordered by passed course steps, then by the time of the last pass, an event
+# moves only its runner in a sorted index. times are in microseconds
+import bisect
+import collections
+
+import models.base
+import models.sensors
+import orm.field
+import orm.index
+
+
+Standing = collections.namedtuple('Standing', 'rank user_id steps finished gun_time net_time')
+Split = collections.namedtuple('Split', 'checkpoint_id ts split elapsed')
+
+APPLIED = 'applied'
+REPEATED = 'repeated'  # a read of the checkpoint just passed, within min_gap
+UNKNOWN_SENSOR = 'unknown_sensor'
+UNKNOWN_MARK = 'unknown_mark'
+OFF_COURSE = 'off_course'  # the checkpoint isn't ahead of the runner
+STALE = 'stale'  # older than the last pass of the runner
+
+
+class Runner(object):
+    __slots__ = ('user_id', 'passes', 'last', 'key')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.passes = []  # ts of passed course steps, None for steps missed by sensors
+        self.last = None
+        self.key = None
+
+
+class Ranking(object):
+    def __init__(self, race, config, sensor_checkpoints=None):
+        self.race = race
+        self.gun = orm.field.datetime_to_micros(race.start)
+        self.min_gap = config.min_gap * 1000000
+        checkpoints = models.base.Checkpoint.objects.in_bulk(models.base.RaceConfig.checkpoints.value(config))
+        # checkpoints without sensors are left out, nobody can be seen passing them
+        self.course = [
+            pk for pk in models.base.RaceConfig.checkpoints.value(config)
+            if pk in checkpoints and checkpoints[pk].registration != 'absent'
+        ]
+        self.steps = {}  # checkpoint id -> its steps in the course
+        for step, pk in enumerate(self.course):
+            self.steps.setdefault(pk, []).append(step)
+        self.has_start = bool(self.course) and checkpoints[self.course[0]].kind == 'start'
+        if sensor_checkpoints is None:
+            sensor_checkpoints = {
+                sensor.pk: sensor.checkpoint_id for sensor in models.sensors.RfidSensor.objects.all()
+            }
+        self.sensor_checkpoints = sensor_checkpoints
+        self.mark_users = {
+            mark.pk: mark.user_id for mark in models.base.RfidMark.objects.filter(race_id=race.pk)
+        }
+        self.runners = {}  # user id -> runner
+        self.order = orm.index.SortedIndex('ranking')
+        self.counts = collections.Counter()
+
+    def add(self, event):
+        # returns what was done with the event, see the constants above
+        status = self._add(event)
+        self.counts[status] += 1
+        return status
+
+    def add_many(self, events):
+        for event in events:
+            self.counts[self._add(event)] += 1
+
+    def rank(self, user_id):
+        runner = self.runners.get(user_id)
+        if runner is None:
+            return None
+        return self.order.rank(runner.key) + 1
+
+    def standing(self, user_id, rank=None):
+        runner = self.runners.get(user_id)
+        if runner is None:
+            return None
+        if rank is None:
+            rank = self.order.rank(runner.key) + 1
+        steps = len(runner.passes)
+        return Standing(
+            rank, user_id, steps, steps == len(self.course),
+            runner.last - self.gun, runner.last - self._start(runner),
+        )
+
+    def leaders(self, count=10, offset=0):
+        standings = []
+        for rank, user_id in enumerate(self.order.range(), 1):
+            if rank > offset:
+                standings.append(self.standing(user_id, rank))
+                if len(standings) >= count:
+                    break
+        return standings
+
+    def splits(self, user_id):
+        # a split is the time from the previous seen pass, elapsed is the net time at the pass
+        runner = self.runners.get(user_id)
+        if runner is None:
+            return []
+        start = self._start(runner)
+        previous = start
+        result = []
+        for step, ts in enumerate(runner.passes):
+            if ts is None:
+                result.append(Split(self.course[step], None, None, None))
+                continue
+            result.append(Split(self.course[step], ts, ts - previous, ts - start))
+            previous = ts
+        return result
+
+    def mark_user(self, mark_id):
+        try:
+            return self.mark_users[mark_id]
+        except KeyError:
+            # marks may be handed out after the race was loaded
+            mark = models.base.RfidMark.objects.in_bulk([mark_id]).get(mark_id)
+            if mark is None or mark.race_id != self.race.pk:
+                return None
+            self.mark_users[mark_id] = mark.user_id
+            return mark.user_id
+
+    def _start(self, runner):
+        if self.has_start and runner.passes and runner.passes[0] is not None:
+            return runner.passes[0]
+        return self.gun
+
+    def _add(self, event):
+        checkpoint_id = self.sensor_checkpoints.get(event.sensor_id)
+        if checkpoint_id not in self.steps:
+            return UNKNOWN_SENSOR
+        user_id = self.mark_user(event.mark_id)
+        if user_id is None:
+            return UNKNOWN_MARK
+        ts = orm.field.datetime_to_micros(event.ts)
+        runner = self.runners.get(user_id)
+        if runner is None:
+            runner = self.runners[user_id] = Runner(user_id)
+        passes = runner.passes
+        passed = len(passes)
+        if passed and self.course[passed - 1] == checkpoint_id and passes[-1] is not None:
+            if ts < passes[-1]:
+                # an earlier read of the same pass, e.g. by a lagging sensor of the checkpoint
+                passes[-1] = ts
+                self._move(runner)
+                return APPLIED
+            if ts - passes[-1] < self.min_gap:
+                return REPEATED
+        if runner.last is not None and ts < runner.last:
+            return STALE
+        steps = self.steps[checkpoint_id]
+        i = bisect.bisect_left(steps, passed)
+        if i == len(steps):
+            return OFF_COURSE
+        passes.extend([None] * (steps[i] - passed))
+        passes.append(ts)
+        self._move(runner)
+        return APPLIED
+
+    def _move(self, runner):
+        if runner.key is not None:
+            self.order.remove(runner.key, runner.user_id)
+        runner.last = max(ts for ts in runner.passes if ts is not None)
+        runner.key = (-len(runner.passes), runner.last, runner.user_id)
+        self.order.add(runner.key, runner.user_id)
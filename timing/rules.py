@@ -0,0 +1,267 @@
+# emergencies from the live event stream: rules keep per participant or per sensor state and
+# set timers instead of scanning everybody periodically
+#   engine = timing.rules.RuleEngine(ranking, timing.rules.default_rules())
+#   engine.add(event) for every event, engine.tick() from a clock to fire timers between events
+# time is event time in microseconds, timers fire when events or ticks get past their deadlines
+import collections
+import datetime
+
+import models.base
+import models.events
+import orm.field
+import timing.ranking
+
+
+Reading = collections.namedtuple('Reading', 'event ts sensor_id checkpoint_id mark_id user_id step')
+
+
+def seconds(value):
+    return int(value * 1000000)
+
+
+class TimerWheel(object):
+    # hashed timing wheel: a timer goes to slot deadline // resolution % size and stays there for later
+    # rounds; a deadline moved later only updates deadlines, its entry finds out when the slot comes
+    def __init__(self, resolution, size=4096):
+        self.resolution = resolution
+        self.slots = [[] for _ in xrange(size)]
+        self.deadlines = {}  # key -> deadline
+        self.tick = None  # last processed tick
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, key, deadline):
+        current = self.deadlines.get(key)
+        self.deadlines[key] = deadline
+        if current is None or deadline < current:
+            self._insert(key, deadline)
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def advance(self, now):
+        # yields (key, deadline) of expired timers, has to be consumed to the end
+        tick = now // self.resolution
+        size = len(self.slots)
+        if self.tick is None:
+            first = tick - size + 1
+        else:
+            if tick <= self.tick:
+                return
+            first = max(self.tick + 1, tick - size + 1)
+        self.tick = tick  # timers set meanwhile go to the next tick
+        for t in xrange(first, tick + 1):
+            slot = self.slots[t % size]
+            if not slot:
+                continue
+            self.slots[t % size] = []
+            for deadline, key in slot:
+                current = self.deadlines.get(key)
+                if current is None:
+                    continue
+                if current <= now:
+                    del self.deadlines[key]
+                    yield key, current
+                elif current == deadline and deadline // self.resolution > tick:
+                    self.slots[t % size].append((deadline, key))  # a later round
+                else:
+                    self._insert(key, current)
+
+    def _insert(self, key, deadline):
+        tick = deadline // self.resolution
+        if self.tick is not None and tick <= self.tick:
+            tick = self.tick + 1
+        self.slots[tick % len(self.slots)].append((deadline, key))
+
+
+class Rule(object):
+    name = None
+
+    def on_reading(self, engine, reading):
+        pass
+
+    def on_timer(self, engine, subject, deadline):
+        pass
+
+
+class MissingCheckpoint(Rule):
+    # a runner isn't seen at the next checkpoint within timeout seconds of the last pass,
+    # timeouts may be given per expected checkpoint id
+    name = 'missing_checkpoint'
+
+    def __init__(self, timeout, timeouts=None):
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+
+    def on_reading(self, engine, reading):
+        if reading.step is None:
+            return
+        course = engine.ranking.course
+        if reading.step + 1 < len(course):
+            timeout = self.timeouts.get(course[reading.step + 1], self.timeout)
+            engine.schedule(self, reading.user_id, reading.ts + seconds(timeout))
+        else:
+            engine.cancel(self, reading.user_id)
+
+    def on_timer(self, engine, user_id, deadline):
+        course = engine.ranking.course
+        runner = engine.ranking.runners[user_id]
+        step = len(runner.passes)
+        if step >= len(course):
+            return
+        engine.emit(
+            self, deadline, 'not seen at checkpoint {} since {}'.format(
+                course[step], orm.field.micros_to_datetime(runner.last)),
+            user_id=user_id, checkpoint_id=course[step],
+        )
+
+
+class ImpossiblePace(Rule):
+    # a runner got from one pass to the next faster than min_leg seconds per course step,
+    # min_legs may give them per (checkpoint id, next checkpoint id)
+    name = 'impossible_pace'
+
+    def __init__(self, min_leg, min_legs=None):
+        self.min_leg = min_leg
+        self.min_legs = min_legs or {}
+
+    def on_reading(self, engine, reading):
+        if not reading.step:
+            return
+        passes = engine.ranking.runners[reading.user_id].passes
+        previous = reading.step - 1
+        while previous >= 0 and passes[previous] is None:
+            previous -= 1
+        if previous < 0:
+            return
+        course = engine.ranking.course
+        minimum = sum(
+            self.min_legs.get((course[step], course[step + 1]), self.min_leg)
+            for step in xrange(previous, reading.step)
+        )
+        leg = reading.ts - passes[previous]
+        if leg < seconds(minimum):
+            engine.emit(
+                self, reading.ts, '{:.1f}s from checkpoint {}, expected at least {}s'.format(
+                    leg / 1e6, course[previous], minimum),
+                user_id=reading.user_id, mark_id=reading.mark_id, sensor_id=reading.sensor_id,
+                checkpoint_id=reading.checkpoint_id,
+            )
+
+
+class DoubleRead(Rule):
+    # a mark is read at two checkpoints within window seconds, e.g. a mark was copied
+    name = 'double_read'
+
+    def __init__(self, window=1.0):
+        self.window = seconds(window)
+        self.last = {}  # mark id -> (checkpoint id, ts)
+
+    def on_reading(self, engine, reading):
+        if reading.checkpoint_id is None or reading.mark_id is None:
+            return
+        last = self.last.get(reading.mark_id)
+        self.last[reading.mark_id] = reading.checkpoint_id, reading.ts
+        if last is not None and last[0] != reading.checkpoint_id and abs(reading.ts - last[1]) < self.window:
+            engine.emit(
+                self, reading.ts, 'read at checkpoints {} and {} {:.3f}s apart'.format(
+                    last[0], reading.checkpoint_id, abs(reading.ts - last[1]) / 1e6),
+                user_id=reading.user_id, mark_id=reading.mark_id, sensor_id=reading.sensor_id,
+                checkpoint_id=reading.checkpoint_id,
+            )
+
+
+class SilentSensor(Rule):
+    # no events from a sensor for timeout seconds, sensors are watched from their first event
+    name = 'silent_sensor'
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def on_reading(self, engine, reading):
+        subject = reading.event.__class__.__name__, reading.sensor_id
+        engine.schedule(self, subject, reading.ts + seconds(self.timeout))
+
+    def on_timer(self, engine, subject, deadline):
+        engine.emit(
+            self, deadline, 'no {} for {}s'.format(subject[0], self.timeout),
+            sensor_id=subject[1],
+        )
+
+
+def default_rules():
+    return [MissingCheckpoint(1800), ImpossiblePace(60), DoubleRead(1.0), SilentSensor(300)]
+
+
+class RuleEngine(object):
+    # rfid events go through the ranking, so rules see course steps of runners;
+    # emergencies are saved and passed to on_emergency
+    def __init__(self, ranking, rules, resolution=0.1, on_emergency=None, save=True):
+        self.ranking = ranking
+        self.rules = collections.OrderedDict((rule.name, rule) for rule in rules)
+        self.wheel = TimerWheel(seconds(resolution))
+        self.on_emergency = on_emergency
+        self.save = save
+        self.counts = collections.Counter()  # rule name -> emergencies
+        self.next_id = None
+
+    def add(self, event):
+        ts = orm.field.datetime_to_micros(event.ts)
+        self.advance(ts)
+        if isinstance(event, models.events.RfidEvent):
+            reading = self._read(event, ts)
+        else:
+            reading = Reading(event, ts, event.sensor_id, None, None, None, None)
+        for rule in self.rules.itervalues():
+            rule.on_reading(self, reading)
+
+    def add_many(self, events):
+        for event in events:
+            self.add(event)
+
+    def tick(self, now=None):
+        # fires timers by the clock when events don't come, now is a naive utc datetime
+        # like event times, which are microseconds since the epoch
+        self.advance(orm.field.datetime_to_micros(now or datetime.datetime.utcnow()))
+
+    def advance(self, now):
+        for (name, subject), deadline in self.wheel.advance(now):
+            self.rules[name].on_timer(self, subject, deadline)
+
+    def schedule(self, rule, subject, deadline):
+        self.wheel.schedule((rule.name, subject), deadline)
+
+    def cancel(self, rule, subject):
+        self.wheel.cancel((rule.name, subject))
+
+    def emit(self, rule, ts, message, **ids):
+        if self.next_id is None:
+            last = models.base.Emergency.objects.order_by('-id').first()
+            self.next_id = 1 if last is None else last.pk + 1
+        emergency = models.base.Emergency(
+            id=self.next_id, rule=rule.name, ts=orm.field.micros_to_datetime(ts), message=message,
+            **{name: value for name, value in ids.iteritems() if value is not None}
+        )
+        self.next_id += 1
+        if self.save:
+            emergency.save()
+        self.counts[rule.name] += 1
+        if self.on_emergency is not None:
+            self.on_emergency(emergency)
+        return emergency
+
+    def _read(self, event, ts):
+        ranking = self.ranking
+        user_id = ranking.mark_user(event.mark_id)
+        runner = ranking.runners.get(user_id)
+        passed = len(runner.passes) if runner is not None else 0
+        step = None
+        if ranking.add(event) == timing.ranking.APPLIED:
+            runner = ranking.runners[user_id]
+            if len(runner.passes) > passed:
+                step = len(runner.passes) - 1
+        return Reading(
+            event, ts, event.sensor_id, ranking.sensor_checkpoints.get(event.sensor_id),
+            event.mark_id, user_id, step,
+        )